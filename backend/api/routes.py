@@ -19,16 +19,21 @@ else:
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 from modules.db_connector import create_connector
-from modules.llm_client import create_llm_client
+from modules.llm_client import create_async_llm_client
+from modules.run_manifest import RunManifest, load_json
+from modules.jsonl_io import count_jsonl, iter_jsonl
 from .task_manager import task_manager
 from .log_handler import setup_websocket_logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# 运行清单目录（服务启动时的数据清理会保留该目录）
+RUNS_DIR = os.path.join("./data", "runs")
+
 
 # 请求模型
 class DatabaseConfig(BaseModel):
@@ -39,6 +44,11 @@ class DatabaseConfig(BaseModel):
     user: str
     password: str
     database: str
+    pool_min_size: int = 1
+    pool_max_size: int = 5
+    pool_timeout: float = 30
+    incremental_metadata: bool = False
+    schemas: List[str] = []
 
 
 class LLMConfig(BaseModel):
@@ -51,6 +61,17 @@ class LLMConfig(BaseModel):
     max_tokens: int = 4096
     timeout: int = 60
     max_retries: int = 3
+    cache_enabled: bool = False
+    cache_path: str = "./cache/llm_cache.db"
+    cache_max_entries: int = 10000
+    cache_max_age_days: float = 30
+    initial_concurrency: int = 3
+    min_concurrency: int = 1
+    max_concurrency: int = 16
+    tokens_per_minute: int = 0
+    retry_budget: int = 50
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 30.0
 
 
 class GenerateConfig(BaseModel):
@@ -62,6 +83,29 @@ class GenerateConfig(BaseModel):
     enable_validation: bool = True
     min_tables_per_topic: int = 3
     max_tables_per_topic: int = 8
+    planner_mode: str = "llm"
+    planning_max_tables: int = 100
+    max_workers: int = 3
+    chunk_size: int = 30
+    max_chunk_retries: int = 3
+    stream: bool = False
+    cache_generation: bool = True
+    enable_dedup: bool = True
+    dedup_question_threshold: float = 0.8
+    feature_steering: bool = True
+    feature_targets: Dict[str, float] = {}
+    context_token_budget: int = 2000
+    validation_workers: int = 1
+    enable_profiling: bool = False
+    profile_sample_rows: int = 1000
+    profile_top_k: int = 5
+    profile_time_budget_ms: int = 3000
+    profile_workers: int = 0
+    enable_execution_check: bool = False
+    execution_workers: int = 4
+    execution_timeout_ms: int = 5000
+    execution_check_mode: str = "execute"
+    max_plan_cost: float = 0
 
 
 class TaskConfig(BaseModel):
@@ -69,6 +113,7 @@ class TaskConfig(BaseModel):
     db: DatabaseConfig
     llm: LLMConfig
     generate: GenerateConfig
+    resume_run_id: Optional[str] = None
 
 
 # API端点
@@ -91,7 +136,7 @@ async def test_db_connection(config: DatabaseConfig):
         connector = create_connector(db_config)
         
         # 尝试连接
-        conn = connector.get_connection()
+        connector.get_connection()
         
         # 获取表数量
         if db_config['type'] == 'mysql':
@@ -131,10 +176,10 @@ async def test_llm_connection(config: LLMConfig):
         
         # 创建LLM客户端
         llm_config = config.model_dump()
-        client = create_llm_client(llm_config)
         
-        # 发送测试请求
-        response = client.call_llm("你好，请回复'连接成功'", expect_json=False)
+        # 发送测试请求（异步客户端，不阻塞事件循环）
+        async with create_async_llm_client(llm_config) as client:
+            response = await client.call_llm("你好，请回复'连接成功'", expect_json=False, use_cache=False)
         
         return {
             "success": True,
@@ -164,16 +209,24 @@ async def start_generation(config: TaskConfig):
         if status['status'] == 'running':
             raise HTTPException(status_code=400, detail="已有任务正在运行中")
         
+        # 打开运行清单（续跑时读取已完成的阶段）
+        try:
+            manifest = RunManifest(RUNS_DIR, config.resume_run_id)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        
         # 启动任务
         task_id = await task_manager.start_task(config.model_dump())
+        task_manager.task_details["run_id"] = manifest.run_id
         
         # 在后台运行生成任务
-        asyncio.create_task(run_generation_task(config))
+        asyncio.create_task(run_generation_task(config, manifest))
         
         return {
             "success": True,
             "task_id": task_id,
-            "message": "任务已启动"
+            "run_id": manifest.run_id,
+            "message": "任务已续跑" if config.resume_run_id else "任务已启动"
         }
         
     except HTTPException:
@@ -210,6 +263,30 @@ async def get_logs(limit: int = 100):
     }
 
 
+@router.get("/runs")
+async def list_runs():
+    """
+    列出可续跑的运行
+    
+    Returns:
+        运行列表（运行ID、创建时间、已完成阶段），按创建时间倒序
+    """
+    runs = []
+    if os.path.isdir(RUNS_DIR):
+        for run_id in os.listdir(RUNS_DIR):
+            try:
+                manifest = RunManifest(RUNS_DIR, run_id)
+            except (OSError, ValueError):
+                continue
+            runs.append({
+                "run_id": run_id,
+                "created_at": manifest.data.get('created_at'),
+                "completed_stages": manifest.completed_stages()
+            })
+    runs.sort(key=lambda run: run['created_at'] or '', reverse=True)
+    return {"runs": runs}
+
+
 @router.post("/cancel")
 async def cancel_task():
     """
@@ -230,12 +307,13 @@ async def cancel_task():
 
 
 # 后台任务函数
-async def run_generation_task(config: TaskConfig):
+async def run_generation_task(config: TaskConfig, manifest: RunManifest):
     """
     运行生成任务（后台）
     
     Args:
         config: 任务配置
+        manifest: 运行清单，输入未变的已完成阶段直接从快照恢复
     """
     try:
         # 设置日志处理器
@@ -244,7 +322,10 @@ async def run_generation_task(config: TaskConfig):
         
         # 为各个模块的 logger 添加 handler，确保所有模块日志都能实时推送
         for module_name in ['modules.generator', 'modules.llm_client', 'modules.validator', 
-                            'modules.metadata_extractor', 'modules.planner', 'modules.table_cards']:
+                            'modules.metadata_extractor', 'modules.planner', 'modules.table_cards',
+                            'modules.rate_limiter', 'modules.profiler', 'modules.run_manifest', 'modules.jsonl_io',
+                            'modules.deduplicator', 'modules.sql_features',
+                            'modules.context_builder']:
             module_logger = logging.getLogger(module_name)
             module_logger.addHandler(ws_handler)
             module_logger.setLevel(logging.INFO)
@@ -252,10 +333,13 @@ async def run_generation_task(config: TaskConfig):
         # 导入生成模块
         from modules.db_connector import create_connector
         from modules.metadata_extractor import extract_and_save_metadata
+        from modules.profiler import profile_and_save, attach_profiles
         from modules.table_cards import generate_and_save_table_cards
-        from modules.planner import generate_and_save_plan
-        from modules.generator import generate_and_save_samples
-        from modules.validator import validate_and_save_samples
+        from modules.planner import generate_and_save_plan_async
+        from modules.generator import generate_and_save_samples_async
+        from modules.deduplicator import SampleDeduplicator
+        from modules.sql_features import DEFAULT_FEATURE_TARGETS
+        from modules.validator import SQLValidator, validate_and_save_samples
         from modules.exporter import export_samples
         
         # 步骤1: 连接数据库
@@ -267,101 +351,307 @@ async def run_generation_task(config: TaskConfig):
         # 步骤2: 提取元数据
         await task_manager.update_step(2, "提取元数据", "正在提取数据库表结构...")
         metadata_path = os.path.join("./data", "metadata.json")
+        ddl_dir = os.path.join("./data", "ddl_mysql")
         # 在线程池中执行同步函数，避免阻塞事件循环
-        metadata = await run_in_thread(extract_and_save_metadata, db_connector, metadata_path)
+        metadata = await manifest.arun_stage(
+            'metadata',
+            {"db": config.db.model_dump(exclude={'password'})},
+            [metadata_path, os.path.join(ddl_dir, 'ddl.jsonl')],
+            lambda: run_in_thread(
+                extract_and_save_metadata,
+                db_connector,
+                metadata_path,
+                incremental=config.db.incremental_metadata,
+                schemas=config.db.schemas
+            ),
+            lambda: load_json(metadata_path)
+        )
         
         if not metadata:
             raise Exception("未提取到任何表元数据")
         
         await task_manager.add_log("info", f"成功提取 {len(metadata)} 个表的元数据")
         
+        # 列画像（可选）：抽样统计各列取值，写入元数据供表卡片和生成提示词使用
+        if config.generate.enable_profiling:
+            await task_manager.update_progress(task_manager.progress, "正在抽样统计列取值...")
+            profiles_path = os.path.join("./data", "profiles.json")
+            profiles = await manifest.arun_stage(
+                'profiling',
+                {
+                    "metadata": manifest.output_hash('metadata'),
+                    "sample_rows": config.generate.profile_sample_rows,
+                    "top_k": config.generate.profile_top_k
+                },
+                [profiles_path],
+                lambda: run_in_thread(
+                    profile_and_save,
+                    db_connector,
+                    metadata,
+                    profiles_path,
+                    config.generate.profile_sample_rows,
+                    config.generate.profile_top_k,
+                    config.generate.profile_time_budget_ms,
+                    config.generate.profile_workers or None
+                ),
+                lambda: load_json(profiles_path)
+            )
+            attach_profiles(metadata, profiles)
+            await task_manager.add_log("info", f"完成 {len(profiles)} 个表的列画像")
+        
         # 步骤3: 生成表卡片[需要增加db_name]
         await task_manager.update_step(3, "生成表卡片", "正在生成表卡片摘要...")
         table_cards_path = os.path.join("./data", "table_cards.json")
         # 在线程池中执行同步函数，避免阻塞事件循环
-        table_cards = await run_in_thread(generate_and_save_table_cards, metadata, table_cards_path,db_connector.database )
+        table_cards = await manifest.arun_stage(
+            'table_cards',
+            {"metadata": manifest.output_hash('metadata'), "profiling": manifest.output_hash('profiling')},
+            [table_cards_path, os.path.join(ddl_dir, 'doc.jsonl')],
+            lambda: run_in_thread(generate_and_save_table_cards, metadata, table_cards_path,db_connector.database ),
+            lambda: load_json(table_cards_path)
+        )
         await task_manager.add_log("info", f"成功生成 {len(table_cards)} 个表卡片")
         
         # 步骤4: 规划主题（LLM阶段A）
-        await task_manager.update_step(4, "规划主题", "正在调用LLM生成主题规划...")
-        llm_client = create_llm_client(config.llm.model_dump())
+        await task_manager.update_step(
+            4, "规划主题",
+            "正在基于外键图生成主题规划..." if config.generate.planner_mode == 'graph' else "正在调用LLM生成主题规划..."
+        )
+        llm_client = create_async_llm_client(config.llm.model_dump())
         plan_path = os.path.join("./data", "plan.json")
-        # 在线程池中执行同步函数，避免阻塞事件循环
-        plan = await run_in_thread(
-            generate_and_save_plan,
-            llm_client,
-            table_cards,
-            config.generate.total_samples,
-            plan_path,
-            config.generate.min_tables_per_topic,
-            config.generate.max_tables_per_topic,
-            config.generate.dialect,
-            db_connector.database
+        # 异步LLM客户端直接在事件循环中等待，不占用线程池线程
+        plan = await manifest.arun_stage(
+            'plan',
+            {
+                "table_cards": manifest.output_hash('table_cards'),
+                "model": config.llm.model_name,
+                "total_samples": config.generate.total_samples,
+                "min_tables_per_topic": config.generate.min_tables_per_topic,
+                "max_tables_per_topic": config.generate.max_tables_per_topic,
+                "dialect": config.generate.dialect,
+                "planning_max_tables": config.generate.planning_max_tables,
+                "planner_mode": config.generate.planner_mode
+            },
+            [plan_path, os.path.join(ddl_dir, 'plan.jsonl')],
+            lambda: generate_and_save_plan_async(
+                llm_client,
+                table_cards,
+                config.generate.total_samples,
+                plan_path,
+                config.generate.min_tables_per_topic,
+                config.generate.max_tables_per_topic,
+                config.generate.dialect,
+                db_connector.database,
+                config.generate.planning_max_tables,
+                config.generate.planner_mode
+            ),
+            lambda: load_json(plan_path)
         )
         await task_manager.add_log("info", f"成功生成规划，包含 {len(plan['topics'])} 个主题")
+        task_manager.task_details["llm_cache"] = llm_client.get_cache_stats()
         
         # 步骤5: 生成样本（LLM阶段B）
         await task_manager.update_step(5, "生成SQL样本", "正在生成NL2SQL样本...")
         samples_raw_path = os.path.join("./data", "samples_raw.jsonl")
-        # 在线程池中执行同步函数，避免阻塞事件循环
-        samples = await run_in_thread(
-            generate_and_save_samples,
-            llm_client,
-            metadata,
-            plan,
-            samples_raw_path,
-            config.generate.dialect,
-            db_connector.database
-        )
-        
-        if not samples:
+        # SQL特征覆盖引导：按主题统计已生成样本的特征，下一批提示词要求补足缺口
+        feature_targets = None
+        if config.generate.feature_steering:
+            feature_targets = config.generate.feature_targets or DEFAULT_FEATURE_TARGETS
+        
+        # 流式生成时样本到达即校验，并实时推送样本计数（回调在事件循环中执行）
+        # 校验交给后台协程在线程中逐条进行，不阻塞事件循环；验证阶段复用同一个校验器，
+        # 实时做过语法和Schema检查的SQL不再重复检查，只补做执行验证（执行验证使用独立的只读连接池）
+        live_validator = None
+        if config.generate.enable_validation:
+            enable_execution = config.generate.enable_execution_check
+            live_validator = SQLValidator(
+                metadata,
+                db_connector if enable_execution else None,
+                enable_execution,
+                config.generate.execution_workers,
+                config.generate.execution_timeout_ms,
+                config.generate.execution_check_mode,
+                config.generate.max_plan_cost
+            )
+        live_counts = {"samples_generated": 0, "samples_valid": 0}
+        live_queue: Optional[asyncio.Queue] = None
+        if config.generate.stream and live_validator is not None:
+            live_queue = asyncio.Queue()
+        
+        def report_live_counts():
+            task_manager.task_details.update(live_counts)
+            details = f"已生成 {live_counts['samples_generated']} 条样本"
+            if live_validator is not None:
+                details += f"，实时校验通过 {live_counts['samples_valid']} 条"
+            asyncio.ensure_future(task_manager.update_progress(task_manager.progress, details))
+        
+        async def live_validate_worker():
+            # 只做语法和Schema检查（结果由校验器记下），执行验证留到验证阶段批量进行；None表示生成结束
+            while True:
+                sample = await live_queue.get()
+                if sample is None:
+                    return
+                try:
+                    is_valid, _ = await run_in_thread(
+                        live_validator.validate_sql, sample['output'], config.generate.dialect, check_execution=False
+                    )
+                except Exception as e:
+                    logger.warning(f"实时校验失败: {str(e)}")
+                    continue
+                if is_valid:
+                    live_counts["samples_valid"] += 1
+                report_live_counts()
+        
+        def on_sample(sample):
+            live_counts["samples_generated"] += 1
+            if live_queue is not None:
+                live_queue.put_nowait(sample)
+            if config.generate.stream:
+                report_live_counts()
+        
+        generation_inputs = {
+            "plan": manifest.output_hash('plan'),
+            "table_cards": manifest.output_hash('table_cards'),
+            "model": config.llm.model_name,
+            "dialect": config.generate.dialect,
+            "chunk_size": config.generate.chunk_size,
+            "max_chunk_retries": config.generate.max_chunk_retries,
+            "enable_dedup": config.generate.enable_dedup,
+            "dedup_question_threshold": config.generate.dedup_question_threshold,
+            "feature_targets": feature_targets,
+            "context_token_budget": config.generate.context_token_budget
+        }
+        # 生成检查点：每个批次完成即落盘，续跑时只补生成缺失的批次
+        checkpoint = manifest.open_checkpoint('generate', generation_inputs)
+        deduplicator = SampleDeduplicator(
+            config.generate.dialect, config.generate.dedup_question_threshold
+        ) if config.generate.enable_dedup else None
+        if len(checkpoint):
+            await task_manager.add_log("info", f"续跑：复用 {len(checkpoint)} 个已完成的生成批次")
+        live_worker = asyncio.ensure_future(live_validate_worker()) if live_queue is not None else None
+        try:
+            sample_count = await manifest.arun_stage(
+                'generate',
+                generation_inputs,
+                [samples_raw_path, os.path.join(ddl_dir, 'sql_parse.jsonl')],
+                lambda: generate_and_save_samples_async(
+                    llm_client,
+                    metadata,
+                    plan,
+                    samples_raw_path,
+                    config.generate.dialect,
+                    db_connector.database,
+                    config.generate.max_workers,
+                    config.generate.chunk_size,
+                    config.generate.max_chunk_retries,
+                    config.generate.stream,
+                    on_sample,
+                    None if config.generate.cache_generation else False,
+                    checkpoint,
+                    deduplicator,
+                    feature_targets,
+                    config.generate.context_token_budget
+                ),
+                lambda: count_jsonl(samples_raw_path),
+                lambda count: count >= sum(int(round(topic['count'])) for topic in plan['topics'])
+            )
+        finally:
+            if live_worker is not None:
+                # 等待队列中剩余样本校验完成
+                live_queue.put_nowait(None)
+                await live_worker
+        task_manager.task_details["llm_cache"] = llm_client.get_cache_stats()
+        task_manager.task_details["llm_rate_limit"] = llm_client.get_rate_limit_stats()
+        task_manager.task_details["llm_retry"] = llm_client.get_retry_stats()
+        if deduplicator is not None:
+            task_manager.task_details["dedup"] = deduplicator.get_stats()
+        await llm_client.aclose()
+        
+        if not sample_count:
             raise Exception("未生成任何样本")
         
-        await task_manager.add_log("info", f"成功生成 {len(samples)} 条样本")
+        await task_manager.add_log("info", f"成功生成 {sample_count} 条样本")
         
         # 更新任务详情
-        task_manager.task_details["samples_generated"] = len(samples)
+        task_manager.task_details["samples_generated"] = sample_count
         
         # 步骤6: 验证SQL
         if config.generate.enable_validation:
             await task_manager.update_step(6, "验证SQL", "正在验证SQL语法和Schema...")
             samples_valid_path = os.path.join("./data", "samples_valid.jsonl")
+            loop = asyncio.get_event_loop()
+            
+            def on_validate_progress(done, total):
+                # 在验证线程中调用，转交给事件循环推送进度
+                asyncio.run_coroutine_threadsafe(
+                    task_manager.update_progress(
+                        int(done * 100 / total) if total else 100,
+                        f"已验证 {done}/{total} 条SQL"
+                    ),
+                    loop
+                )
+            
             # 在线程池中执行同步函数，避免阻塞事件循环
-            valid_samples = await run_in_thread(
-                validate_and_save_samples,
-                samples,
-                metadata,
-                samples_valid_path,
-                config.generate.dialect
+            valid_count = await manifest.arun_stage(
+                'validate',
+                {
+                    "samples": manifest.output_hash('generate'),
+                    "metadata": manifest.output_hash('metadata'),
+                    "dialect": config.generate.dialect,
+                    "enable_execution_check": config.generate.enable_execution_check,
+                    "execution_check_mode": config.generate.execution_check_mode,
+                    "max_plan_cost": config.generate.max_plan_cost
+                },
+                [samples_valid_path],
+                lambda: run_in_thread(
+                    validate_and_save_samples,
+                    iter_jsonl(samples_raw_path),
+                    metadata,
+                    samples_valid_path,
+                    config.generate.dialect,
+                    validator=live_validator,
+                    workers=config.generate.validation_workers,
+                    progress_callback=on_validate_progress
+                ),
+                lambda: count_jsonl(samples_valid_path)
             )
+            execution_stats = live_validator.get_execution_stats()
+            if execution_stats:
+                task_manager.task_details["execution_check"] = execution_stats
         else:
             await task_manager.add_log("info", "跳过SQL验证步骤")
-            valid_samples = samples
+            samples_valid_path = samples_raw_path
+            valid_count = sample_count
         
-        if not valid_samples:
+        if not valid_count:
             raise Exception("没有有效样本")
         
-        await task_manager.add_log("info", f"验证完成，有效样本: {len(valid_samples)} 条")
+        await task_manager.add_log("info", f"验证完成，有效样本: {valid_count} 条")
         
         # 更新任务详情
-        task_manager.task_details["samples_valid"] = len(valid_samples)
+        task_manager.task_details["samples_valid"] = valid_count
         
         # 导出训练数据
         await task_manager.update_step(6, "导出数据", "正在导出训练数据...")
         # 在线程池中执行同步函数，避免阻塞事件循环
-        await run_in_thread(
+        statistics = await run_in_thread(
             export_samples,
-            valid_samples,
+            iter_jsonl(samples_valid_path),
             config.generate.output_path,
-            config.generate.output_format
+            config.generate.output_format,
+            config.generate.dialect
         )
+        task_manager.task_details["sql_features"] = statistics['features']
         
         # 完成任务
         result = {
-            "total_samples": len(samples),
-            "valid_samples": len(valid_samples),
+            "total_samples": sample_count,
+            "valid_samples": valid_count,
             "output_path": config.generate.output_path,
-            "output_format": config.generate.output_format
+            "output_format": config.generate.output_format,
+            "run_id": manifest.run_id,
+            "sql_features": statistics['features'],
+            "llm_cache": llm_client.get_cache_stats()
         }
         
         await task_manager.complete_task(result)
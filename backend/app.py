@@ -21,9 +21,15 @@ from api.websocket import router as ws_router
 from api.download import router as download_router
 
 
+# 服务启动清理data文件夹时保留的条目：
+# runs 运行清单和产物快照，续跑时从这里恢复；
+# metadata.json 增量提取元数据时与之比较表指纹；profiles.json 按表指纹缓存的列画像
+KEPT_DATA_ENTRIES = {"runs", "metadata.json", "profiles.json"}
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """应用生命周期管理 - 清理data文件夹"""
+    """应用生命周期管理 - 清理data文件夹（保留KEPT_DATA_ENTRIES中跨重启复用的文件和目录）"""
     # 启动时的操作
     print("=" * 50)
     print("FastAPI app starting...")
@@ -37,6 +43,9 @@ async def lifespan(app: FastAPI):
         if os.path.exists(data_dir):
             # 删除data文件夹下的所有文件和子文件夹
             for filename in os.listdir(data_dir):
+                if filename in KEPT_DATA_ENTRIES:
+                    print(f"  Kept: {filename}")
+                    continue
                 file_path = os.path.join(data_dir, filename)
                 try:
                     if os.path.isfile(file_path) or os.path.islink(file_path):
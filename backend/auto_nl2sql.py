@@ -17,11 +17,16 @@ sys.path.insert(0, os.path.dirname(__file__))
 from modules.db_connector import create_connector
 from modules.llm_client import create_llm_client
 from modules.metadata_extractor import extract_and_save_metadata
+from modules.profiler import profile_and_save, attach_profiles
 from modules.table_cards import generate_and_save_table_cards
 from modules.planner import generate_and_save_plan
 from modules.generator import generate_and_save_samples
+from modules.deduplicator import SampleDeduplicator
+from modules.sql_features import DEFAULT_FEATURE_TARGETS
 from modules.validator import validate_and_save_samples
 from modules.exporter import export_samples
+from modules.run_manifest import RunManifest, load_json
+from modules.jsonl_io import count_jsonl, iter_jsonl
 
 
 def setup_logging(log_dir: str = "./logs"):
@@ -88,6 +93,8 @@ def merge_config_with_args(config: dict, args: argparse.Namespace) -> dict:
         config['db']['password'] = args.db_password
     if args.db_database:
         config['db']['database'] = args.db_database
+    if args.db_schemas:
+        config['db']['schemas'] = [s.strip() for s in args.db_schemas.split(',') if s.strip()]
     
     if args.llm_api_base:
         config['llm']['api_base'] = args.llm_api_base
@@ -124,6 +131,8 @@ def main():
     parser.add_argument('--db_user', type=str, help='数据库用户名')
     parser.add_argument('--db_password', type=str, help='数据库密码')
     parser.add_argument('--db_database', type=str, help='数据库名称')
+    parser.add_argument('--db_schemas', type=str,
+                       help='要提取的schema名称或通配符，逗号分隔（如 tenant_*,shared）')
     
     # LLM参数
     parser.add_argument('--llm_api_base', type=str, help='LLM API地址')
@@ -141,6 +150,8 @@ def main():
                        help='数据输出目录')
     parser.add_argument('--skip_validation', action='store_true',
                        help='跳过SQL验证步骤')
+    parser.add_argument('--resume', type=str, metavar='RUN_ID',
+                       help='续跑指定运行：输入未变的已完成阶段直接恢复，生成阶段复用已完成的批次')
     
     args = parser.parse_args()
     
@@ -159,6 +170,11 @@ def main():
         # 创建数据目录
         os.makedirs(args.data_dir, exist_ok=True)
         
+        # 运行清单：记录各阶段的输入哈希、产物和状态，供 --resume 续跑
+        manifest = RunManifest(os.path.join(args.data_dir, 'runs'), args.resume)
+        gen_config = config['generate']
+        db_inputs = {k: v for k, v in config['db'].items() if k != 'password'}
+        
         # 2. 连接数据库
         logger.info("=" * 80)
         logger.info("阶段1: 数据库连接")
@@ -172,22 +188,62 @@ def main():
         logger.info("=" * 80)
         metadata_path = os.path.join(args.data_dir, 'metadata.json')
         table_blacklist = config.get('security', {}).get('table_blacklist', [])
-        metadata = extract_and_save_metadata(
-            db_connector,
-            metadata_path,
-            table_blacklist
+        metadata = manifest.run_stage(
+            'metadata',
+            {"db": db_inputs, "table_blacklist": table_blacklist},
+            [metadata_path, os.path.join(args.data_dir, 'ddl_mysql', 'ddl.jsonl')],
+            lambda: extract_and_save_metadata(
+                db_connector,
+                metadata_path,
+                table_blacklist,
+                incremental=config['db'].get('incremental_metadata', False),
+                schemas=config['db'].get('schemas')
+            ),
+            lambda: load_json(metadata_path)
         )
         
         if not metadata:
             logger.error("未提取到任何表元数据，程序退出")
             return
         
+        # 列画像（可选）：抽样统计各列取值，写入元数据供表卡片和生成提示词使用
+        if config['generate'].get('enable_profiling', False):
+            logger.info("=" * 80)
+            logger.info("阶段2.1: 列画像")
+            logger.info("=" * 80)
+            profiles_path = os.path.join(args.data_dir, 'profiles.json')
+            manifest.run_stage(
+                'profiling',
+                {
+                    "metadata": manifest.output_hash('metadata'),
+                    "sample_rows": gen_config.get('profile_sample_rows', 1000),
+                    "top_k": gen_config.get('profile_top_k', 5)
+                },
+                [profiles_path],
+                lambda: profile_and_save(
+                    db_connector,
+                    metadata,
+                    profiles_path,
+                    sample_rows=gen_config.get('profile_sample_rows', 1000),
+                    top_k=gen_config.get('profile_top_k', 5),
+                    time_budget_ms=gen_config.get('profile_time_budget_ms', 3000),
+                    max_workers=gen_config.get('profile_workers', 0) or None
+                ),
+                lambda: attach_profiles(metadata, load_json(profiles_path))
+            )
+        
         # 4. 生成表卡片
         logger.info("=" * 80)
         logger.info("阶段3: 生成表卡片")
         logger.info("=" * 80)
         table_cards_path = os.path.join(args.data_dir, 'table_cards.json')
-        table_cards = generate_and_save_table_cards(metadata, table_cards_path)
+        table_cards = manifest.run_stage(
+            'table_cards',
+            {"metadata": manifest.output_hash('metadata'), "profiling": manifest.output_hash('profiling')},
+            [table_cards_path, os.path.join(args.data_dir, 'ddl_mysql', 'doc.jsonl')],
+            lambda: generate_and_save_table_cards(metadata, table_cards_path),
+            lambda: load_json(table_cards_path)
+        )
         
         # 5. 创建LLM客户端
         logger.info("=" * 80)
@@ -201,14 +257,32 @@ def main():
         logger.info("阶段5: 生成主题规划 (LLM阶段A)")
         logger.info("=" * 80)
         plan_path = os.path.join(args.data_dir, 'plan.json')
-        plan = generate_and_save_plan(
-            llm_client,
-            table_cards,
-            config['generate']['total_samples'],
-            plan_path,
-            config['generate'].get('min_tables_per_topic', 3),
-            config['generate'].get('max_tables_per_topic', 8),
-            config['generate'].get('dialect', 'mysql')
+        plan = manifest.run_stage(
+            'plan',
+            {
+                "table_cards": manifest.output_hash('table_cards'),
+                "model": config['llm']['model_name'],
+                "total_samples": gen_config['total_samples'],
+                "min_tables_per_topic": gen_config.get('min_tables_per_topic', 3),
+                "max_tables_per_topic": gen_config.get('max_tables_per_topic', 8),
+                "dialect": gen_config.get('dialect', 'mysql'),
+                "planning_max_tables": gen_config.get('planning_max_tables', 100),
+                "planner_mode": gen_config.get('planner_mode', 'llm')
+            },
+            [plan_path, os.path.join(args.data_dir, 'ddl_mysql', 'plan.jsonl')],
+            lambda: generate_and_save_plan(
+                llm_client,
+                table_cards,
+                gen_config['total_samples'],
+                plan_path,
+                gen_config.get('min_tables_per_topic', 3),
+                gen_config.get('max_tables_per_topic', 8),
+                gen_config.get('dialect', 'mysql'),
+                max_tables_per_call=gen_config.get('planning_max_tables', 100),
+                max_workers=gen_config.get('planning_workers', 4),
+                planner_mode=gen_config.get('planner_mode', 'llm')
+            ),
+            lambda: load_json(plan_path)
         )
         
         # 7. 生成样本（LLM阶段B）
@@ -216,15 +290,53 @@ def main():
         logger.info("阶段6: 生成NL2SQL样本 (LLM阶段B)")
         logger.info("=" * 80)
         samples_raw_path = os.path.join(args.data_dir, 'samples_raw.jsonl')
-        samples = generate_and_save_samples(
-            llm_client,
-            metadata,
-            plan,
-            samples_raw_path,
-            config['generate'].get('dialect', 'mysql')
+        # SQL特征覆盖引导：按主题统计已生成样本的特征，下一批提示词要求补足缺口
+        feature_targets = None
+        if gen_config.get('feature_steering', True):
+            feature_targets = gen_config.get('feature_targets') or DEFAULT_FEATURE_TARGETS
+        generation_inputs = {
+            "plan": manifest.output_hash('plan'),
+            "table_cards": manifest.output_hash('table_cards'),
+            "model": config['llm']['model_name'],
+            "dialect": gen_config.get('dialect', 'mysql'),
+            "chunk_size": gen_config.get('chunk_size', 30),
+            "max_chunk_retries": gen_config.get('max_chunk_retries', 3),
+            "enable_dedup": gen_config.get('enable_dedup', True),
+            "dedup_question_threshold": gen_config.get('dedup_question_threshold', 0.8),
+            "feature_targets": feature_targets,
+            "context_token_budget": gen_config.get('context_token_budget', 2000)
+        }
+        # 生成检查点：每个批次完成即落盘，中断后续跑只补生成缺失的批次
+        checkpoint = manifest.open_checkpoint('generate', generation_inputs)
+        deduplicator = SampleDeduplicator(
+            gen_config.get('dialect', 'mysql'),
+            gen_config.get('dedup_question_threshold', 0.8)
+        ) if gen_config.get('enable_dedup', True) else None
+        sample_count = manifest.run_stage(
+            'generate',
+            generation_inputs,
+            [samples_raw_path, os.path.join(args.data_dir, 'ddl_mysql', 'sql_parse.jsonl')],
+            lambda: generate_and_save_samples(
+                llm_client,
+                metadata,
+                plan,
+                samples_raw_path,
+                gen_config.get('dialect', 'mysql'),
+                max_workers=gen_config.get('max_workers', 1),
+                chunk_size=gen_config.get('chunk_size', 30),
+                max_chunk_retries=gen_config.get('max_chunk_retries', 3),
+                stream=gen_config.get('stream', False),
+                use_cache=None if gen_config.get('cache_generation', True) else False,
+                checkpoint=checkpoint,
+                deduplicator=deduplicator,
+                feature_targets=feature_targets,
+                context_token_budget=gen_config.get('context_token_budget', 2000)
+            ),
+            lambda: count_jsonl(samples_raw_path),
+            lambda count: count >= sum(int(round(topic['count'])) for topic in plan['topics'])
         )
         
-        if not samples:
+        if not sample_count:
             logger.error("未生成任何样本，程序退出")
             return
         
@@ -236,19 +348,38 @@ def main():
             samples_valid_path = os.path.join(args.data_dir, 'samples_valid.jsonl')
             enable_execution = config['generate'].get('enable_execution_check', False)
             
-            valid_samples = validate_and_save_samples(
-                samples,
-                metadata,
-                samples_valid_path,
-                config['generate'].get('dialect', 'mysql'),
-                db_connector if enable_execution else None,
-                enable_execution
+            valid_count = manifest.run_stage(
+                'validate',
+                {
+                    "samples": manifest.output_hash('generate'),
+                    "metadata": manifest.output_hash('metadata'),
+                    "dialect": gen_config.get('dialect', 'mysql'),
+                    "enable_execution_check": enable_execution,
+                    "execution_check_mode": gen_config.get('execution_check_mode', 'execute'),
+                    "max_plan_cost": gen_config.get('max_plan_cost', 0)
+                },
+                [samples_valid_path],
+                lambda: validate_and_save_samples(
+                    iter_jsonl(samples_raw_path),
+                    metadata,
+                    samples_valid_path,
+                    gen_config.get('dialect', 'mysql'),
+                    db_connector if enable_execution else None,
+                    enable_execution,
+                    workers=gen_config.get('validation_workers', 1),
+                    execution_workers=gen_config.get('execution_workers', 4),
+                    execution_timeout_ms=gen_config.get('execution_timeout_ms', 5000),
+                    execution_check_mode=gen_config.get('execution_check_mode', 'execute'),
+                    max_plan_cost=gen_config.get('max_plan_cost', 0)
+                ),
+                lambda: count_jsonl(samples_valid_path)
             )
         else:
             logger.info("跳过SQL验证步骤")
-            valid_samples = samples
+            samples_valid_path = samples_raw_path
+            valid_count = sample_count
         
-        if not valid_samples:
+        if not valid_count:
             logger.error("没有有效样本，程序退出")
             return
         
@@ -259,20 +390,28 @@ def main():
         output_path = config['generate']['output_path']
         output_format = config['generate'].get('output_format', 'alpaca')
         
+        # 从有效样本文件逐行读取并转换，内存占用与样本数无关
         export_samples(
-            valid_samples,
+            iter_jsonl(samples_valid_path),
             output_path,
-            output_format
+            output_format,
+            gen_config.get('dialect', 'mysql')
         )
         
         # 10. 完成
         logger.info("=" * 80)
         logger.info("✅ 所有阶段完成！")
         logger.info("=" * 80)
-        logger.info(f"总样本数: {len(samples)}")
-        logger.info(f"有效样本数: {len(valid_samples)}")
+        logger.info(f"总样本数: {sample_count}")
+        logger.info(f"有效样本数: {valid_count}")
         logger.info(f"输出文件: {output_path}")
         logger.info(f"输出格式: {output_format}")
+        logger.info(f"运行ID: {manifest.run_id}")
+        cache_stats = llm_client.get_cache_stats()
+        if cache_stats:
+            logger.info(f"LLM缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次")
+        retry_stats = llm_client.get_retry_stats()
+        logger.info(f"LLM重试: 使用 {retry_stats['spent']} 次, 预算耗尽后拒绝 {retry_stats['denied']} 次")
         
     except Exception as e:
         logger.error(f"程序执行失败: {str(e)}", exc_info=True)
@@ -0,0 +1,253 @@
+"""
+提示词上下文构建模块
+为生成提示词渲染主题相关表的精简DDL：按相关性给字段排序，在Token预算内保留最有用的字段
+"""
+import re
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+try:
+    from .profiler import format_profile_hint
+    from .rate_limiter import estimate_tokens
+    from .schema_graph import resolve_reference
+except ImportError:
+    from profiler import format_profile_hint
+    from rate_limiter import estimate_tokens
+    from schema_graph import resolve_reference
+
+logger = logging.getLogger(__name__)
+
+# 启用预算时字段注释的最大长度（超出部分截断）
+MAX_COMMENT_LENGTH = 40
+
+# 常用于过滤、分组、排序的字段类型
+_TIME_TYPE_RE = re.compile(r'date|time|year', re.IGNORECASE)
+_NUMERIC_TYPE_RE = re.compile(r'int|decimal|numeric|float|double|real|money|number', re.IGNORECASE)
+# 很少直接出现在查询中的大字段类型
+_BULK_TYPE_RE = re.compile(r'text|blob|binary|json|xml|clob|bytea|image|geometry', re.IGNORECASE)
+
+
+class SchemaContextBuilder:
+    """
+    主题DDL上下文构建类
+
+    主键、外键和被主题内其他表外键引用的字段必定保留；其余字段按有无注释、是否有列画像取值、
+    字段类型打分，各表轮流按分数加入（避免宽表占满预算），直到估算Token数达到预算。
+    渲染结果按 (表列表, 预算) 缓存，同一组表的多个主题和批次不会重复构建。多线程调用安全。
+    """
+
+    def __init__(self, metadata: Dict[str, Any], token_budget: int = 0):
+        """
+        初始化上下文构建器
+
+        Args:
+            metadata: 元数据字典
+            token_budget: 默认Token预算，0表示不限制（输出全部字段和完整注释）
+        """
+        self.metadata = metadata
+        self.token_budget = max(0, int(token_budget or 0))
+        self._cache: Dict[Tuple[Tuple[str, ...], int], str] = {}
+        self._lock = threading.Lock()
+
+    def build(self, table_names: List[str], token_budget: Optional[int] = None) -> str:
+        """
+        获取主题相关表的DDL文本
+
+        Args:
+            table_names: 表名列表
+            token_budget: Token预算，None表示使用默认预算，0表示不限制
+
+        Returns:
+            DDL文本
+        """
+        budget = self.token_budget if token_budget is None else max(0, int(token_budget))
+        key = (tuple(table_names), budget)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        ddl = self._render(list(key[0]), budget)
+        with self._lock:
+            self._cache.setdefault(key, ddl)
+        return ddl
+
+    def _render(self, table_names: List[str], budget: int) -> str:
+        """
+        渲染DDL：先放入必选部分，再按字段分数在预算内补充其余字段
+
+        Args:
+            table_names: 表名列表
+            budget: Token预算，0表示不限制
+
+        Returns:
+            DDL文本
+        """
+        tables = []
+        for table_name in table_names:
+            if table_name not in self.metadata:
+                logger.warning(f"表 {table_name} 不在元数据中，跳过")
+                continue
+            tables.append(table_name)
+
+        referenced = self._referenced_columns(tables)
+        selected: Dict[str, Set[str]] = {}
+        candidates = []
+        for table_name in tables:
+            table_info = self.metadata[table_name]
+            keys = set(table_info.get('primary_keys') or [])
+            keys.update((table_info.get('foreign_keys') or {}).keys())
+            keys.update(referenced.get(table_name, ()))
+            selected[table_name] = {col['name'] for col in table_info['columns'] if col['name'] in keys}
+            if budget:
+                profile_columns = (table_info.get('profile') or {}).get('columns') or {}
+                ranked = sorted(
+                    (col for col in table_info['columns'] if col['name'] not in keys),
+                    key=lambda col: -self._column_score(col, profile_columns.get(col['name']))
+                )
+                for rank, col in enumerate(ranked):
+                    candidates.append((rank, table_name, col))
+            else:
+                selected[table_name] = {col['name'] for col in table_info['columns']}
+
+        if not budget:
+            return self._render_tables(tables, selected, budget)
+
+        used = estimate_tokens(self._render_tables(tables, selected, budget))
+        if used > budget:
+            logger.debug(f"表 {', '.join(tables)} 的主外键字段已超出上下文预算 ({used} > {budget})")
+
+        # 各表轮流加入下一个得分最高的字段，单个字段的开销按其DDL行和取值注释估算
+        candidates.sort(key=lambda item: item[0])
+        for _, table_name, col in candidates:
+            profile = self.metadata[table_name].get('profile')
+            cost = estimate_tokens(self._column_line(col, budget)) + 1
+            hint = format_profile_hint(profile['columns'].get(col['name'])) if profile else ""
+            if hint:
+                cost += estimate_tokens(f"--   {col['name']}: {hint}") + 1
+            if used + cost > budget:
+                continue
+            selected[table_name].add(col['name'])
+            used += cost
+
+        return self._render_tables(tables, selected, budget)
+
+    def _render_tables(self, tables: List[str], selected: Dict[str, Set[str]], budget: int) -> str:
+        """
+        按原字段顺序渲染选中的字段
+
+        Args:
+            tables: 表名列表
+            selected: 表名 -> 选中的字段名集合
+            budget: Token预算，非0时截断长注释并注明省略的字段数
+
+        Returns:
+            DDL文本
+        """
+        ddl_lines = []
+
+        for table_name in tables:
+            table_info = self.metadata[table_name]
+            kept = [col for col in table_info['columns'] if col['name'] in selected[table_name]]
+
+            # 构建CREATE TABLE语句
+            ddl_lines.append(f"\nCREATE TABLE {table_name} (")
+
+            columns = [self._column_line(col, budget) for col in kept]
+
+            # 添加主键
+            if table_info.get('primary_keys'):
+                pk_cols = ", ".join(table_info['primary_keys'])
+                columns.append(f"  PRIMARY KEY ({pk_cols})")
+
+            ddl_lines.append(",\n".join(columns))
+            ddl_lines.append(");")
+
+            omitted = len(table_info['columns']) - len(kept)
+            if omitted:
+                ddl_lines.append(f"-- 另有 {omitted} 个次要字段未列出")
+
+            # 添加外键关系说明（作为注释）
+            if table_info.get('foreign_keys'):
+                ddl_lines.append(f"-- 外键关系:")
+                for col, ref in table_info['foreign_keys'].items():
+                    ddl_lines.append(f"--   {col} -> {ref}")
+
+            # 添加列画像中的真实取值（作为注释），避免LLM虚构不存在的过滤值
+            profile = table_info.get('profile')
+            if profile:
+                hints = [(col['name'], format_profile_hint(profile['columns'].get(col['name']))) for col in kept]
+                hints = [(name, hint) for name, hint in hints if hint]
+                if hints:
+                    ddl_lines.append("-- 字段取值:")
+                    for name, hint in hints:
+                        ddl_lines.append(f"--   {name}: {hint}")
+
+        return "\n".join(ddl_lines)
+
+    @staticmethod
+    def _column_line(col: Dict[str, Any], budget: int) -> str:
+        """渲染单个字段定义，启用预算时截断长注释"""
+        col_def = f"  {col['name']} {col['column_type']}"
+
+        if not col['nullable']:
+            col_def += " NOT NULL"
+
+        comment = col.get('comment')
+        if comment:
+            if budget and len(comment) > MAX_COMMENT_LENGTH:
+                comment = comment[:MAX_COMMENT_LENGTH] + "..."
+            col_def += f" COMMENT '{comment}'"
+
+        return col_def
+
+    @staticmethod
+    def _column_score(col: Dict[str, Any], column_profile: Optional[Dict[str, Any]]) -> float:
+        """
+        字段相关性分数：有注释的字段语义明确，有常见取值的字段适合做过滤和分组，
+        时间和数值字段常用于范围过滤和聚合；大字段和几乎全空的字段很少出现在查询中
+
+        Args:
+            col: 字段信息
+            column_profile: 字段的列画像统计，没有时为None
+
+        Returns:
+            分数，越高越优先
+        """
+        score = 0.0
+        if col.get('comment'):
+            score += 2
+        if column_profile:
+            if column_profile.get('top_values'):
+                score += 2
+            if (column_profile.get('null_ratio') or 0) >= 0.9:
+                score -= 2
+
+        column_type = col.get('column_type') or col.get('type') or ''
+        if _BULK_TYPE_RE.search(column_type):
+            score -= 2
+        elif _TIME_TYPE_RE.search(column_type):
+            score += 1.5
+        elif _NUMERIC_TYPE_RE.search(column_type):
+            score += 1
+        return score
+
+    def _referenced_columns(self, tables: List[str]) -> Dict[str, Set[str]]:
+        """
+        找出被主题内其他表外键引用的字段（关联查询的连接字段）
+
+        Args:
+            tables: 表名列表
+
+        Returns:
+            表名 -> 被引用的字段名集合
+        """
+        table_keys = set(tables)
+        referenced: Dict[str, Set[str]] = {}
+        for table_name in tables:
+            for ref in (self.metadata[table_name].get('foreign_keys') or {}).values():
+                target = resolve_reference(ref, table_keys)
+                if target:
+                    referenced.setdefault(target, set()).add(ref.rsplit('.', 1)[1])
+        return referenced
@@ -3,13 +3,222 @@
 支持MySQL、PostgreSQL、SQL Server等数据库
 """
 
+import time
 import pymysql
 import logging
-from typing import Optional, Dict, Any
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, Iterator, List
 
 logger = logging.getLogger(__name__)
 
 
+class ConnectionPool:
+    """
+    数据库连接池类
+    
+    - 连接数在 [min_size, max_size] 之间，池满时等待归还
+    - 取出空闲时间超过 health_check_interval 的连接前先做健康检查，失效则自动重连
+    - 线程亲和：同一线程嵌套获取时复用已持有的连接
+    """
+    
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        db_type: str = 'mysql',
+        min_size: int = 1,
+        max_size: int = 5,
+        timeout: float = 30.0,
+        health_check_interval: float = 5.0
+    ):
+        """
+        初始化连接池
+        
+        Args:
+            factory: 创建新连接的函数
+            db_type: 数据库类型（决定健康检查方式）
+            min_size: 预先建立的连接数
+            max_size: 最大连接数
+            timeout: 池满时等待空闲连接的最长秒数
+            health_check_interval: 空闲超过该秒数的连接在取出时做健康检查，0表示每次都检查
+        """
+        self.factory = factory
+        self.db_type = db_type
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, self.min_size, max_size)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        
+        self._idle: deque = deque()  # (连接, 归还时间)，后进先出
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        
+        for _ in range(self.min_size):
+            self._idle.append((self.factory(), time.monotonic()))
+            self._size += 1
+    
+    @contextmanager
+    def connection(self, exclusive: bool = False):
+        """
+        借出一个连接的上下文管理器；出错时回滚，连接已损坏则丢弃
+        
+        Args:
+            exclusive: 是否独占一个连接（不参与线程亲和），用于流式游标等会长时间占用连接的场景
+        
+        Yields:
+            数据库连接对象
+        """
+        conn = self._checkout() if exclusive else self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = not self._rollback(conn)
+            raise
+        finally:
+            self.release(conn, broken)
+    
+    def acquire(self):
+        """
+        获取连接（当前线程已持有连接时直接复用）
+        
+        Returns:
+            数据库连接对象
+        """
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+        
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        self._local.broken = False
+        return conn
+    
+    def release(self, conn, broken: bool = False):
+        """
+        归还连接（嵌套获取时只有最外层归还才真正放回池中）
+        
+        Args:
+            conn: 连接对象
+            broken: 连接是否已损坏
+        """
+        if getattr(self._local, 'conn', None) is conn:
+            # 嵌套使用中的损坏标记留到最外层归还时处理
+            self._local.broken = self._local.broken or broken
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            broken = self._local.broken
+            self._local.conn = None
+            self._local.broken = False
+        
+        with self._cond:
+            if broken or self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取连接池状态
+        
+        Returns:
+            状态字典
+        """
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "max_size": self.max_size}
+    
+    def close(self):
+        """关闭所有空闲连接，借出中的连接归还时关闭"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+    
+    def _checkout(self):
+        """从池中取出连接，必要时新建或等待"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("连接池已关闭")
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, idle_since = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待数据库连接超时（{self.timeout}秒）")
+                self._cond.wait(remaining)
+        
+        if conn is not None:
+            if time.monotonic() - idle_since < self.health_check_interval or self._is_alive(conn):
+                return conn
+            logger.warning("数据库连接已失效，重新连接")
+            self._close_quietly(conn)
+        
+        try:
+            return self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+    
+    def _is_alive(self, conn) -> bool:
+        """健康检查：连接是否仍可用（不在原连接上自动重连，失效的连接由连接池丢弃后经工厂函数重建）"""
+        try:
+            if self.db_type == 'mysql':
+                # reconnect=True 只会重新执行init_command，会话设置（如只读事务、执行超时）将丢失
+                conn.ping(reconnect=False)
+                return True
+            if self.db_type == 'postgres' and conn.closed:
+                return False
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+    
+    def _rollback(self, conn) -> bool:
+        """
+        出错后回滚（PostgreSQL出错后必须回滚才能继续使用），并确认连接可用
+        
+        Returns:
+            连接是否可继续使用
+        """
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return self._is_alive(conn)
+    
+    @staticmethod
+    def _close_quietly(conn):
+        """关闭连接，忽略错误"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
 class DatabaseConnector:
     """数据库连接器类"""
     
@@ -26,18 +235,42 @@ class DatabaseConnector:
         self.user = db_config.get('user', 'root')
         self.password = db_config.get('password', '')
         self.database = db_config.get('database', '')
-        self.connection = None
+        
+        # 连接池配置
+        self.pool_min_size = db_config.get('pool_min_size', 1)
+        self.pool_max_size = db_config.get('pool_max_size', 5)
+        self.pool_timeout = db_config.get('pool_timeout', 30)
+        self.pool: Optional[ConnectionPool] = None
+        self._pool_lock = threading.Lock()
         
     def get_connection(self):
         """
-        获取数据库连接
+        建立连接池（首次调用时按最小连接数预先连接，可用于检查连通性）
+        
+        Returns:
+            ConnectionPool实例
+        """
+        with self._pool_lock:
+            if self.pool is None:
+                self.pool = ConnectionPool(
+                    self.create_connection,
+                    self.db_type,
+                    self.pool_min_size,
+                    self.pool_max_size,
+                    self.pool_timeout
+                )
+        return self.pool
+    
+    def create_connection(self):
+        """
+        创建一个新的独立数据库连接（不替换共享连接，供连接池等场景使用）
         
         Returns:
             数据库连接对象
         """
         try:
             if self.db_type == 'mysql':
-                self.connection = pymysql.connect(
+                connection = pymysql.connect(
                     host=self.host,
                     port=self.port,
                     user=self.user,
@@ -52,7 +285,7 @@ class DatabaseConnector:
                 try:
                     import psycopg2
                     from psycopg2.extras import RealDictCursor
-                    self.connection = psycopg2.connect(
+                    connection = psycopg2.connect(
                         host=self.host,
                         port=self.port,
                         user=self.user,
@@ -73,19 +306,88 @@ class DatabaseConnector:
                         f"UID={self.user};"
                         f"PWD={self.password}"
                     )
-                    self.connection = pyodbc.connect(connection_string)
+                    connection = pyodbc.connect(connection_string)
                     logger.info(f"成功连接到SQL Server数据库: {self.database}")
                 except ImportError:
                     raise ImportError("SQL Server支持需要安装pyodbc: pip install pyodbc")
             else:
                 raise ValueError(f"不支持的数据库类型: {self.db_type}")
                 
-            return self.connection
+            return connection
             
         except Exception as e:
             logger.error(f"数据库连接失败: {str(e)}")
             raise
     
+    def iter_query(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        batch_size: int = 1000,
+        as_dict: bool = True,
+        timeout_ms: int = 0
+    ) -> Iterator[List[Any]]:
+        """
+        使用服务端游标流式执行查询，按批产出结果，内存占用与结果集大小无关
+        
+        MySQL使用SSCursor/SSDictCursor，PostgreSQL使用命名游标，SQL Server使用默认的流式游标。
+        迭代期间独占一个连接，迭代结束或提前关闭生成器时归还。
+        
+        Args:
+            query: SQL查询语句
+            params: 查询参数
+            batch_size: 每批行数
+            as_dict: 是否返回字典行；为False时返回元组行，减少对象分配
+            timeout_ms: PostgreSQL的语句超时（毫秒，SET LOCAL只对本次事务生效），0表示不设置；
+                MySQL请在查询中使用MAX_EXECUTION_TIME优化器提示
+            
+        Yields:
+            每批结果行列表
+        """
+        pool = self.get_connection()
+        
+        with pool.connection(exclusive=True) as conn:
+            if self.db_type == 'mysql':
+                cursor_class = pymysql.cursors.SSDictCursor if as_dict else pymysql.cursors.SSCursor
+                cursor = conn.cursor(cursor_class)
+            elif self.db_type == 'postgres':
+                from psycopg2.extras import RealDictCursor
+                cursor = conn.cursor(
+                    name=f"iter_query_{threading.get_ident()}_{time.monotonic_ns()}",
+                    cursor_factory=RealDictCursor if as_dict else None
+                )
+                cursor.itersize = batch_size
+            else:
+                cursor = conn.cursor()
+            
+            try:
+                if timeout_ms and self.db_type == 'postgres':
+                    # 命名游标在同一事务中声明，SET LOCAL对其生效，结束时随回滚恢复
+                    with conn.cursor() as setup_cursor:
+                        setup_cursor.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+                cursor.execute(query, params or ())
+                columns = None
+                if as_dict and self.db_type == 'sqlserver':
+                    columns = [column[0] for column in cursor.description]
+                
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if columns is not None:
+                        rows = [dict(zip(columns, row)) for row in rows]
+                    elif not as_dict and self.db_type == 'sqlserver':
+                        rows = [tuple(row) for row in rows]
+                    yield rows
+            except Exception as e:
+                logger.error(f"流式查询执行失败: {str(e)}")
+                raise
+            finally:
+                cursor.close()
+                if self.db_type == 'postgres':
+                    # 命名游标运行在事务中，结束只读事务
+                    conn.rollback()
+    
     def execute_query(self, query: str, params: Optional[tuple] = None):
         """
         执行查询语句
@@ -97,22 +399,23 @@ class DatabaseConnector:
         Returns:
             查询结果列表
         """
-        if not self.connection:
-            self.get_connection()
-            
+        pool = self.get_connection()
+        
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(query, params or ())
-                results = cursor.fetchall()
-                return results
+            with pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params or ())
+                    results = cursor.fetchall()
+                    return results
         except Exception as e:
             logger.error(f"查询执行失败: {str(e)}")
             raise
     
     def close(self):
-        """关闭数据库连接"""
-        if self.connection:
-            self.connection.close()
+        """关闭数据库连接池"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
             logger.info("数据库连接已关闭")
             
     def __enter__(self):
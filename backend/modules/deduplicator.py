@@ -0,0 +1,412 @@
+"""
+样本去重模块
+在样本生成后、验证前去除重复样本：SQL按sqlglot语法树规范化后精确去重，问题按字符n-gram的MinHash/LSH近似去重
+
+SQL先用正则切词得到两个廉价的词法键：精确键相同必定重复，不必解析；粗粒度键（别名按出现顺序改写）不同必定不重复，
+也不必解析。只有粗粒度键相同时才解析语法树比较，大部分样本全程不调用sqlglot。
+"""
+import re
+import zlib
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Iterator, Set
+
+from sqlglot import exp
+from sqlglot.tokens import Tokenizer
+
+try:
+    from .validator import normalize_sql
+    from .sql_features import parse_sql
+except ImportError:
+    from validator import normalize_sql
+    from sql_features import parse_sql
+
+logger = logging.getLogger(__name__)
+
+# 问题规范化时去掉的字符：空白和常见中英文标点
+_QUESTION_STRIP_RE = re.compile(r'[\s,.;:!?，。；：！？、"\'“”‘’（）()【】\[\]《》<>]+')
+
+# MinHash分桶前打散n-gram哈希的乘数（黄金分割常数），使各桶分布均匀
+_MINHASH_MULTIPLIER = 0x9E3779B1
+# 空桶补齐时每跨过一个桶加上的偏移，保证补齐值与真实最小值不会相同
+_DENSIFY_OFFSET = 1 << 32
+
+# 每个LSH桶只与最近登记的若干条比较，单条样本比较的候选总数也有上限：
+# 同一模板生成的问题会大量落入同一个桶，不设上限时比较次数随样本数平方增长
+MAX_BUCKET_CANDIDATES = 8
+MAX_CANDIDATES = 64
+
+# SQL词法切分：字符串、双引号、反引号标识符、注释、数字、单词、多字符运算符、其他单字符
+_SQL_TOKEN_RE = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'"
+    r'|"(?:[^"\\]|\\.|"")*"'
+    r"|`(?:[^`]|``)*`"
+    r"|--[^\n]*|#[^\n]*|/\*.*?\*/"
+    r"|\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+"
+    r"|\w+"
+    r"|<>|!=|<=|>=|\|\||::|\S",
+    re.S
+)
+# 记号类别串上的别名位置：AS之后的名字；紧跟在标识符、字面量、右括号或END等之后且不是函数名的标识符；
+# WITH名称 AS (...)。类别：w标识符 k关键字 e可结束表达式的关键字 s字符串 q双引号 n数字 a为AS
+_ALIAS_KIND_RE = re.compile(r'(?<=a)[wkeq]|(?<=[wsnqe)])w(?!\()|w(?=a\()')
+# 可以直接跟别名的关键字（表达式的结尾）
+_VALUE_END_KEYWORDS = frozenset({'end', 'null', 'true', 'false'})
+# 关键字（小写）-> 记号类别，不在其中的单词是标识符
+_WORD_KINDS = {
+    word.lower(): 'k' for keyword in Tokenizer.KEYWORDS for word in keyword.split() if word.isalpha()
+}
+_WORD_KINDS.update({word: 'e' for word in _VALUE_END_KEYWORDS})
+_WORD_KINDS['as'] = 'a'
+
+
+def canonical_sql(sql: str, dialect: str = "mysql") -> str:
+    """
+    将SQL规范化为去重键：按sqlglot语法树逐节点序列化（与关键字大小写、空白、括号写法无关），
+    标识符转小写，表别名按出现顺序改写为 t1、t2...，投影别名改写为 c1、c2...
+
+    不重新生成SQL文本，只遍历语法树，比 Expression.sql() 快得多。
+
+    Args:
+        sql: SQL语句
+        dialect: SQL方言
+
+    Returns:
+        规范化后的键，无法解析时退化为空白规范化的小写文本
+    """
+    tree = parse_sql(sql, dialect)
+    if tree is None:
+        return normalize_sql(sql).lower()
+
+    table_aliases: Dict[str, str] = {}
+    column_aliases: Dict[str, str] = {}
+    for node in tree.find_all(exp.TableAlias, exp.Alias):
+        if isinstance(node, exp.TableAlias):
+            name = node.name.lower()
+            if name and name not in table_aliases:
+                table_aliases[name] = f"t{len(table_aliases) + 1}"
+        else:
+            name = node.alias.lower()
+            if name and name not in column_aliases:
+                column_aliases[name] = f"c{len(column_aliases) + 1}"
+
+    out: List[str] = []
+    _serialize(tree, out, table_aliases, column_aliases)
+    return ' '.join(out)
+
+
+def _serialize(node: Any, out: List[str], table_aliases: Dict[str, str], column_aliases: Dict[str, str]):
+    """
+    把语法树节点序列化为记号列表（canonical_sql的递归部分）
+
+    Args:
+        node: 语法树节点或参数值
+        out: 输出记号列表
+        table_aliases: 表别名 -> 规范名
+        column_aliases: 投影别名 -> 规范名
+    """
+    if isinstance(node, list):
+        out.append('[')
+        for item in node:
+            _serialize(item, out, table_aliases, column_aliases)
+        out.append(']')
+        return
+    if not isinstance(node, exp.Expression):
+        out.append(repr(node))
+        return
+    if isinstance(node, exp.Identifier):
+        out.append(node.name.lower())
+        return
+    if isinstance(node, exp.Literal):
+        out.append(repr(node.name) if node.is_string else node.name)
+        return
+
+    out.append(type(node).__name__)
+    out.append('(')
+    for key, value in node.args.items():
+        if value is None or value is False or value == []:
+            continue
+        out.append(key + '=')
+        if isinstance(node, exp.TableAlias) and key == 'this':
+            out.append(table_aliases.get(value.name.lower(), value.name.lower()))
+        elif isinstance(node, exp.Alias) and key == 'alias':
+            out.append(column_aliases.get(value.name.lower(), value.name.lower()))
+        elif isinstance(node, exp.Column) and key == 'table':
+            out.append(table_aliases.get(value.name.lower(), value.name.lower()))
+        elif isinstance(node, exp.Column) and key == 'this' and not node.table and node.name.lower() in column_aliases:
+            # ORDER BY / HAVING 中对投影别名的引用
+            out.append(column_aliases[node.name.lower()])
+        else:
+            _serialize(value, out, table_aliases, column_aliases)
+    out.append(')')
+
+
+def sql_lexical_keys(sql: str) -> Tuple[str, str]:
+    """
+    计算SQL的两个词法键（只用正则切词，不解析）
+
+    精确键：关键字和标识符转小写，去掉标识符引号、AS、注释和分号，字符串字面量保持原样；
+    精确键相同的两条SQL规范化后必定相同。
+    粗粒度键：在精确键基础上把别名（AS之后、紧跟在标识符/右括号/字面量之后的标识符，
+    以及这些名字在其他位置的引用）按出现顺序改写，双引号内容转小写；规范化后相同的两条SQL
+    粗粒度键必定相同，因此粗粒度键不同时无需解析即可判定不重复。
+
+    Args:
+        sql: SQL语句
+
+    Returns:
+        (精确键, 粗粒度键)
+    """
+    texts = []
+    kinds = []
+    for token in _SQL_TOKEN_RE.findall(sql):
+        first = token[0]
+        if first.isalpha() or first == '_':
+            token = token.lower()
+            kind = _WORD_KINDS.get(token, 'w')
+        elif first.isdigit() or (first == '.' and len(token) > 1):
+            kind = 'n'
+        elif first == "'":
+            kind = 's'
+        elif first == '"':
+            kind = 'q'
+        elif first == '`':
+            kind, token = 'w', token[1:-1].replace('``', '`').lower()
+        elif token == ';' or token.startswith(('--', '#', '/*')):
+            continue
+        elif token == '!=':
+            kind, token = 'p', '<>'
+        else:
+            kind = token if token in '()' else 'p'
+        texts.append(token)
+        kinds.append(kind)
+
+    kind_text = ''.join(kinds)
+    aliases = {texts[match.start()] for match in _ALIAS_KIND_RE.finditer(kind_text)}
+    exact = []
+    coarse = []
+    renamed: Dict[str, str] = {}
+    for text, kind in zip(texts, kind_text):
+        if kind == 'a':
+            continue
+        exact.append(text)
+        if text in aliases:
+            # 别名按首次出现顺序改写，ORDER BY x 与 ORDER BY y 引用不同别名时键仍然不同
+            coarse.append(renamed.setdefault(text, f"?{len(renamed)}"))
+        else:
+            coarse.append(text.lower() if kind == 'q' else text)
+    return '\x1f'.join(exact), '\x1f'.join(coarse)
+
+
+def question_shingles(question: str, ngram: int = 3) -> Set[int]:
+    """
+    把问题切成字符n-gram并哈希（不依赖分词，适用于中文）
+
+    Args:
+        question: 问题文本
+        ngram: n-gram长度
+
+    Returns:
+        n-gram哈希集合，文本短于ngram时为整段文本的哈希
+    """
+    text = _QUESTION_STRIP_RE.sub('', question).lower()
+    if len(text) <= ngram:
+        return {zlib.crc32(text.encode('utf-8'))} if text else set()
+    return {zlib.crc32(text[i:i + ngram].encode('utf-8')) for i in range(len(text) - ngram + 1)}
+
+
+class SampleDeduplicator:
+    """
+    样本去重器类 - 增量去重，样本逐条到达时即可判断，可在生成批次返回时直接过滤
+
+    SQL精确去重：词法精确键相同直接判重；词法粗粒度键相同时才解析语法树，比较 canonical_sql。
+    问题近似去重：MinHash签名分段（LSH）找候选，再用n-gram集合的Jaccard相似度确认，
+    相似度不低于阈值即视为重复；问题重复的样本不再解析SQL。多线程调用安全。
+    """
+
+    def __init__(
+        self,
+        dialect: str = "mysql",
+        question_threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        ngram: int = 3
+    ):
+        """
+        初始化去重器
+
+        Args:
+            dialect: SQL方言
+            question_threshold: 问题Jaccard相似度阈值，不低于该值视为近似重复；大于等于1时只做SQL精确去重
+            num_perm: MinHash签名长度（单次排列哈希的分桶数）
+            bands: LSH分段数（num_perm需能被整除），每段行数越多，相似度低的问题越少落入同一个桶
+            ngram: 问题n-gram长度
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) 必须能被 bands ({bands}) 整除")
+
+        self.dialect = dialect
+        self.question_threshold = question_threshold
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        self.num_perm = num_perm
+
+        self._exact_keys: Set[bytes] = set()
+        # 粗粒度键 -> [SQL, 规范化键摘要（未解析时为None）]，规范化键在粗粒度键冲突时才计算
+        self._coarse_keys: Dict[bytes, List[List[Any]]] = {}
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(bands)]
+        self._shingles: List[frozenset] = []
+        self._lock = threading.Lock()
+        self.stats = {"seen": 0, "kept": 0, "sql_duplicates": 0, "question_duplicates": 0, "sql_parsed": 0}
+
+    def add(self, sample: Dict[str, str]) -> bool:
+        """
+        判断样本是否重复；不重复时登记并返回True
+
+        Args:
+            sample: 样本字典
+
+        Returns:
+            是否为新样本（False表示重复，应丢弃）
+        """
+        sql = sample.get('output', '')
+        # 空白规范化后文本完全相同的SQL直接判重，连切词都不需要
+        text_key = _digest(normalize_sql(sql))
+
+        check_question = self.question_threshold < 1
+        shingles = frozenset(question_shingles(sample.get('input', ''), self.ngram)) if check_question else None
+        band_keys = self._band_keys(shingles) if shingles else []
+
+        with self._lock:
+            self.stats['seen'] += 1
+            if text_key in self._exact_keys:
+                self.stats['sql_duplicates'] += 1
+                return False
+
+            if band_keys and self._has_similar_question(shingles, band_keys):
+                self.stats['question_duplicates'] += 1
+                return False
+
+            exact, coarse = sql_lexical_keys(sql)
+            exact_key = _digest(exact)
+            coarse_key = _digest(coarse)
+            if exact_key in self._exact_keys:
+                self.stats['sql_duplicates'] += 1
+                return False
+
+            entries = self._coarse_keys.get(coarse_key)
+            if entries is not None and self._has_same_sql(sql, entries):
+                self.stats['sql_duplicates'] += 1
+                return False
+
+            if band_keys:
+                index = len(self._shingles)
+                self._shingles.append(shingles)
+                for buckets, key in zip(self._buckets, band_keys):
+                    buckets.setdefault(key, []).append(index)
+
+            self._coarse_keys.setdefault(coarse_key, []).append([sql, None])
+            self._exact_keys.add(text_key)
+            self._exact_keys.add(exact_key)
+            self.stats['kept'] += 1
+            return True
+
+    def _has_similar_question(self, shingles: frozenset, band_keys: List[Tuple[int, ...]]) -> bool:
+        """
+        在LSH候选中查找近似问题（调用方持有锁）；每个桶只看最近的 MAX_BUCKET_CANDIDATES 条，
+        总共最多比较最近的 MAX_CANDIDATES 条
+        """
+        candidates = set()
+        for buckets, key in zip(self._buckets, band_keys):
+            bucket = buckets.get(key)
+            if bucket:
+                candidates.update(bucket[-MAX_BUCKET_CANDIDATES:])
+
+        size = len(shingles)
+        threshold = self.question_threshold
+        for candidate in sorted(candidates, reverse=True)[:MAX_CANDIDATES]:
+            other = self._shingles[candidate]
+            other_size = len(other)
+            # 集合大小相差过大时Jaccard必定低于阈值，不必求交集
+            if min(size, other_size) < threshold * max(size, other_size):
+                continue
+            intersection = len(shingles & other)
+            if intersection >= threshold * (size + other_size - intersection):
+                return True
+        return False
+
+    def _has_same_sql(self, sql: str, entries: List[List[Any]]) -> bool:
+        """
+        粗粒度键相同的SQL按语法树规范化后比较（调用方持有锁）；已登记SQL的规范化键按需计算并缓存
+        """
+        key = _digest(canonical_sql(sql, self.dialect))
+        self.stats['sql_parsed'] += 1
+        for entry in entries:
+            if entry[1] is None:
+                entry[1] = _digest(canonical_sql(entry[0], self.dialect))
+                self.stats['sql_parsed'] += 1
+            if entry[1] == key:
+                return True
+        return False
+
+    def filter(self, samples: Iterable[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+        """
+        流式过滤重复样本
+
+        Args:
+            samples: 样本的可迭代对象
+
+        Yields:
+            不重复的样本（保持输入顺序）
+        """
+        for sample in samples:
+            if self.add(sample):
+                yield sample
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取去重统计
+
+        Returns:
+            统计字典：seen、kept、sql_duplicates、question_duplicates、sql_parsed（解析语法树的次数）
+        """
+        with self._lock:
+            return dict(self.stats)
+
+    def _band_keys(self, shingles: frozenset) -> List[Tuple[int, ...]]:
+        """
+        计算MinHash签名并按分段切成LSH桶键
+
+        使用单次排列哈希（one permutation hashing）：n-gram哈希打散后按取模分到 num_perm 个桶，
+        每桶取最小值，只遍历一遍n-gram；空桶用右侧最近的非空桶补齐（加上距离偏移），
+        比逐个排列求最小值快一个数量级。签名只用于找候选，最终是否重复由精确Jaccard判定。
+        """
+        size = self.num_perm
+        empty = _DENSIFY_OFFSET  # 大于任何32位哈希值
+        bins = [empty] * size
+        for shingle in shingles:
+            value = (shingle * _MINHASH_MULTIPLIER) & 0xFFFFFFFF
+            index = value % size
+            if value < bins[index]:
+                bins[index] = value
+
+        # 从某个非空桶出发向左绕一圈，空桶取右侧最近非空桶的值
+        start = next(i for i, value in enumerate(bins) if value != empty)
+        signature = list(bins)
+        source, source_index = bins[start], start
+        for step in range(1, size):
+            i = start - step
+            if bins[i] != empty:
+                source, source_index = bins[i], i
+            else:
+                signature[i] = source + ((source_index - i) % size) * _DENSIFY_OFFSET
+        # 每段取间隔bands的桶而不是相邻的桶：相邻空桶补齐自同一个非空桶，放在同一段会降低段内的区分度
+        return [tuple(signature[i::self.bands]) for i in range(self.bands)]
+
+
+def _digest(text: str) -> bytes:
+    """键文本的16字节摘要"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
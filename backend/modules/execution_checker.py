@@ -0,0 +1,296 @@
+"""
+SQL执行验证模块
+通过有上限的只读连接池并发执行候选SQL（或只做EXPLAIN），每条语句设置超时，并统计执行耗时
+"""
+
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, Iterator
+
+from .db_connector import DatabaseConnector, ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# 各数据库超时错误信息中的关键字（小写）
+TIMEOUT_MARKERS = (
+    'maximum statement execution time',  # MySQL 3024
+    'max_statement_time',                # MariaDB
+    'statement timeout',                 # PostgreSQL
+    'query timeout',                     # SQL Server
+    'timeout expired',
+)
+
+# 执行验证模式：execute 实际执行（加LIMIT 1），explain 只生成执行计划不读数据
+EXECUTION_MODES = ('execute', 'explain')
+
+# 支持EXPLAIN JSON输出的数据库
+EXPLAIN_DB_TYPES = ('mysql', 'postgres')
+
+
+class ExecutionChecker:
+    """执行验证器类"""
+
+    def __init__(
+        self,
+        db_connector: DatabaseConnector,
+        pool_size: int = 4,
+        timeout_ms: int = 5000,
+        mode: str = 'execute',
+        max_cost: float = 0
+    ):
+        """
+        初始化执行验证器
+
+        Args:
+            db_connector: 数据库连接器（只用其连接参数，不占用共享连接）
+            pool_size: 只读连接数上限，即最大并发数
+            timeout_ms: 单条语句的执行超时（毫秒）
+            mode: 验证模式，execute 或 explain
+            max_cost: explain模式下允许的最大预估代价，超过视为无效，0表示不限制
+        """
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"不支持的执行验证模式: {mode}")
+
+        self.db_connector = db_connector
+        self.db_type = db_connector.db_type
+        self.pool_size = max(1, pool_size)
+        self.timeout_ms = timeout_ms
+        self.max_cost = max_cost or 0
+
+        if mode == 'explain' and self.db_type not in EXPLAIN_DB_TYPES:
+            logger.warning(f"{self.db_type} 不支持EXPLAIN验证，改为实际执行验证")
+            mode = 'execute'
+        self.mode = mode
+
+        # 只读连接池：按需建立，会话级设置只读和语句超时，与连接器的共享连接池分开
+        self._pool = ConnectionPool(
+            self._open_connection,
+            self.db_type,
+            min_size=0,
+            max_size=self.pool_size,
+            timeout=db_connector.pool_timeout
+        )
+
+        self._stats_lock = threading.Lock()
+        self._latencies: List[float] = []
+        self.failures = 0
+        self.timeouts = 0
+
+    def check(self, sql: str) -> Tuple[bool, str]:
+        """
+        在只读连接上验证一条SQL
+
+        Args:
+            sql: 待验证的SQL（execute模式下调用方负责添加LIMIT）
+
+        Returns:
+            (是否有效, 错误信息)
+        """
+        is_valid, error, _ = self.check_with_plan(sql)
+        return is_valid, error
+
+    def check_with_plan(self, sql: str) -> Tuple[bool, str, Optional[Dict[str, float]]]:
+        """
+        在只读连接上验证一条SQL，explain模式下同时返回预估代价和行数
+
+        Args:
+            sql: 待验证的SQL
+
+        Returns:
+            (是否有效, 错误信息, {"cost": 预估代价, "rows": 预估行数} 或 None)
+        """
+        start = time.perf_counter()
+        try:
+            # 出错时连接池负责回滚，连接损坏则丢弃重建
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    if self.mode == 'explain':
+                        cursor.execute(self._explain_sql(sql))
+                    else:
+                        cursor.execute(sql)
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+            self._record(time.perf_counter() - start)
+        except Exception as e:
+            is_timeout = self._is_timeout(e)
+            self._record(time.perf_counter() - start, failed=True, timeout=is_timeout)
+            if is_timeout:
+                return False, f"执行超时（>{self.timeout_ms}ms）", None
+            return False, str(e), None
+
+        if self.mode != 'explain':
+            return True, "", None
+
+        plan = self._parse_plan(rows)
+        if plan is not None and self.max_cost and plan['cost'] > self.max_cost:
+            return False, f"预估代价 {plan['cost']:.0f} 超过上限 {self.max_cost:.0f}", plan
+        return True, "", plan
+
+    def check_many(self, sqls: List[str]) -> List[Tuple[bool, str, Optional[Dict[str, float]]]]:
+        """
+        并发验证多条SQL
+
+        Args:
+            sqls: SQL列表
+
+        Returns:
+            与输入顺序一致的 (是否有效, 错误信息, 预估代价) 列表
+        """
+        if not sqls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(sqls))) as executor:
+            return list(executor.map(self.check_with_plan, sqls))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取执行耗时统计
+
+        Returns:
+            统计字典（耗时单位毫秒）
+        """
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            failures = self.failures
+            timeouts = self.timeouts
+
+        count = len(latencies)
+        if not count:
+            return {"count": 0, "failures": 0, "timeouts": 0}
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(count - 1, int(count * p))] * 1000, 2)
+
+        return {
+            "count": count,
+            "failures": failures,
+            "timeouts": timeouts,
+            "avg_ms": round(sum(latencies) / count * 1000, 2),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(latencies[-1] * 1000, 2)
+        }
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        self._pool.close()
+
+    def _open_connection(self):
+        """
+        新建一个只读连接并设置语句超时
+
+        Returns:
+            数据库连接对象
+        """
+        conn = self.db_connector.create_connection()
+
+        if self.db_type == 'mysql':
+            conn.autocommit(True)
+            with conn.cursor() as cursor:
+                cursor.execute("SET SESSION TRANSACTION READ ONLY")
+                try:
+                    cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(self.timeout_ms)}")
+                except Exception:
+                    # MariaDB使用max_statement_time（秒）
+                    cursor.execute(f"SET SESSION max_statement_time = {self.timeout_ms / 1000:.3f}")
+
+        elif self.db_type == 'postgres':
+            conn.set_session(readonly=True, autocommit=True)
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET statement_timeout = {int(self.timeout_ms)}")
+
+        elif self.db_type == 'sqlserver':
+            conn.autocommit = True
+            conn.timeout = max(1, int(self.timeout_ms / 1000))
+
+        return conn
+
+    def _explain_sql(self, sql: str) -> str:
+        """
+        构造返回JSON执行计划的EXPLAIN语句
+
+        Args:
+            sql: 原始SQL
+
+        Returns:
+            EXPLAIN语句
+        """
+        sql = sql.strip().rstrip(';')
+        if self.db_type == 'postgres':
+            return f"EXPLAIN (FORMAT JSON) {sql}"
+        return f"EXPLAIN FORMAT=JSON {sql}"
+
+    def _parse_plan(self, rows: Any) -> Optional[Dict[str, float]]:
+        """
+        从EXPLAIN结果中提取预估代价和行数
+
+        Args:
+            rows: EXPLAIN返回的结果行
+
+        Returns:
+            {"cost": 预估代价, "rows": 预估行数}，无法解析时返回None
+        """
+        try:
+            row = rows[0]
+            value = next(iter(row.values())) if isinstance(row, dict) else row[0]
+            plan = json.loads(value) if isinstance(value, str) else value
+
+            if self.db_type == 'postgres':
+                top = plan[0]['Plan']
+                return {"cost": float(top.get('Total Cost', 0)), "rows": float(top.get('Plan Rows', 0))}
+
+            # MySQL 8.3+ 的JSON格式第2版直接给出总代价和行数
+            if 'query_block' not in plan:
+                return {
+                    "cost": float(plan.get('estimated_total_cost', 0)),
+                    "rows": float(plan.get('estimated_rows', 0))
+                }
+            cost_info = plan['query_block'].get('cost_info', {})
+            scanned = [float(v) for v in _find_values(plan, 'rows_examined_per_scan')]
+            return {"cost": float(cost_info.get('query_cost', 0)), "rows": max(scanned, default=0.0)}
+        except Exception as e:
+            logger.debug(f"无法解析执行计划: {str(e)}")
+            return None
+
+    def _record(self, elapsed: float, failed: bool = False, timeout: bool = False):
+        """记录一次执行耗时"""
+        with self._stats_lock:
+            self._latencies.append(elapsed)
+            if failed:
+                self.failures += 1
+            if timeout:
+                self.timeouts += 1
+
+    @staticmethod
+    def _is_timeout(error: Exception) -> bool:
+        """判断异常是否为语句超时"""
+        if type(error).__name__ == 'QueryCanceled':  # psycopg2
+            return True
+        message = str(error).lower()
+        return any(marker in message for marker in TIMEOUT_MARKERS)
+
+
+def _find_values(node: Any, field: str) -> Iterator[Any]:
+    """
+    递归查找JSON中所有名为field的值
+
+    Args:
+        node: JSON节点
+        field: 字段名
+
+    Yields:
+        字段值
+    """
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == field:
+                yield value
+            else:
+                yield from _find_values(value, field)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _find_values(item, field)
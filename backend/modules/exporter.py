@@ -3,28 +3,121 @@
 将验证通过的样本导出为LLaMA-Factory可用的训练数据格式
 """
 
-import json
+import os
 import logging
-from typing import Dict, List, Any
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+try:
+    from .jsonl_io import JsonlWriter
+    from .sql_features import SQL_FEATURES, extract_features
+except ImportError:
+    from jsonl_io import JsonlWriter
+    from sql_features import SQL_FEATURES, extract_features
 
 logger = logging.getLogger(__name__)
 
 
+class SampleStatistics:
+    """样本统计累加器 - 逐条累加，导出时与写文件在同一遍中完成；SQL类型和特征从语法树识别"""
+    
+    def __init__(self, dialect: str = "mysql"):
+        """
+        初始化统计累加器
+        
+        Args:
+            dialect: SQL方言
+        """
+        self.dialect = dialect
+        self.total_samples = 0
+        self.input_length = 0
+        self.output_length = 0
+        
+        # 统计SQL类型
+        self.sql_types = {
+            'SELECT': 0,
+            'INSERT': 0,
+            'UPDATE': 0,
+            'DELETE': 0,
+            'OTHER': 0
+        }
+        
+        # 统计SQL特征
+        self.features = {name: 0 for name in SQL_FEATURES}
+    
+    def add(self, sample: Dict[str, str]):
+        """
+        累加一条样本
+        
+        Args:
+            sample: 样本字典
+        """
+        self.total_samples += 1
+        self.input_length += len(sample['input'])
+        self.output_length += len(sample['output'])
+        
+        sql_type, features = extract_features(sample['output'], self.dialect)
+        
+        # 统计SQL类型
+        self.sql_types[sql_type] += 1
+        
+        # 统计SQL特征
+        for name in features:
+            if name in self.features:
+                self.features[name] += 1
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        汇总为统计信息字典
+        
+        Returns:
+            统计信息字典
+        """
+        # 计算平均长度
+        total = self.total_samples
+        return {
+            'total_samples': total,
+            'sql_types': dict(self.sql_types),
+            'features': dict(self.features),
+            'avg_input_length': round(self.input_length / total, 2) if total > 0 else 0,
+            'avg_output_length': round(self.output_length / total, 2) if total > 0 else 0
+        }
+
+
 class DataExporter:
     """数据导出器类"""
     
-    def __init__(self, samples: List[Dict[str, str]]):
+    def __init__(self, samples: Iterable[Dict[str, str]], dialect: str = "mysql"):
         """
         初始化数据导出器
         
         Args:
-            samples: 样本列表，格式: [{"input": "...", "output": "..."}]
+            samples: 样本的可迭代对象，格式: [{"input": "...", "output": "..."}]；
+                可以是只能遍历一次的生成器（如逐行读取的JSONL文件），此时统计信息在导出过程中顺带收集
+            dialect: SQL方言（用于解析SQL统计特征）
         """
         self.samples = samples
+        self.dialect = dialect
+        self._statistics: Optional[SampleStatistics] = None
+    
+    def _iter_samples(self) -> Iterator[Dict[str, str]]:
+        """遍历样本并同时累加统计信息"""
+        statistics = SampleStatistics(self.dialect)
+        for sample in self.samples:
+            statistics.add(sample)
+            yield sample
+        self._statistics = statistics
+    
+    def _open_writer(self, output_path: str) -> JsonlWriter:
+        """打开输出文件（确保目录存在）"""
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+            logger.info(f"创建输出目录: {output_dir}")
+        return JsonlWriter(output_path)
         
     def export_alpaca(self, output_path: str, instruction: str = None):
         """
-        导出为Alpaca格式
+        导出为Alpaca格式（逐条转换并写入）
         
         Args:
             output_path: 输出文件路径
@@ -35,65 +128,41 @@ class DataExporter:
         
         logger.info(f"导出Alpaca格式数据到: {output_path}")
         
-        # 确保目录存在
-        import os
-        output_dir = os.path.dirname(output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-            logger.info(f"创建输出目录: {output_dir}")
+        with self._open_writer(output_path) as writer:
+            for sample in self._iter_samples():
+                writer.write({
+                    "instruction": instruction,
+                    "input": sample['input'],
+                    "output": sample['output']
+                })
         
-        alpaca_samples = []
-        for sample in self.samples:
-            alpaca_sample = {
-                "instruction": instruction,
-                "input": sample['input'],
-                "output": sample['output']
-            }
-            alpaca_samples.append(alpaca_sample)
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for sample in alpaca_samples:
-                f.write(json.dumps(sample, ensure_ascii=False) + '\n')
-        
-        logger.info(f"成功导出 {len(alpaca_samples)} 条Alpaca格式样本")
+        logger.info(f"成功导出 {writer.count} 条Alpaca格式样本")
     
     def export_sharegpt(self, output_path: str):
         """
-        导出为ShareGPT格式
+        导出为ShareGPT格式（逐条转换并写入）
         
         Args:
             output_path: 输出文件路径
         """
         logger.info(f"导出ShareGPT格式数据到: {output_path}")
         
-        # 确保目录存在
-        import os
-        output_dir = os.path.dirname(output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-            logger.info(f"创建输出目录: {output_dir}")
-        
-        sharegpt_samples = []
-        for sample in self.samples:
-            sharegpt_sample = {
-                "conversations": [
-                    {
-                        "role": "user",
-                        "content": sample['input']
-                    },
-                    {
-                        "role": "assistant",
-                        "content": sample['output']
-                    }
-                ]
-            }
-            sharegpt_samples.append(sharegpt_sample)
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for sample in sharegpt_samples:
-                f.write(json.dumps(sample, ensure_ascii=False) + '\n')
-        
-        logger.info(f"成功导出 {len(sharegpt_samples)} 条ShareGPT格式样本")
+        with self._open_writer(output_path) as writer:
+            for sample in self._iter_samples():
+                writer.write({
+                    "conversations": [
+                        {
+                            "role": "user",
+                            "content": sample['input']
+                        },
+                        {
+                            "role": "assistant",
+                            "content": sample['output']
+                        }
+                    ]
+                })
+        
+        logger.info(f"成功导出 {writer.count} 条ShareGPT格式样本")
     
     def export(self, output_path: str, format_type: str = "alpaca", **kwargs):
         """
@@ -115,72 +184,16 @@ class DataExporter:
         """
         获取数据统计信息
         
+        导出后直接返回导出过程中收集的统计；尚未导出时遍历一次样本计算
+        （样本是只能遍历一次的生成器时，应在导出之后调用）。
+        
         Returns:
             统计信息字典
         """
-        total_samples = len(self.samples)
-        
-        # 统计SQL类型
-        sql_types = {
-            'SELECT': 0,
-            'INSERT': 0,
-            'UPDATE': 0,
-            'DELETE': 0,
-            'OTHER': 0
-        }
-        
-        # 统计SQL特征
-        features = {
-            'with_join': 0,
-            'with_group_by': 0,
-            'with_order_by': 0,
-            'with_limit': 0,
-            'with_subquery': 0,
-            'with_aggregate': 0
-        }
-        
-        for sample in self.samples:
-            sql = sample['output'].upper()
-            
-            # 统计SQL类型
-            if sql.startswith('SELECT'):
-                sql_types['SELECT'] += 1
-            elif sql.startswith('INSERT'):
-                sql_types['INSERT'] += 1
-            elif sql.startswith('UPDATE'):
-                sql_types['UPDATE'] += 1
-            elif sql.startswith('DELETE'):
-                sql_types['DELETE'] += 1
-            else:
-                sql_types['OTHER'] += 1
-            
-            # 统计SQL特征
-            if 'JOIN' in sql:
-                features['with_join'] += 1
-            if 'GROUP BY' in sql:
-                features['with_group_by'] += 1
-            if 'ORDER BY' in sql:
-                features['with_order_by'] += 1
-            if 'LIMIT' in sql:
-                features['with_limit'] += 1
-            if any(sub in sql for sub in ['(SELECT', '( SELECT']):
-                features['with_subquery'] += 1
-            if any(agg in sql for agg in ['COUNT(', 'SUM(', 'AVG(', 'MAX(', 'MIN(']):
-                features['with_aggregate'] += 1
-        
-        # 计算平均长度
-        avg_input_length = sum(len(s['input']) for s in self.samples) / total_samples if total_samples > 0 else 0
-        avg_output_length = sum(len(s['output']) for s in self.samples) / total_samples if total_samples > 0 else 0
-        
-        statistics = {
-            'total_samples': total_samples,
-            'sql_types': sql_types,
-            'features': features,
-            'avg_input_length': round(avg_input_length, 2),
-            'avg_output_length': round(avg_output_length, 2)
-        }
-        
-        return statistics
+        if self._statistics is None:
+            for _ in self._iter_samples():
+                pass
+        return self._statistics.to_dict()
     
     def print_statistics(self):
         """打印数据统计信息"""
@@ -206,21 +219,27 @@ class DataExporter:
 
 
 def export_samples(
-    samples: List[Dict[str, str]],
+    samples: Iterable[Dict[str, str]],
     output_path: str,
     format_type: str = "alpaca",
+    dialect: str = "mysql",
     **kwargs
-):
+) -> Dict[str, Any]:
     """
-    导出样本的便捷函数
+    导出样本的便捷函数，逐条转换写入并在同一遍中统计
     
     Args:
-        samples: 样本列表
+        samples: 样本的可迭代对象（可以是逐行读取JSONL文件的生成器）
         output_path: 输出文件路径
         format_type: 格式类型
+        dialect: SQL方言（用于解析SQL统计特征）
         **kwargs: 其他参数
+        
+    Returns:
+        统计信息字典
     """
-    exporter = DataExporter(samples)
-    exporter.print_statistics()
+    exporter = DataExporter(samples, dialect)
     exporter.export(output_path, format_type, **kwargs)
+    exporter.print_statistics()
+    return exporter.get_statistics()
 
@@ -4,8 +4,10 @@
 """
 import re
 import json
+import asyncio
 import logging
-from typing import Dict, List, Any,Optional
+import threading
+from typing import Dict, List, Any, Callable, Iterable, Optional, Tuple
 #from .llm_client import LLMClient
 import sys
 import os
@@ -13,33 +15,118 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # 然后修改导入
 try:
-    from .llm_client import LLMClient
+    from .llm_client import LLMClient, AsyncLLMClient
+    from .run_manifest import ChunkCheckpoint
+    from .jsonl_io import JsonlWriter, iter_jsonl, write_jsonl
+    from .deduplicator import SampleDeduplicator
+    from .sql_features import FeatureCoverage, extract_features
+    from .context_builder import SchemaContextBuilder
 
 except ImportError:
-    from llm_client import LLMClient
+    from llm_client import LLMClient, AsyncLLMClient
+    from run_manifest import ChunkCheckpoint
+    from jsonl_io import JsonlWriter, iter_jsonl, write_jsonl
+    from deduplicator import SampleDeduplicator
+    from sql_features import FeatureCoverage, extract_features
+    from context_builder import SchemaContextBuilder
 
 
 logger = logging.getLogger(__name__)
 
 
+class _ChunkOrderBuffer:
+    """按批次序号顺序交付样本：先完成的批次暂存，直到排在它前面的批次都完成"""
+    
+    def __init__(self, deliver: Callable[[Dict[str, str]], None]):
+        """
+        Args:
+            deliver: 按顺序接收样本的回调
+        """
+        self._deliver = deliver
+        self._next = 0
+        self._done: Dict[int, List[Dict[str, str]]] = {}
+    
+    def finish(self, seq: int, samples: List[Dict[str, str]]):
+        """
+        登记一个已完成的批次，并交付从下一个待交付序号起连续完成的批次
+        
+        Args:
+            seq: 批次在本轮中的序号（从0开始）
+            samples: 批次的样本
+        """
+        self._done[seq] = samples
+        while self._next in self._done:
+            for sample in self._done.pop(self._next):
+                self._deliver(sample)
+            self._next += 1
+
+
 class SampleGenerator:
     """样本生成器类"""
     
-    def __init__(self, llm_client: LLMClient, metadata: Dict[str, Any],db_name: Optional[str] = None):
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        metadata: Dict[str, Any],
+        db_name: Optional[str] = None,
+        max_workers: int = 1,
+        chunk_size: int = 30,
+        max_chunk_retries: int = 3,
+        stream: bool = False,
+        on_sample: Optional[Callable[[Dict[str, str]], None]] = None,
+        use_cache: Optional[bool] = None,
+        checkpoint: Optional[ChunkCheckpoint] = None,
+        deduplicator: Optional[SampleDeduplicator] = None,
+        feature_targets: Optional[Dict[str, float]] = None,
+        context_token_budget: int = 0,
+        on_ordered_sample: Optional[Callable[[Dict[str, str]], None]] = None
+    ):
         """
         初始化样本生成器
         Args:
             llm_client: LLM客户端实例
             metadata: 元数据字典
+            db_name: 数据库名称
+            max_workers: 并发执行的生成批次数，1表示串行
+            chunk_size: 单次LLM调用生成的最大样本数
+            max_chunk_retries: 样本不足时的补充轮数上限
+            stream: 是否使用流式调用，逐行解析LLM输出
+            on_sample: 每解析出一条样本时的回调（串行调用，可用于实时写盘和校验）
+            use_cache: 是否使用LLM响应缓存，None表示按LLM客户端配置
+            checkpoint: 生成检查点，已完成的批次直接复用，新完成的批次立即落盘
+            deduplicator: 样本去重器，重复样本在批次内直接丢弃（不回调、不计数），由补充轮次补足
+            feature_targets: SQL特征目标分布（见sql_features.DEFAULT_FEATURE_TARGETS），
+                按主题跟踪特征覆盖并在每批提示词中要求补足缺口，None表示不引导
+            context_token_budget: 每个主题DDL上下文的Token预算，超出时按相关性省略次要字段，0表示不限制
+            on_ordered_sample: 按确定顺序（轮次、主题、批次）交付样本的回调，与并发完成的先后无关；
+                先完成的批次在内存中暂存到前面的批次完成为止
         """
         self.llm_client = llm_client
+        # 生成逻辑只有异步实现，同步接口通过LLMClient门面的事件循环执行
+        self._aclient = getattr(llm_client, 'aclient', llm_client)
         self.metadata = metadata
         self.db_name = db_name or ''
+        self.max_workers = max(1, int(max_workers or 1))
+        self.chunk_size = max(1, int(chunk_size or 1))
+        self.max_chunk_retries = max(0, int(max_chunk_retries or 0))
+        self.stream = stream
+        self.on_sample = on_sample
+        self.on_ordered_sample = on_ordered_sample
+        self.use_cache = use_cache
+        self.checkpoint = checkpoint
+        self.deduplicator = deduplicator
+        self.feature_targets = feature_targets or None
+        self.context_builder = SchemaContextBuilder(metadata, context_token_budget)
+        self._sample_lock = threading.Lock()
 
     def generate_samples(self, plan: Dict[str, Any], dialect: str = "mysql") -> List[Dict[str, str]]:
         """
         根据规划生成样本
         
+        每个主题按chunk_size拆分为多个批次，所有主题的批次并发执行（max_workers限制同时在途的批次数）；
+        一轮结束后对仍不足目标数量的主题继续补充，直到达到目标或用完max_chunk_retries轮。
+        同步接口在LLMClient的事件循环中执行agenerate_samples的同一套逻辑（llm_client需为LLMClient）。
+        
         Args:
             plan: 主题规划字典
             dialect: SQL方言
@@ -47,138 +134,409 @@ class SampleGenerator:
         Returns:
             样本列表，每个样本格式: {"input": "问题", "output": "SQL"}
         """
-        logger.info("开始生成NL2SQL样本...")
+        return self.llm_client.run(self.agenerate_samples(plan, dialect))
+    
+    def emit_samples(self, plan: Dict[str, Any], dialect: str = "mysql") -> int:
+        """
+        根据规划生成样本，样本只交给on_sample回调（如追加写盘），不在内存中保留，内存占用与样本总数无关
         
-        all_samples = []
-        topics = plan.get('topics', [])
+        Args:
+            plan: 主题规划字典
+            dialect: SQL方言
+            
+        Returns:
+            生成的样本数
+        """
+        return self.llm_client.run(self.aemit_samples(plan, dialect))
+    
+    async def agenerate_samples(self, plan: Dict[str, Any], dialect: str = "mysql") -> List[Dict[str, str]]:
+        """
+        根据规划异步生成样本（批次拆分与补充轮次见generate_samples）
         
-        for i, topic in enumerate(topics, 1):
-            logger.info(f"处理主题 {i}/{len(topics)}: {topic['name']} (目标: {topic['count']}条)")
+        Args:
+            plan: 主题规划字典
+            dialect: SQL方言
             
-            try:
-                # 生成该主题的样本
-                topic_samples = self._generate_topic_samples(topic, dialect)
-                all_samples.extend(topic_samples)
-                logger.info(f"主题 {topic['name']} 生成了 {len(topic_samples)} 条样本")
-                
-            except Exception as e:
-                logger.error(f"主题 {topic['name']} 生成失败: {str(e)}")
-                continue
+        Returns:
+            样本列表，每个样本格式: {"input": "问题", "output": "SQL"}
+        """
+        states = await self._arun_rounds(plan, dialect, collect=True)
+        return self._collect_samples(states)
+    
+    async def aemit_samples(self, plan: Dict[str, Any], dialect: str = "mysql") -> int:
+        """
+        异步生成样本，样本只交给on_sample回调，不在内存中保留（见emit_samples）
         
-        logger.info(f"总共生成 {len(all_samples)} 条样本")
-        return all_samples
+        Args:
+            plan: 主题规划字典
+            dialect: SQL方言
+            
+        Returns:
+            生成的样本数
+        """
+        return self._log_topic_counts(await self._arun_rounds(plan, dialect, collect=False))
+    
+    def _init_states(self, plan: Dict[str, Any], dialect: str, collect: bool) -> List[Dict[str, Any]]:
+        """初始化各主题的生成状态（跳过初始化失败和目标为0的主题）"""
+        topics = plan.get('topics', [])
+        states = []
+        for i, topic in enumerate(topics, 1):
+            state = self._init_topic_state(i, topic, len(topics), dialect)
+            if state is not None:
+                state['samples'] = [] if collect else None
+                states.append(state)
+        return states
     
-    def _generate_topic_samples(self, topic: Dict[str, Any], dialect: str) -> List[Dict[str, str]]:
+    def _record_chunk(self, job: Dict[str, Any], chunk_samples: List[Dict[str, str]]):
+        """记录一个批次的结果：累加主题的已生成数量，需要时保留样本"""
+        state = job['state']
+        state['generated'] += len(chunk_samples)
+        if state['samples'] is not None:
+            state['samples'].extend(chunk_samples)
+    
+    async def _arun_rounds(self, plan: Dict[str, Any], dialect: str, collect: bool) -> List[Dict[str, Any]]:
         """
-        为单个主题生成样本
+        执行首轮和补充轮次的生成批次
         
         Args:
-            topic: 主题信息
+            plan: 主题规划字典
             dialect: SQL方言
+            collect: 是否在主题状态中保留样本
             
         Returns:
-            样本列表
+            主题状态列表
         """
-        # 确保count是整数（修复浮点数切片问题）
-        target_count = int(round(topic['count']))
+        logger.info("开始生成NL2SQL样本...")
+        states = self._init_states(plan, dialect, collect)
         
-        # 如果目标数量为0，跳过此主题
-        if target_count == 0:
-            logger.warning(f"主题 {topic['name']} 的目标样本数为0，跳过")
-            return []
+        semaphore = asyncio.Semaphore(self.max_workers)
+        if self.max_workers > 1:
+            logger.info(f"并发生成模式，最大并发批次数: {self.max_workers}")
         
-        # 获取该主题涉及的表的DDL
-        ddl_snippet = self._get_simplified_ddl(topic['tables'], dialect)
+        async def run_job(job: Dict[str, Any], order_buffer: Optional[_ChunkOrderBuffer]) -> List[Dict[str, str]]:
+            async with semaphore:
+                samples = await self._agenerate_chunk_safe(job, dialect)
+            if order_buffer is not None:
+                order_buffer.finish(job['seq'], samples)
+            return samples
         
-        # 构建生成提示词
-        prompt = self._build_generation_prompt(
-            topic['name'],
-            ddl_snippet,
-            target_count,
-            dialect
-        )
+        for round_no in range(self.max_chunk_retries + 1):
+            jobs = self._plan_chunk_jobs(states, round_no)
+            if not jobs:
+                break
+            
+            # 每轮的批次全部完成后才规划下一轮，按轮分别排序即可得到全局确定的顺序
+            order_buffer = _ChunkOrderBuffer(self.on_ordered_sample) if self.on_ordered_sample else None
+            
+            if round_no > 0:
+                missing = sum(job['count'] for job in jobs)
+                logger.warning(f"第 {round_no}/{self.max_chunk_retries} 轮补充生成，待补充 {missing} 条样本")
+            
+            # gather按传入顺序返回结果，输出顺序与规划一致
+            results = await asyncio.gather(*(run_job(job, order_buffer) for job in jobs))
+            for job, chunk_samples in zip(jobs, results):
+                self._record_chunk(job, chunk_samples)
         
-        # 调用LLM生成样本
-        response = self.llm_client.call_llm(prompt, expect_json=False)
+        return states
+    
+    def _collect_samples(self, states: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        按规划顺序汇总各主题的样本
         
-        # 解析样本
-        samples = self._parse_samples(response)
+        Args:
+            states: 主题状态列表
+            
+        Returns:
+            样本列表
+        """
+        self._log_topic_counts(states)
+        all_samples = []
+        for state in states:
+            all_samples.extend(state['samples'][:state['target']])  # 确保不超过目标数量
+        return all_samples
+    
+    def _log_topic_counts(self, states: List[Dict[str, Any]]) -> int:
+        """
+        记录各主题的生成数量和特征覆盖
         
-        # 如果生成的样本数量不足，尝试补充
-        if len(samples) < target_count:
-            logger.warning(f"生成样本不足: {len(samples)}/{target_count}，尝试补充...")
-            remaining = target_count - len(samples)
+        Args:
+            states: 主题状态列表
             
-            try:
-                additional_samples = self._generate_additional_samples(
-                    topic['name'],
-                    ddl_snippet,
-                    remaining,
-                    dialect
-                )
-                samples.extend(additional_samples)
-            except Exception as e:
-                logger.warning(f"补充样本失败: {str(e)}")
-        
-        return samples[:target_count]  # 确保不超过目标数量
+        Returns:
+            样本总数
+        """
+        total = 0
+        for state in states:
+            generated = min(state['generated'], state['target'])
+            if generated < state['target']:
+                logger.warning(f"主题 {state['topic']['name']} 样本不足: {generated}/{state['target']}")
+            logger.info(f"主题 {state['topic']['name']} 生成了 {generated} 条样本")
+            if state['coverage'] is not None:
+                counts = state['coverage'].summary()['counts']
+                logger.info(f"主题 {state['topic']['name']} 特征覆盖: {counts}")
+            total += generated
+        
+        logger.info(f"总共生成 {total} 条样本")
+        return total
     
-    def _get_simplified_ddl(self, table_names: List[str], dialect: str) -> str:
+    def _init_topic_state(
+        self,
+        index: int,
+        topic: Dict[str, Any],
+        total: int,
+        dialect: str
+    ) -> Optional[Dict[str, Any]]:
         """
-        获取简化的DDL语句
+        初始化单个主题的生成状态，失败时记录日志并返回None，不影响其他主题
         
         Args:
-            table_names: 表名列表
+            index: 主题序号（从1开始）
+            topic: 主题信息
+            total: 主题总数
             dialect: SQL方言
             
         Returns:
-            DDL文本
+            主题状态字典，包含目标数量、DDL片段和已生成数量
+        """
+        logger.info(f"处理主题 {index}/{total}: {topic['name']} (目标: {topic['count']}条)")
+        
+        try:
+            # 确保count是整数（修复浮点数切片问题）
+            target_count = int(round(topic['count']))
+            
+            # 如果目标数量为0，跳过此主题
+            if target_count == 0:
+                logger.warning(f"主题 {topic['name']} 的目标样本数为0，跳过")
+                return None
+            
+            return {
+                "index": index,
+                "topic": topic,
+                "target": target_count,
+                "ddl": self._get_simplified_ddl(topic['tables'], dialect),
+                "generated": 0,
+                "coverage": FeatureCoverage(target_count, self.feature_targets) if self.feature_targets else None
+            }
+            
+        except Exception as e:
+            logger.error(f"主题 {topic['name']} 生成失败: {str(e)}")
+            return None
+    
+    def _plan_chunk_jobs(self, states: List[Dict[str, Any]], round_no: int = 0) -> List[Dict[str, Any]]:
         """
-        ddl_lines = []
+        将各主题缺少的样本数拆分为不超过chunk_size的生成批次
         
-        for table_name in table_names:
-            if table_name not in self.metadata:
-                logger.warning(f"表 {table_name} 不在元数据中，跳过")
+        Args:
+            states: 主题状态列表
+            round_no: 生成轮次，0为首轮
+            
+        Returns:
+            批次列表，按主题顺序、批次顺序排列，seq为批次在本轮中的序号，feature_hint为本批的特征要求
+        """
+        jobs = []
+        for state in states:
+            remaining = state['target'] - state['generated']
+            if remaining <= 0:
                 continue
             
-            table_info = self.metadata[table_name]
+            counts = [self.chunk_size] * (remaining // self.chunk_size)
+            if remaining % self.chunk_size:
+                counts.append(remaining % self.chunk_size)
             
-            # 构建CREATE TABLE语句
-            ddl_lines.append(f"\nCREATE TABLE {table_name} (")
+            # 特征要求在规划时按当前覆盖一次分配给各批次，与批次并发完成的先后无关
+            coverage = state['coverage']
+            hints = coverage.steering_hints(counts) if coverage is not None else [""] * len(counts)
+            for i, (count, hint) in enumerate(zip(counts, hints), 1):
+                jobs.append({
+                    "state": state, "count": count, "batch": (i, len(counts)), "round": round_no,
+                    "seq": len(jobs), "feature_hint": hint
+                })
+        return jobs
+    
+    async def _agenerate_chunk_safe(self, job: Dict[str, Any], dialect: str) -> List[Dict[str, str]]:
+        """
+        生成单个批次的样本，失败时记录日志并返回已生成的部分，缺少的数量由后续补充轮次补足
+        
+        Args:
+            job: 批次信息
+            dialect: SQL方言
             
-            columns = []
-            for col in table_info['columns']:
-                col_def = f"  {col['name']} {col['column_type']}"
-                
-                if not col['nullable']:
-                    col_def += " NOT NULL"
-                
-                if col.get('comment'):
-                    col_def += f" COMMENT '{col['comment']}'"
-                
-                columns.append(col_def)
+        Returns:
+            样本列表（出错时为出错前已生成的样本）
+        """
+        topic_name = job['state']['topic']['name']
+        key = self._chunk_key(job)
+        if self.checkpoint is not None:
+            cached = self.checkpoint.get(key)
+            if cached is not None:
+                # 复用的样本也要登记到去重器，后续批次才能与之去重
+                cached = [
+                    sample for sample in cached
+                    if self._accept_sample(sample, dialect, job['state']['coverage'])
+                ]
+                for sample in cached:
+                    self._emit_sample(sample)
+                return cached
+        # 样本列表由这里持有：流式生成中途出错时，已产出（已写盘、已登记去重）的样本仍然保留
+        samples: List[Dict[str, str]] = []
+        try:
+            await self._agenerate_chunk(
+                topic_name,
+                job['state']['ddl'],
+                job['count'],
+                dialect,
+                job['batch'],
+                f"round-{job['round']}",
+                job['state']['coverage'],
+                samples,
+                job['feature_hint']
+            )
+        except Exception as e:
+            logger.error(
+                f"主题 {topic_name} 批次 {job['batch'][0]}/{job['batch'][1]} 生成失败"
+                f"（保留已生成的 {len(samples)} 条）: {str(e)}"
+            )
+        if self.checkpoint is not None and samples:
+            self.checkpoint.put(key, samples)
+        return samples
+    
+    async def _agenerate_chunk(
+        self,
+        topic_name: str,
+        ddl_snippet: str,
+        count: int,
+        dialect: str,
+        batch: Optional[Tuple[int, int]] = None,
+        cache_salt: str = "",
+        coverage: Optional[FeatureCoverage] = None,
+        samples: Optional[List[Dict[str, str]]] = None,
+        feature_hint: str = ""
+    ) -> List[Dict[str, str]]:
+        """
+        调用一次LLM生成一个批次的样本
+        
+        Args:
+            topic_name: 主题名称
+            ddl_snippet: DDL片段
+            count: 生成数量
+            dialect: SQL方言
+            batch: (批次序号, 批次总数)
+            cache_salt: 缓存键附加值，补充轮次与首轮提示词相同时也各自缓存
+            coverage: 主题的特征覆盖，用于记录新样本的特征
+            samples: 收集样本的列表（由调用方持有，出错时已收集的样本不会丢失），None表示新建
+            feature_hint: 本批的SQL特征要求（规划批次时由主题特征覆盖分配）
             
-            # 添加主键
-            if table_info.get('primary_keys'):
-                pk_cols = ", ".join(table_info['primary_keys'])
-                columns.append(f"  PRIMARY KEY ({pk_cols})")
+        Returns:
+            样本列表
+        """
+        prompt = self._build_generation_prompt(topic_name, ddl_snippet, count, dialect, batch, feature_hint)
+        if samples is None:
+            samples = []
+        
+        if not self.stream:
+            response = await self._aclient.call_llm(
+                prompt, expect_json=False, use_cache=self.use_cache, cache_salt=cache_salt
+            )
+            for sample in self._parse_samples(response):
+                if len(samples) >= count:
+                    break
+                if self._accept_sample(sample, dialect, coverage):
+                    samples.append(sample)
+                    self._emit_sample(sample)
+            return samples
+        
+        # 流式模式：每收到一行就解析并立即交给回调，生成与下游处理重叠
+        lines = self._aclient.stream_llm_lines(prompt, use_cache=self.use_cache, cache_salt=cache_salt)
+        try:
+            async for line in lines:
+                sample = self._parse_sample_line(line)
+                if sample is None or not self._accept_sample(sample, dialect, coverage):
+                    continue
+                samples.append(sample)
+                self._emit_sample(sample)
+                if len(samples) >= count:
+                    break
+        finally:
+            await lines.aclose()
+        return samples
+    
+    def _accept_sample(
+        self,
+        sample: Dict[str, str],
+        dialect: str,
+        coverage: Optional[FeatureCoverage] = None
+    ) -> bool:
+        """
+        去重检查，接受的样本记入主题的特征覆盖
+        
+        Args:
+            sample: 样本字典
+            dialect: SQL方言
+            coverage: 主题的特征覆盖
             
-            ddl_lines.append(",\n".join(columns))
-            ddl_lines.append(");")
+        Returns:
+            是否接受（False表示重复）
+        """
+        if self.deduplicator is not None and not self.deduplicator.add(sample):
+            return False
+        if coverage is not None:
+            coverage.add(extract_features(sample['output'], dialect)[1])
+        return True
+    
+    @staticmethod
+    def _chunk_key(job: Dict[str, Any]) -> str:
+        """
+        批次的检查点键：主题序号、名称、表集合、轮次、批次号和数量都相同才视为同一批次
+        
+        Args:
+            job: 批次信息
             
-            # 添加外键关系说明（作为注释）
-            if table_info.get('foreign_keys'):
-                ddl_lines.append(f"-- 外键关系:")
-                for col, ref in table_info['foreign_keys'].items():
-                    ddl_lines.append(f"--   {col} -> {ref}")
+        Returns:
+            批次键
+        """
+        state = job['state']
+        return "|".join([
+            str(state['index']),
+            state['topic']['name'],
+            ",".join(state['topic']['tables']),
+            f"round-{job['round']}",
+            f"{job['batch'][0]}/{job['batch'][1]}",
+            str(job['count'])
+        ])
+    
+    def _emit_sample(self, sample: Dict[str, str]):
+        """
+        将新样本交给on_sample回调，多线程下串行调用
         
-        return "\n".join(ddl_lines)
+        Args:
+            sample: 样本字典
+        """
+        if self.on_sample is None:
+            return
+        with self._sample_lock:
+            self.on_sample(sample)
+    
+    def _get_simplified_ddl(self, table_names: List[str], dialect: str) -> str:
+        """
+        获取简化的DDL语句（在上下文Token预算内按字段相关性精简，同一组表只构建一次）
+        
+        Args:
+            table_names: 表名列表
+            dialect: SQL方言
+            
+        Returns:
+            DDL文本
+        """
+        return self.context_builder.build(table_names)
     
     def _build_generation_prompt(
         self,
         topic_name: str,
         ddl_snippet: str,
         count: int,
-        dialect: str
+        dialect: str,
+        batch: Optional[Tuple[int, int]] = None,
+        feature_hint: str = ""
     ) -> str:
         """
         构建生成提示词
@@ -188,10 +546,19 @@ class SampleGenerator:
             ddl_snippet: DDL片段
             count: 生成数量
             dialect: SQL方言
+            batch: (批次序号, 批次总数)，多批次时提示LLM避免与其他批次重复
+            feature_hint: 本批的SQL特征要求（由主题特征覆盖生成）
             
         Returns:
             提示词文本
         """
+        extra_hints = []
+        if batch and batch[1] > 1:
+            extra_hints.append(f"这是该主题的第 {batch[0]}/{batch[1]} 批样本，请尽量避免与其他批次的问题重复")
+        if feature_hint:
+            extra_hints.append(feature_hint)
+        batch_hint = "".join(f"\n{i}. {hint}" for i, hint in enumerate(extra_hints, 6))
+        
         prompt = f"""你是SQL开发专家。请基于以下数据库表结构，生成 {count} 条关于"{topic_name}"主题的自然语言问题及对应的SQL查询。
 
 SQL方言: {dialect}
@@ -204,7 +571,7 @@ SQL方言: {dialect}
 2. 仅使用上述表结构中的表和字段
 3. 问题应该多样化，包括：简单查询、聚合统计、JOIN关联、WHERE条件、GROUP BY分组、ORDER BY排序等
 4. 每条样本输出一行JSON格式: {{"input":"自然语言问题","output":"SQL语句"}}
-5. 不要添加任何解释文字，只输出JSON行
+5. 不要添加任何解释文字，只输出JSON行{batch_hint}
 
 示例格式:
 {{"input":"查询所有用户的姓名和邮箱","output":"SELECT name, email FROM users;"}}
@@ -228,68 +595,61 @@ SQL方言: {dialect}
         lines = response.strip().split('\n')
         
         for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # 跳过注释和非JSON行
-            if line.startswith('#') or line.startswith('//'):
-                continue
-            
-            try:
-                # 尝试解析JSON
-                sample = json.loads(line)
-                
-                # 验证必需字段
-                if 'input' in sample and 'output' in sample:
-                    samples.append({
-                        "input": sample['input'].strip(),
-                        "output": sample['output'].strip()
-                    })
-                else:
-                    logger.warning(f"样本缺少必需字段，跳过: {line[:50]}")
-                    
-            except json.JSONDecodeError:
-                logger.warning(f"无法解析JSON，跳过: {line[:50]}")
-                continue
+            sample = self._parse_sample_line(line)
+            if sample is not None:
+                samples.append(sample)
         
         return samples
     
-    def _generate_additional_samples(
-        self,
-        topic_name: str,
-        ddl_snippet: str,
-        count: int,
-        dialect: str
-    ) -> List[Dict[str, str]]:
+    def _parse_sample_line(self, line: str) -> Optional[Dict[str, str]]:
         """
-        生成额外的样本（用于补充不足的部分）
+        解析单行JSONL样本
         
         Args:
-            topic_name: 主题名称
-            ddl_snippet: DDL片段
-            count: 生成数量
-            dialect: SQL方言
+            line: 响应中的一行文本
             
         Returns:
-            样本列表
+            样本字典，空行、注释或无法解析时返回None
         """
-        prompt = self._build_generation_prompt(topic_name, ddl_snippet, count, dialect)
-        response = self.llm_client.call_llm(prompt, expect_json=False)
-        return self._parse_samples(response)
+        line = line.strip()
+        if not line:
+            return None
+        
+        # 跳过注释和非JSON行
+        if line.startswith('#') or line.startswith('//'):
+            return None
+        
+        try:
+            # 尝试解析JSON
+            sample = json.loads(line)
+            
+            # 验证必需字段
+            if isinstance(sample, dict) and 'input' in sample and 'output' in sample:
+                return {
+                    "input": sample['input'].strip(),
+                    "output": sample['output'].strip()
+                }
+            logger.warning(f"样本缺少必需字段，跳过: {line[:50]}")
+                
+        except json.JSONDecodeError:
+            logger.warning(f"无法解析JSON，跳过: {line[:50]}")
+        
+        return None
     
-    def save_samples(self, samples: List[Dict[str, str]], output_path: str):
+    def save_samples(self, samples: Iterable[Dict[str, str]], output_path: str) -> int:
         """
-        保存样本到JSONL文件
+        保存样本到JSONL文件（逐条写入临时文件后原子替换，重写过程中崩溃不会丢失原文件）
         
         Args:
-            samples: 样本列表
+            samples: 样本的可迭代对象
             output_path: 输出文件路径
+            
+        Returns:
+            保存的样本数
         """
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for sample in samples:
-                f.write(json.dumps(sample, ensure_ascii=False) + '\n')
-        logger.info(f"样本已保存到: {output_path} (共{len(samples)}条)")
+        count = write_jsonl(output_path, samples, atomic=True)
+        logger.info(f"样本已保存到: {output_path} (共{count}条)")
+        return count
 
     #添加SQL中表名的抽取方法【小写】
     def extract_tables_with_sqlparse(self,sql: str) -> List[str]:
@@ -338,42 +698,65 @@ SQL方言: {dialect}
         return tables
 
 
-    def save_samples_rag(self, samples: List[Dict[str, str]], output_path: str):
+    def save_samples_rag(self, samples: Iterable[Dict[str, str]], output_path: str):
         """
                保存样本到JSONL文件
 
                Args:
-                   samples: 样本列表
+                   samples: 样本的可迭代对象
                    output_path: 输出文件路径
                """
-        sql_doc_rag=[]
-        for sample in samples:
-            question=sample['input']
-            sql=sample['output']
-            sql_raw={'db_name':self.db_name,'question':question,'sql':sql,'tables':self.extract_tables_with_sqlparse(sql)}
-            sql_doc_rag.append(sql_raw)
         # output_path输入文件路径当前目录下创建一个文件夹
         output_path = Path(output_path)
         output_dir = output_path.parent
         ddl_dir = output_dir / 'ddl_mysql'
         ddl_dir.mkdir(parents=True, exist_ok=True)
         doc_file_path = ddl_dir / 'sql_parse.jsonl'
+        # 文件内容为JSON数组，逐条写入数组元素，不在内存中构造整个数组
         with open(doc_file_path, 'w', encoding='utf-8') as f:
-            json.dump(sql_doc_rag, f, ensure_ascii=False, indent=2)
+            f.write('[')
+            for i, sample in enumerate(samples):
+                question=sample['input']
+                sql=sample['output']
+                sql_raw={'db_name':self.db_name,'question':question,'sql':sql,'tables':self.extract_tables_with_sqlparse(sql)}
+                item = json.dumps(sql_raw, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+                f.write(('\n  ' if i == 0 else ',\n  ') + item)
+            f.write('\n]' if f.tell() > 1 else ']')
         logger.info(f"samples文档已保存到: {doc_file_path}")
 
 
 
+def _log_dedup_stats(deduplicator: Optional[SampleDeduplicator]):
+    """记录去重统计"""
+    if deduplicator is None:
+        return
+    stats = deduplicator.get_stats()
+    logger.info(
+        f"去重: 共 {stats['seen']} 条, 保留 {stats['kept']} 条, "
+        f"SQL重复 {stats['sql_duplicates']} 条, 问题近似重复 {stats['question_duplicates']} 条"
+    )
+
+
 def generate_and_save_samples(
     llm_client: LLMClient,
     metadata: Dict[str, Any],
     plan: Dict[str, Any],
     output_path: str,
     dialect: str = "mysql",
-    db_name: Optional[str] = None
-) -> List[Dict[str, str]]:
+    db_name: Optional[str] = None,
+    max_workers: int = 1,
+    chunk_size: int = 30,
+    max_chunk_retries: int = 3,
+    stream: bool = False,
+    on_sample: Optional[Callable[[Dict[str, str]], None]] = None,
+    use_cache: Optional[bool] = None,
+    checkpoint: Optional[ChunkCheckpoint] = None,
+    deduplicator: Optional[SampleDeduplicator] = None,
+    feature_targets: Optional[Dict[str, float]] = None,
+    context_token_budget: int = 0
+) -> int:
     """
-    生成并保存样本的便捷函数
+    生成并保存样本的便捷函数（在LLMClient的事件循环中执行generate_and_save_samples_async）
     
     Args:
         llm_client: LLM客户端
@@ -381,15 +764,72 @@ def generate_and_save_samples(
         plan: 主题规划
         output_path: 输出文件路径
         dialect: SQL方言
+        db_name: 数据库名称
+        max_workers: 并发执行的生成批次数
+        chunk_size: 单次LLM调用生成的最大样本数
+        max_chunk_retries: 样本不足时的补充轮数上限
+        stream: 是否使用流式调用
+        on_sample: 每条新样本到达时的回调（到达顺序，可能早于样本写入output_path）
+        use_cache: 是否使用LLM响应缓存，None表示按LLM客户端配置
+        checkpoint: 生成检查点，续跑时复用已完成的批次
+        deduplicator: 样本去重器，位于生成与验证之间，重复样本不写入output_path
+        feature_targets: SQL特征目标分布，None表示不按特征覆盖引导生成
+        context_token_budget: 每个主题DDL上下文的Token预算，0表示不限制
         
     Returns:
-        样本列表
+        写入output_path的样本数
     """
-    generator = SampleGenerator(llm_client, metadata,db_name)
-    samples = generator.generate_samples(plan, dialect)
-    generator.save_samples(samples, output_path)
-    generator.save_samples_rag(samples,output_path)
-    return samples
+    return llm_client.run(generate_and_save_samples_async(
+        llm_client, metadata, plan, output_path, dialect, db_name, max_workers, chunk_size,
+        max_chunk_retries, stream, on_sample, use_cache, checkpoint, deduplicator,
+        feature_targets, context_token_budget
+    ))
+
+
+async def generate_and_save_samples_async(
+    llm_client: AsyncLLMClient,
+    metadata: Dict[str, Any],
+    plan: Dict[str, Any],
+    output_path: str,
+    dialect: str = "mysql",
+    db_name: Optional[str] = None,
+    max_workers: int = 1,
+    chunk_size: int = 30,
+    max_chunk_retries: int = 3,
+    stream: bool = False,
+    on_sample: Optional[Callable[[Dict[str, str]], None]] = None,
+    use_cache: Optional[bool] = None,
+    checkpoint: Optional[ChunkCheckpoint] = None,
+    deduplicator: Optional[SampleDeduplicator] = None,
+    feature_targets: Optional[Dict[str, float]] = None,
+    context_token_budget: int = 0
+) -> int:
+    """
+    异步生成并保存样本的便捷函数，参数同generate_and_save_samples
+    
+    Returns:
+        写入output_path的样本数
+    """
+    generator = SampleGenerator(
+        llm_client, metadata, db_name, max_workers, chunk_size, max_chunk_retries, stream,
+        use_cache=use_cache, checkpoint=checkpoint, deduplicator=deduplicator,
+        feature_targets=feature_targets, context_token_budget=context_token_budget
+    )
+    
+    # 原始文件是样本唯一的去处，内存中只保留计数和未轮到写出的已完成批次；每个批次完成后按规划顺序
+    # （轮次、主题、批次）写出，文件内容与并发完成的先后无关，RAG文档再从文件流式读取
+    with JsonlWriter(output_path) as raw_writer:
+        generator.on_sample = on_sample
+        generator.on_ordered_sample = raw_writer.write
+        await generator.aemit_samples(plan, dialect)
+        sample_count = raw_writer.count
+    
+    _log_dedup_stats(deduplicator)
+    logger.info(f"样本已保存到: {output_path} (共{sample_count}条)")
+    generator.save_samples_rag(iter_jsonl(output_path), output_path)
+    return sample_count
+
+
 if __name__ == '__main__':
     # 实例化llm_client
     llm_config = {
@@ -414,6 +854,6 @@ if __name__ == '__main__':
         plan = json.load(f)
 
     #调用generate_and_save_samples
-    samples=generate_and_save_samples(llm_client,metadata,plan,'../data/samples1.jsonl')
-    print(samples)
+    sample_count=generate_and_save_samples(llm_client,metadata,plan,'../data/samples1.jsonl')
+    print(sample_count)
 
@@ -0,0 +1,220 @@
+"""
+JSON修复模块
+在本地容错解析LLM返回的不规范JSON（尾随逗号、单引号、被截断的数组），
+本地修复失败时生成只包含损坏文本的简短修复提示词
+"""
+
+import json
+import logging
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 发给LLM的修复提示词中保留的最大字符数，超出部分截掉（截断的数组由本地修复兜底）
+MAX_REPAIR_CHARS = 20000
+
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+
+def repair_json(content: str) -> Any:
+    """
+    容错解析JSON
+
+    依次处理：提取代码块或第一个 {/[ 起的内容；单引号字符串转双引号、去掉尾随逗号、
+    Python字面量转JSON字面量；忽略JSON之后的多余文字；数组被截断时退回到最后一个完整元素并补齐括号。
+
+    Args:
+        content: LLM响应内容
+
+    Returns:
+        解析后的JSON对象
+
+    Raises:
+        json.JSONDecodeError: 无法修复时抛出
+    """
+    candidate = _extract_candidate(content)
+    if candidate is None:
+        raise json.JSONDecodeError("未找到JSON对象", content, 0)
+
+    normalized = _normalize(candidate)
+    try:
+        value, _ = json.JSONDecoder().raw_decode(normalized)
+        return value
+    except json.JSONDecodeError:
+        pass
+
+    closed = _close_truncated(normalized)
+    if closed is not None:
+        try:
+            value = json.loads(closed)
+            logger.warning(f"JSON被截断，已保留到最后一个完整元素（{len(closed)}/{len(normalized)} 字符）")
+            return value
+        except json.JSONDecodeError:
+            pass
+
+    raise json.JSONDecodeError("本地修复JSON失败", content, 0)
+
+
+def build_repair_prompt(broken_text: str, error: Optional[Exception] = None) -> str:
+    """
+    构建让LLM修复JSON的简短提示词（不包含原始任务上下文）
+
+    Args:
+        broken_text: 无法解析的响应文本
+        error: 解析错误
+
+    Returns:
+        提示词
+    """
+    text = broken_text
+    if len(text) > MAX_REPAIR_CHARS:
+        text = text[:MAX_REPAIR_CHARS]
+
+    error_line = f"\n解析错误: {error}" if error is not None else ""
+    return f"""下面的文本应该是一个JSON，但无法被解析。{error_line}
+
+请修复它的语法并只输出修复后的JSON，不要增删内容，不要输出任何解释或markdown标记。
+如果文本末尾被截断，删除最后一个不完整的元素并补齐括号。
+
+{text}"""
+
+
+def _extract_candidate(content: str) -> Optional[str]:
+    """
+    取出可能包含JSON的片段：代码块内容（允许缺少结束标记），否则从第一个 { 或 [ 开始到结尾
+
+    Args:
+        content: LLM响应内容
+
+    Returns:
+        候选文本，未找到时返回None
+    """
+    fence = content.find('```')
+    if fence != -1:
+        body_start = content.find('\n', fence)
+        if body_start != -1:
+            body_end = content.find('```', body_start)
+            body = content[body_start + 1:body_end if body_end != -1 else len(content)]
+            if '{' in body or '[' in body:
+                content = body
+
+    starts = [pos for pos in (content.find('{'), content.find('[')) if pos != -1]
+    if not starts:
+        return None
+    return content[min(starts):].strip()
+
+
+def _normalize(text: str) -> str:
+    """
+    单遍扫描修正常见的非标准写法：单引号字符串、字符串内的裸换行、尾随逗号、True/False/None
+
+    Args:
+        text: 候选文本
+
+    Returns:
+        修正后的文本
+    """
+    out: List[str] = []
+    quote = None
+    i = 0
+    n = len(text)
+
+    while i < n:
+        ch = text[i]
+
+        if quote:
+            if ch == '\\' and i + 1 < n:
+                nxt = text[i + 1]
+                out.append("'" if (quote == "'" and nxt == "'") else ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')  # 单引号字符串中的双引号需要转义
+            elif ch == '\n':
+                out.append('\\n')
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in ('"', "'"):
+            quote = ch
+            out.append('"')
+        elif ch == ',':
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] not in '}]':
+                out.append(ch)
+        elif ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == '_'):
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    return ''.join(out)
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """
+    截断修复：回退到最外层未闭合数组中最后一个完整元素之后，并补齐未闭合的括号
+
+    只在最外层未闭合数组的元素边界截断：内层数组（如主题的tables）的逗号不作为截断点，
+    不会保留只写了一半的对象。
+
+    Args:
+        text: 规范化后的文本
+
+    Returns:
+        补齐后的文本，无法确定截断点时返回None
+    """
+    stack: List[str] = []
+    # 与stack平行：每个未闭合数组中最后一个完整元素之后的位置（对象为None）
+    cuts: List[Optional[int]] = []
+    in_string = False
+    escaped = False
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            cuts.append(None)
+        elif ch in '}]':
+            if not stack or stack[-1] != ch:
+                return None
+            stack.pop()
+            cuts.pop()
+            if not stack:
+                return None  # 顶层已完整闭合，不是截断问题
+            if stack[-1] == ']':
+                cuts[-1] = i + 1
+        elif ch == ',' and stack and stack[-1] == ']':
+            cuts[-1] = i
+
+    if ']' not in stack:
+        return None
+
+    depth = stack.index(']')
+    pos = cuts[depth]
+    if pos is None:
+        return None
+    return text[:pos] + ''.join(reversed(stack[:depth + 1]))
@@ -0,0 +1,173 @@
+"""
+JSONL读写模块
+提供逐行读取和追加写入JSONL文件的工具，各阶段的样本产物都以流的方式读写，内存占用与数据量无关
+"""
+import os
+import json
+import logging
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# 默认每写入多少条记录fsync一次
+DEFAULT_FSYNC_EVERY = 100
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    逐行读取JSONL文件
+
+    空行跳过；无法解析的行（如崩溃时写了一半的最后一行）记录警告后跳过。
+
+    Args:
+        path: 文件路径
+
+    Yields:
+        每行解析出的记录
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f"{path} 第 {line_no} 行无法解析，已跳过")
+
+
+def count_jsonl(path: str) -> int:
+    """
+    统计JSONL文件中的有效记录数（逐行读取，不保留记录）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        记录数
+    """
+    return sum(1 for _ in iter_jsonl(path))
+
+
+class JsonlWriter:
+    """
+    JSONL追加写入器
+
+    每条记录写入后立即flush到操作系统，每fsync_every条记录fsync一次（关闭时再fsync一次），
+    崩溃时最多丢失最近一批未落盘的记录。atomic=True时先写临时文件，关闭时原子替换目标文件，
+    用于整体重写已有产物，避免写到一半时覆盖掉旧内容。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        append: bool = False,
+        fsync_every: int = DEFAULT_FSYNC_EVERY,
+        atomic: bool = False
+    ):
+        """
+        打开写入器
+
+        Args:
+            path: 文件路径
+            append: 是否在已有内容后追加，False表示覆盖
+            fsync_every: 每写入多少条记录fsync一次，0表示只在关闭时fsync
+            atomic: 是否写临时文件并在关闭时原子替换（不能与append同时使用）
+        """
+        if append and atomic:
+            raise ValueError("append 和 atomic 不能同时使用")
+
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        self.path = path
+        self.count = 0
+        self.fsync_every = max(0, int(fsync_every or 0))
+        self._atomic = atomic
+        self._write_path = path + '.tmp' if atomic else path
+        self._file = open(self._write_path, 'a' if append else 'w', encoding='utf-8')
+        self._unsynced = 0
+
+        # 上次崩溃留下了不完整的最后一行时先换行，避免新记录拼接到残行上
+        if append and self._file.tell() > 0:
+            with open(self._write_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write('\n')
+
+    def write(self, record: Dict[str, Any]):
+        """
+        写入一条记录
+
+        Args:
+            record: 可JSON序列化的记录
+        """
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.count += 1
+        self._unsynced += 1
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def write_all(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        逐条写入可迭代对象中的记录
+
+        Args:
+            records: 记录的可迭代对象（可以是生成器）
+
+        Returns:
+            本次写入的记录数
+        """
+        start = self.count
+        for record in records:
+            self.write(record)
+        return self.count - start
+
+    def sync(self):
+        """把已写入的记录落盘"""
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self, commit: bool = True):
+        """
+        关闭写入器
+
+        Args:
+            commit: atomic模式下是否用临时文件替换目标文件，False表示丢弃临时文件
+        """
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
+        if self._atomic:
+            if commit:
+                os.replace(self._write_path, self.path)
+            else:
+                os.remove(self._write_path)
+
+    def __enter__(self) -> 'JsonlWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # atomic模式下出错时保留原文件
+        self.close(commit=exc_type is None)
+
+
+def write_jsonl(path: str, records: Iterable[Dict[str, Any]], atomic: bool = False, fsync_every: Optional[int] = None) -> int:
+    """
+    把记录流写入JSONL文件的便捷函数
+
+    Args:
+        path: 文件路径
+        records: 记录的可迭代对象
+        atomic: 是否原子替换目标文件
+        fsync_every: 每写入多少条记录fsync一次，None表示默认值
+
+    Returns:
+        写入的记录数
+    """
+    with JsonlWriter(path, fsync_every=DEFAULT_FSYNC_EVERY if fsync_every is None else fsync_every, atomic=atomic) as writer:
+        return writer.write_all(records)
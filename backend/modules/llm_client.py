@@ -3,21 +3,191 @@ LLM客户端模块
 支持OpenAI兼容接口（Qwen、DeepSeek、ChatGLM等）
 """
 
+import os
 import json
-import logging
 import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
 import threading
-from typing import Dict, Any, Optional
-from openai import OpenAI
+from typing import Dict, Any, AsyncIterator, Awaitable, Iterator, List, Optional, Tuple
+from openai import AsyncOpenAI, RateLimitError, APITimeoutError
+
+try:
+    import httpx
+except ImportError:  # 未单独安装httpx时使用openai SDK默认的HTTP客户端
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+try:
+    from .rate_limiter import get_rate_limiter, parse_retry_after, estimate_tokens
+    from .retry_policy import RetryBudget, RetryPolicy
+    from .json_repair import repair_json, build_repair_prompt
+except ImportError:
+    from rate_limiter import get_rate_limiter, parse_retry_after, estimate_tokens
+    from retry_policy import RetryBudget, RetryPolicy
+    from json_repair import repair_json, build_repair_prompt
 
 logger = logging.getLogger(__name__)
 
-# 全局并发控制 - 限制同时最多3个并发请求，避免API限流
-_llm_semaphore = threading.Semaphore(3)
+SYSTEM_PROMPT = "你是一个专业的数据库和SQL专家。"
 
 
-class LLMClient:
-    """LLM客户端类"""
+class LLMResponseCache:
+    """LLM响应缓存类 - 以请求内容哈希为键，持久化到SQLite"""
+    
+    def __init__(self, path: str, max_entries: int = 10000, max_age_days: float = 30):
+        """
+        初始化响应缓存
+        
+        Args:
+            path: SQLite数据库文件路径
+            max_entries: 最大缓存条数，超出时淘汰最久未访问的条目
+            max_age_days: 缓存有效天数，过期条目在读取时视为未命中并在淘汰时删除
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "  key TEXT PRIMARY KEY,"
+            "  response TEXT NOT NULL,"
+            "  created_at REAL NOT NULL,"
+            "  accessed_at REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.commit()
+        self._evict()
+    
+    @staticmethod
+    def make_key(model: str, temperature: float, top_p: float, system_prompt: str, prompt: str, salt: str = "") -> str:
+        """
+        计算缓存键
+        
+        Args:
+            model: 模型名称
+            temperature: 采样温度
+            top_p: top_p参数
+            system_prompt: 系统提示词
+            prompt: 用户提示词
+            salt: 附加区分值，用于让相同提示词的多次调用各自缓存
+            
+        Returns:
+            SHA-256十六进制摘要
+        """
+        payload = json.dumps(
+            [model, temperature, top_p, system_prompt, prompt, salt],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            缓存的响应文本，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?",
+                (key, now - self.max_age_seconds)
+            ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+    
+    def put(self, key: str, response: str):
+        """
+        写入缓存
+        
+        Args:
+            key: 缓存键
+            response: 响应文本
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self._conn.commit()
+            
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 100:
+                self._evict_locked()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取命中统计
+        
+        Returns:
+            统计字典，包含hits、misses、hit_rate
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+    
+    def _evict(self):
+        """删除过期条目，并按最近访问时间淘汰超出上限的条目"""
+        with self._lock:
+            self._evict_locked()
+    
+    def _evict_locked(self):
+        """淘汰逻辑（调用方需持有锁）"""
+        self._puts_since_evict = 0
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?",
+            (time.time() - self.max_age_seconds,)
+        )
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "  SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?"
+                ")",
+                (count - self.max_entries,)
+            )
+        self._conn.commit()
+    
+    def close(self):
+        """关闭缓存数据库"""
+        with self._lock:
+            self._conn.close()
+
+
+class BaseLLMClient:
+    """LLM客户端基类 - 配置、缓存、限流和JSON解析逻辑"""
     
     def __init__(self, llm_config: Dict[str, Any]):
         """
@@ -35,95 +205,257 @@ class LLMClient:
         self.timeout = llm_config.get('timeout', 120)  # 从 60 增加到 120 秒
         self.max_retries = llm_config.get('max_retries', 3)
         
-        # 创建OpenAI客户端
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.api_base,
-            timeout=self.timeout
+        # 响应缓存（可选）：相同模型参数和提示词的请求直接复用已付费的结果
+        self.cache_enabled = llm_config.get('cache_enabled', False)
+        self.cache: Optional[LLMResponseCache] = None
+        if self.cache_enabled:
+            self.cache = LLMResponseCache(
+                llm_config.get('cache_path', './cache/llm_cache.db'),
+                llm_config.get('cache_max_entries', 10000),
+                llm_config.get('cache_max_age_days', 30)
+            )
+        
+        # 并发控制：同一API地址和模型共享一个自适应限流器，按429/超时自动调整并发
+        self.rate_limiter = get_rate_limiter(
+            self.api_base,
+            self.model_name,
+            initial_concurrency=llm_config.get('initial_concurrency', 3),
+            min_concurrency=llm_config.get('min_concurrency', 1),
+            max_concurrency=llm_config.get('max_concurrency', 16),
+            tokens_per_minute=llm_config.get('tokens_per_minute', 0)
+        )
+        
+        # 重试策略：全抖动退避，客户端内所有调用共享一份重试预算（每次流水线运行创建一个客户端）
+        self.retry_budget = RetryBudget(llm_config.get('retry_budget', 50))
+        self.retry_policy = RetryPolicy(
+            max_attempts=self.max_retries,
+            base_delay=llm_config.get('retry_base_delay', 1.0),
+            max_delay=llm_config.get('retry_max_delay', 30.0),
+            budget=self.retry_budget
         )
+    
+    def get_retry_stats(self) -> Dict[str, Any]:
+        """
+        获取本客户端的重试预算使用情况
+        
+        Returns:
+            统计字典
+        """
+        return self.retry_budget.stats()
+    
+    def get_rate_limit_stats(self) -> Dict[str, Any]:
+        """
+        获取当前API地址和模型的限流器状态
+        
+        Returns:
+            状态字典
+        """
+        return self.rate_limiter.stats()
+    
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        获取响应缓存的命中统计
+        
+        Returns:
+            统计字典，未启用缓存时返回None
+        """
+        return self.cache.stats() if self.cache is not None else None
+    
+    def _build_request(self, prompt: str, stream: bool = False) -> Dict[str, Any]:
+        """
+        构建chat.completions.create的请求参数
         
-    def call_llm(self, prompt: str, expect_json: bool = True) -> Any:
+        Args:
+            prompt: 提示词
+            stream: 是否流式返回
+            
+        Returns:
+            请求参数字典
         """
-        调用LLM生成内容（带并发控制）
+        request = {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens,
+            "timeout": self.timeout  # 明确设置超时
+        }
+        if stream:
+            request["stream"] = True
+        return request
+    
+    def _estimate_request_tokens(self, prompt: str) -> int:
+        """
+        估算单次请求消耗的Token数（提示词 + 最大输出）
         
         Args:
             prompt: 提示词
+            
+        Returns:
+            估算的Token数
+        """
+        return estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(prompt) + self.max_tokens
+    
+    def _handle_request_error(self, error: Exception) -> float:
+        """
+        将限流和超时错误反馈给限流器
+        
+        Args:
+            error: 请求异常
+            
+        Returns:
+            服务端要求的最少等待秒数（无要求时为0）
+        """
+        if isinstance(error, RateLimitError):
+            retry_after = parse_retry_after(getattr(error.response, 'headers', None))
+            self.rate_limiter.on_throttle(retry_after)
+            return retry_after or 0
+        if isinstance(error, APITimeoutError):
+            self.rate_limiter.on_throttle()
+        return 0
+    
+    def _next_retry_wait(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        记录失败、把限流/超时反馈给限流器，并按重试策略决定等待时间
+        
+        Args:
+            error: 请求异常
+            attempt: 当前尝试序号（从0开始）
+            
+        Returns:
+            重试前的等待秒数，不应重试时返回None
+        """
+        if isinstance(error, json.JSONDecodeError):
+            logger.warning(f"JSON解析失败（第{attempt + 1}次）: {str(error)}")
+        else:
+            logger.error(f"LLM调用失败（第{attempt + 1}次）: {str(error)}")
+        
+        min_wait = self._handle_request_error(error)
+        wait_time = self.retry_policy.next_wait(error, attempt, min_wait)
+        if wait_time is not None:
+            logger.info(f"等待 {wait_time:.1f} 秒后重试...")
+        return wait_time
+    
+    def _read_completion(self, response: Any) -> str:
+        """
+        读取一次成功的非流式响应文本
+        
+        Args:
+            response: chat.completions响应对象
+            
+        Returns:
+            响应文本
+        """
+        self.rate_limiter.on_success()
+        content = response.choices[0].message.content.strip()
+        logger.info(f"LLM响应成功，长度: {len(content)}")
+        return content
+    
+    def _cache_value(self, result: Any, content: str, expect_json: bool) -> str:
+        """
+        计算写入缓存的文本：JSON响应存修复后的规范JSON，重跑时无需再次修复
+        
+        Args:
+            result: 解析结果
+            content: 原始响应文本
             expect_json: 是否期望返回JSON格式
             
         Returns:
-            LLM返回的内容（如果expect_json为True则返回解析后的字典）
+            缓存文本
         """
-        with _llm_semaphore:  # 获取信号量，控制并发数
-            return self._call_llm_impl(prompt, expect_json)
+        return json.dumps(result, ensure_ascii=False) if expect_json else content
     
-    def _call_llm_impl(self, prompt: str, expect_json: bool = True) -> Any:
+    def _get_cache_key(self, prompt: str, use_cache: Optional[bool], cache_salt: str) -> Optional[str]:
         """
-        实际的LLM调用实现
+        计算本次调用的缓存键
         
         Args:
             prompt: 提示词
+            use_cache: 是否使用缓存，None表示按客户端配置
+            cache_salt: 缓存键附加值
+            
+        Returns:
+            缓存键，不使用缓存时返回None
+        """
+        if self.cache is None or use_cache is False:
+            return None
+        return LLMResponseCache.make_key(
+            self.model_name, self.temperature, self.top_p, SYSTEM_PROMPT, prompt, cache_salt
+        )
+    
+    def _lookup_cache(self, cache_key: Optional[str], expect_json: bool) -> Tuple[bool, Any]:
+        """
+        查询响应缓存
+        
+        Args:
+            cache_key: 缓存键
             expect_json: 是否期望返回JSON格式
             
         Returns:
-            LLM返回的内容（如果expect_json为True则返回解析后的字典）
+            (是否命中, 内容)
         """
-        for attempt in range(self.max_retries):
-            try:
-                logger.info(f"调用LLM（第{attempt + 1}次尝试）...")
-                
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[
-                        {"role": "system", "content": "你是一个专业的数据库和SQL专家。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=self.temperature,
-                    top_p=self.top_p,
-                    max_tokens=self.max_tokens,
-                    timeout=self.timeout  # 明确设置超时
-                )
-                
-                content = response.choices[0].message.content.strip()
-                logger.info(f"LLM响应成功，长度: {len(content)}")
-                
-                if expect_json:
-                    # 尝试解析JSON
-                    return self._extract_json(content)
-                else:
-                    return content
-                    
-            except json.JSONDecodeError as e:
-                logger.warning(f"JSON解析失败（第{attempt + 1}次）: {str(e)}")
-                if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt  # 指数退避：2, 4, 8秒
-                    logger.info(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error("JSON解析失败，已达到最大重试次数")
-                    raise
-                    
-            except Exception as e:
-                error_msg = str(e)
-                logger.error(f"LLM调用失败（第{attempt + 1}次）: {error_msg}")
-                
-                # 区分超时和其他错误
-                is_timeout = 'timeout' in error_msg.lower() or 'timed out' in error_msg.lower()
-                
-                if attempt < self.max_retries - 1:
-                    # 超时错误使用更长的等待时间
-                    wait_time = (3 ** attempt) if is_timeout else (2 ** attempt)
-                    logger.info(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    raise
+        if cache_key is None:
+            return False, None
         
-        raise Exception("LLM调用失败，已达到最大重试次数")
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return False, None
+        
+        logger.info(f"命中LLM响应缓存，长度: {len(cached)}")
+        try:
+            return True, (self._extract_json(cached) if expect_json else cached)
+        except json.JSONDecodeError:
+            logger.warning("缓存内容无法解析为JSON，重新调用LLM")
+            return False, None
+    
+    def _store_cache(self, cache_key: Optional[str], content: str):
+        """
+        写入响应缓存（只应传入可用的响应）
+        
+        Args:
+            cache_key: 缓存键，None时不写入
+            content: 响应文本
+        """
+        if cache_key is not None:
+            self.cache.put(cache_key, content)
+    
+    @staticmethod
+    def _split_lines(buffer: str) -> Tuple[List[str], str]:
+        """
+        从流式缓冲区中切出完整的行
+        
+        Args:
+            buffer: 当前缓冲区
+            
+        Returns:
+            (完整行列表, 剩余的不完整部分)
+        """
+        if '\n' not in buffer:
+            return [], buffer
+        *lines, rest = buffer.split('\n')
+        return lines, rest
     
     def _extract_json(self, content: str) -> Any:
         """
-        从LLM响应中提取JSON
+        从LLM响应中提取JSON，标准方式都失败时在本地容错修复
+        
+        Args:
+            content: LLM响应内容
+            
+        Returns:
+            解析后的JSON对象
+        """
+        try:
+            return self._extract_json_strict(content)
+        except json.JSONDecodeError:
+            return repair_json(content)
+    
+    def _extract_json_strict(self, content: str) -> Any:
+        """
+        按标准JSON从LLM响应中提取（直接解析、代码块、首尾括号）
         
         Args:
             content: LLM响应内容
@@ -181,6 +513,327 @@ class LLMClient:
         raise json.JSONDecodeError("无法提取有效的JSON", content, 0)
 
 
+
+class AsyncLLMClient(BaseLLMClient):
+    """
+    异步LLM客户端类
+    
+    基于AsyncOpenAI，所有请求复用同一个HTTP连接池（keep-alive，安装h2时启用HTTP/2），
+    可在FastAPI事件循环中直接await，不占用线程池线程。
+    """
+    
+    def __init__(self, llm_config: Dict[str, Any]):
+        """
+        初始化异步LLM客户端
+        
+        Args:
+            llm_config: LLM配置字典
+        """
+        super().__init__(llm_config)
+        
+        # 连接池大小跟随限流器的并发上限，保证每个在途请求都能复用长连接
+        http_client = None
+        if httpx is not None:
+            pool_size = self.rate_limiter.max_concurrency
+            http_client = httpx.AsyncClient(
+                http2=_HTTP2_AVAILABLE,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size
+                )
+            )
+        
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.api_base,
+            timeout=self.timeout,
+            max_retries=0,
+            http_client=http_client
+        )
+    
+    async def call_llm(
+        self,
+        prompt: str,
+        expect_json: bool = True,
+        use_cache: Optional[bool] = None,
+        cache_salt: str = ""
+    ) -> Any:
+        """
+        异步调用LLM生成内容（带并发控制和重试）
+        
+        Args:
+            prompt: 提示词
+            expect_json: 是否期望返回JSON格式
+            use_cache: 是否使用响应缓存，None表示按客户端配置
+            cache_salt: 缓存键附加值，相同提示词需要不同结果时使用
+            
+        Returns:
+            LLM返回的内容（如果expect_json为True则返回解析后的字典）
+        """
+        cache_key = self._get_cache_key(prompt, use_cache, cache_salt)
+        hit, cached = self._lookup_cache(cache_key, expect_json)
+        if hit:
+            return cached
+        
+        tokens = self._estimate_request_tokens(prompt)
+        attempt = 0
+        while True:
+            try:
+                async with self.rate_limiter.slot_async(tokens):
+                    logger.info(f"调用LLM（第{attempt + 1}次尝试）...")
+                    response = await self.client.chat.completions.create(**self._build_request(prompt))
+                content = self._read_completion(response)
+                result = await self._parse_json_content(content) if expect_json else content
+            except Exception as e:
+                wait_time = self._next_retry_wait(e, attempt)
+                if wait_time is None:
+                    raise
+                await asyncio.sleep(wait_time)
+                attempt += 1
+                continue
+            
+            self._store_cache(cache_key, self._cache_value(result, content, expect_json))
+            return result
+    
+    async def _parse_json_content(self, content: str) -> Any:
+        """
+        解析JSON响应：先本地容错修复，失败时只把损坏文本发给LLM修复
+        
+        Args:
+            content: LLM响应文本
+            
+        Returns:
+            解析后的JSON对象
+        """
+        try:
+            return self._extract_json(content)
+        except json.JSONDecodeError as e:
+            logger.warning(f"JSON本地修复失败，请求LLM修复: {str(e)}")
+            fixed = await self.call_llm(build_repair_prompt(content, e), expect_json=False, use_cache=False)
+            result = self._extract_json(fixed)
+            logger.info("LLM修复JSON成功")
+            return result
+    
+    async def stream_llm_lines(
+        self,
+        prompt: str,
+        use_cache: Optional[bool] = None,
+        cache_salt: str = ""
+    ) -> AsyncIterator[str]:
+        """
+        以流式方式异步调用LLM，每收到一整行就立即产出（带并发控制）
+        
+        Args:
+            prompt: 提示词
+            use_cache: 是否使用响应缓存，None表示按客户端配置
+            cache_salt: 缓存键附加值
+            
+        Yields:
+            LLM响应中的每一行文本（不含换行符）
+        """
+        cache_key = self._get_cache_key(prompt, use_cache, cache_salt)
+        hit, cached = self._lookup_cache(cache_key, expect_json=False)
+        if hit:
+            for line in cached.split('\n'):
+                yield line
+            return
+        
+        stream = await self._create_stream(prompt)  # 成功返回时持有一个并发槽位
+        try:
+            buffer = ""
+            parts = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                parts.append(delta)
+                lines, buffer = self._split_lines(buffer + delta)
+                for line in lines:
+                    yield line
+            
+            if buffer:
+                yield buffer
+            
+            self.rate_limiter.on_success()
+            content = "".join(parts)
+            logger.info(f"LLM流式响应完成，长度: {len(content)}")
+            self._store_cache(cache_key, content)
+        finally:
+            # 调用方提前关闭生成器时同样要关闭流，否则连接不会归还连接池，占满后后续请求只能等到超时
+            try:
+                await stream.close()
+            finally:
+                self.rate_limiter.release()
+    
+    async def aclose(self):
+        """关闭HTTP连接池"""
+        await self.client.close()
+    
+    async def __aenter__(self):
+        """异步上下文管理器入口"""
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器退出"""
+        await self.aclose()
+    
+    async def _create_stream(self, prompt: str):
+        """
+        获取并发槽位并建立流式请求，失败时释放槽位、退避后重试
+        
+        Args:
+            prompt: 提示词
+            
+        Returns:
+            OpenAI异步流式响应对象（调用方负责释放槽位）
+        """
+        tokens = self._estimate_request_tokens(prompt)
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire_async(tokens)
+            try:
+                logger.info(f"调用LLM流式接口（第{attempt + 1}次尝试）...")
+                return await self.client.chat.completions.create(**self._build_request(prompt, stream=True))
+            except Exception as e:
+                self.rate_limiter.release()
+                wait_time = self._next_retry_wait(e, attempt)
+                if wait_time is None:
+                    raise
+                await asyncio.sleep(wait_time)
+                attempt += 1
+
+class _EventLoopThread:
+    """在后台守护线程中持续运行的事件循环，供同步代码提交协程"""
+    
+    def __init__(self, name: str = "llm-client-loop"):
+        """
+        创建事件循环并启动后台线程
+        
+        Args:
+            name: 线程名称
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+    
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """
+        在后台事件循环中执行协程并阻塞等待结果
+        
+        Args:
+            coro: 协程对象
+            
+        Returns:
+            协程的返回值（协程抛出的异常原样抛出）
+        """
+        if threading.current_thread() is self._thread:
+            # 在事件循环线程中同步等待自身会死锁
+            coro.close()
+            raise RuntimeError("不能在LLM客户端的事件循环线程中调用同步接口")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+    
+    def close(self):
+        """停止事件循环并等待后台线程退出"""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class LLMClient:
+    """
+    LLM客户端类（同步，供CLI和线程池使用）
+    
+    只是AsyncLLMClient的同步门面：请求、重试、缓存和流式解析都由内部的异步客户端完成，
+    协程提交到本客户端独占的后台事件循环执行（HTTP连接池绑定在该事件循环上，可被多个线程共享）。
+    配置、缓存、限流器和统计接口直接转发给异步客户端。
+    """
+    
+    def __init__(self, llm_config: Dict[str, Any]):
+        """
+        初始化LLM客户端
+        
+        Args:
+            llm_config: LLM配置字典
+        """
+        self.aclient = AsyncLLMClient(llm_config)
+        self._loop_thread = _EventLoopThread()
+    
+    def __getattr__(self, name: str) -> Any:
+        """未定义的属性（配置、cache、rate_limiter、get_*_stats等）转发给异步客户端"""
+        if name in ('aclient', '_loop_thread'):
+            raise AttributeError(name)
+        return getattr(self.aclient, name)
+    
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """
+        在客户端的事件循环中执行协程并等待结果，协程内应使用aclient发起请求
+        
+        Args:
+            coro: 协程对象
+            
+        Returns:
+            协程的返回值
+        """
+        return self._loop_thread.run(coro)
+    
+    def call_llm(
+        self,
+        prompt: str,
+        expect_json: bool = True,
+        use_cache: Optional[bool] = None,
+        cache_salt: str = ""
+    ) -> Any:
+        """
+        调用LLM生成内容（带并发控制和重试），参数同AsyncLLMClient.call_llm
+        
+        Returns:
+            LLM返回的内容（如果expect_json为True则返回解析后的字典）
+        """
+        return self.run(self.aclient.call_llm(prompt, expect_json, use_cache, cache_salt))
+    
+    def stream_llm_lines(
+        self,
+        prompt: str,
+        use_cache: Optional[bool] = None,
+        cache_salt: str = ""
+    ) -> Iterator[str]:
+        """
+        以流式方式调用LLM，每收到一整行就立即产出，参数同AsyncLLMClient.stream_llm_lines
+        
+        调用方提前关闭生成器时同步关闭底层异步生成器，流和并发槽位随之释放。
+        
+        Yields:
+            LLM响应中的每一行文本（不含换行符）
+        """
+        lines = self.aclient.stream_llm_lines(prompt, use_cache, cache_salt)
+        try:
+            while True:
+                try:
+                    line = self.run(lines.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield line
+        finally:
+            self.run(lines.aclose())
+    
+    def close(self):
+        """关闭HTTP连接池并停止后台事件循环"""
+        if not self._loop_thread.loop.is_closed():
+            self.run(self.aclient.aclose())
+            self._loop_thread.close()
+    
+    def __enter__(self):
+        """上下文管理器入口"""
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """上下文管理器退出"""
+        self.close()
+
+
 def create_llm_client(llm_config: Dict[str, Any]) -> LLMClient:
     """
     创建LLM客户端的工厂函数
@@ -192,5 +845,16 @@ def create_llm_client(llm_config: Dict[str, Any]) -> LLMClient:
         LLMClient实例
     """
     return LLMClient(llm_config)
-if __name__ == '__main__':
-    pass
+
+
+def create_async_llm_client(llm_config: Dict[str, Any]) -> "AsyncLLMClient":
+    """
+    创建异步LLM客户端的工厂函数
+    
+    Args:
+        llm_config: LLM配置字典
+        
+    Returns:
+        AsyncLLMClient实例
+    """
+    return AsyncLLMClient(llm_config)
@@ -4,8 +4,11 @@
 """
 from pathlib import Path
 import json
+import hashlib
 import logging
-from typing import Dict, List, Any
+from fnmatch import fnmatchcase
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Set, Tuple
 #from .db_connector import DatabaseConnector
 import sys
 import os
@@ -19,27 +22,59 @@ except ImportError:
     from db_connector import DatabaseConnector
 logger = logging.getLogger(__name__)
 
+# 变化的表不超过该数量时按表名过滤查询，否则直接全量查询再筛选
+MAX_FILTERED_TABLES = 500
+
+# 多schema提取时不参与匹配的系统schema
+SYSTEM_SCHEMAS = {
+    'mysql': {'mysql', 'information_schema', 'performance_schema', 'sys'},
+    'postgres': {'pg_catalog', 'information_schema'},
+}
+
 
 class MetadataExtractor:
     """元数据提取器类"""
     
-    def __init__(self, db_connector: DatabaseConnector):
+    def __init__(
+        self,
+        db_connector: DatabaseConnector,
+        schema: Optional[str] = None,
+        qualify_foreign_keys: bool = False
+    ):
         """
         初始化元数据提取器
         
         Args:
             db_connector: 数据库连接器实例
+            schema: 要提取的schema（MySQL中即数据库），默认为连接的数据库（MySQL）或public（PostgreSQL）
+            qualify_foreign_keys: 外键引用是否带schema前缀（schema.ref_table.ref_column），多schema提取时使用
         """
         self.db_connector = db_connector
         self.db_type = db_connector.db_type
         self.database = db_connector.database
+        if self.db_type == 'mysql':
+            self.schema = schema or self.database
+            self.database = self.schema
+        else:
+            self.schema = schema or 'public'
+        self.qualify_foreign_keys = qualify_foreign_keys
+        
+        # 最近一次增量提取中未变化、直接复用的表
+        self.unchanged_tables: Set[str] = set()
         
-    def extract_metadata(self, table_blacklist: List[str] = None) -> Dict[str, Any]:
+    def extract_metadata(
+        self,
+        table_blacklist: List[str] = None,
+        previous: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         提取数据库元数据
         
+        每个表都会记录指纹（建表时间 + 列定义和约束哈希）。传入上次的元数据时只重新提取指纹变化的表。
+        
         Args:
             table_blacklist: 表黑名单列表
+            previous: 上次保存的元数据（增量模式）
             
         Returns:
             元数据字典，格式:
@@ -47,7 +82,9 @@ class MetadataExtractor:
                 "table_name": {
                     "columns": [...],
                     "primary_keys": [...],
-                    "foreign_keys": {...}
+                    "foreign_keys": {...},
+                    "fingerprint": "...",
+                    "update_time": "..."
                 }
             }
         """
@@ -56,37 +93,313 @@ class MetadataExtractor:
         if table_blacklist is None:
             table_blacklist = []
         
-        metadata = {}
+        fingerprints = self.compute_fingerprints()
         
-        # 提取列信息
-        columns_data = self._extract_columns()
+        # 增量模式：指纹未变化的表直接复用上次的结果
+        self.unchanged_tables = set()
+        if previous and fingerprints:
+            self.unchanged_tables = {
+                table_name for table_name, fp in fingerprints.items()
+                if previous.get(table_name, {}).get('fingerprint') == fp['fingerprint']
+            }
         
-        # 提取主键信息
-        primary_keys = self._extract_primary_keys()
+        changed_tables = None
+        if fingerprints:
+            changed_tables = [
+                table_name for table_name in fingerprints
+                if table_name not in self.unchanged_tables and table_name not in table_blacklist
+            ]
+            if previous:
+                logger.info(
+                    f"增量提取: {len(self.unchanged_tables)} 个表未变化, {len(changed_tables)} 个表需要重新提取"
+                )
         
-        # 提取外键信息
-        foreign_keys = self._extract_foreign_keys()
+        columns_data, primary_keys, foreign_keys = {}, {}, {}
+        if changed_tables is None or changed_tables:
+            # 变化的表较少时按表名过滤查询
+            table_filter = None
+            if changed_tables is not None and len(changed_tables) <= MAX_FILTERED_TABLES:
+                table_filter = changed_tables
+            
+            # 提取列信息
+            columns_data = self._extract_columns(table_filter)
+            
+            # 提取主键信息
+            primary_keys = self._extract_primary_keys(table_filter)
+            
+            # 提取外键信息
+            foreign_keys = self._extract_foreign_keys(table_filter)
         
-        # 组装元数据
-        for table_name, columns in columns_data.items():
+        # 组装元数据（按表名顺序）
+        metadata = {}
+        for table_name in (fingerprints or columns_data):
             # 跳过黑名单中的表
             if table_name in table_blacklist:
                 logger.info(f"跳过黑名单表: {table_name}")
                 continue
-                
-            metadata[table_name] = {
-                "columns": columns,
-                "primary_keys": primary_keys.get(table_name, []),
-                "foreign_keys": foreign_keys.get(table_name, {})
-            }
+            
+            if table_name in self.unchanged_tables:
+                metadata[table_name] = previous[table_name]
+            elif table_name in columns_data:
+                metadata[table_name] = {
+                    "columns": columns_data[table_name],
+                    "primary_keys": primary_keys.get(table_name, []),
+                    "foreign_keys": foreign_keys.get(table_name, {})
+                }
+            else:
+                continue
+            
+            if table_name in fingerprints:
+                metadata[table_name].update(fingerprints[table_name])
         
         logger.info(f"成功提取 {len(metadata)} 个表的元数据")
         return metadata
+
+    def resolve_schemas(self, patterns: Any) -> List[str]:
+        """
+        将schema名称或通配符（如 tenant_*）展开为实际存在的schema列表（MySQL中schema即数据库）
+
+        Args:
+            patterns: schema名称/通配符列表，或逗号分隔的字符串
+
+        Returns:
+            按名称排序的schema列表（不含系统schema）
+        """
+        if isinstance(patterns, str):
+            patterns = [p.strip() for p in patterns.split(',')]
+        patterns = [p for p in patterns or [] if p]
+
+        if self.db_type == 'mysql':
+            query = "SELECT SCHEMA_NAME FROM information_schema.SCHEMATA ORDER BY SCHEMA_NAME"
+        elif self.db_type == 'postgres':
+            query = """
+            SELECT schema_name as SCHEMA_NAME
+            FROM information_schema.schemata
+            WHERE left(schema_name, 3) <> 'pg_'
+            ORDER BY schema_name
+            """
+        else:
+            raise ValueError(f"不支持的数据库类型: {self.db_type}")
+
+        system_schemas = SYSTEM_SCHEMAS.get(self.db_type, set())
+        available = [
+            row['SCHEMA_NAME'] for row in self.db_connector.execute_query(query)
+            if row['SCHEMA_NAME'] not in system_schemas
+        ]
+
+        schemas = [name for name in available if any(fnmatchcase(name, p) for p in patterns)]
+        for pattern in patterns:
+            if not any(fnmatchcase(name, pattern) for name in available):
+                logger.warning(f"没有匹配 {pattern} 的schema")
+
+        logger.info(f"匹配到 {len(schemas)} 个schema: {', '.join(schemas)}")
+        return schemas
+
+    def extract_schemas(
+        self,
+        schemas: List[str],
+        table_blacklist: List[str] = None,
+        previous: Optional[Dict[str, Any]] = None,
+        previous_ddl: Optional[List[Dict[str, str]]] = None,
+        max_workers: Optional[int] = None
+    ) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """
+        并发提取多个schema的元数据，表键为 schema.table
+
+        每个schema由独立的提取器在线程池中完成，各自从连接池借用连接；
+        元数据条目额外记录 schema 和 table 字段，外键引用带schema前缀。
+
+        Args:
+            schemas: schema列表（通常来自resolve_schemas）
+            table_blacklist: 表黑名单，可写 table（所有schema）或 schema.table
+            previous: 上次保存的元数据（增量模式）
+            previous_ddl: 上次保存的DDL列表（增量模式，仅MySQL）
+            max_workers: 并发提取的schema数，默认为连接池最大连接数
+
+        Returns:
+            (元数据字典, DDL列表)，DDL列表仅MySQL非空
+        """
+        workers = max(1, min(max_workers or self.db_connector.pool_max_size, len(schemas) or 1))
+        # schema间已并发，schema内的SHOW CREATE TABLE分摊剩余连接
+        ddl_workers = max(1, self.db_connector.pool_max_size // workers)
+        logger.info(f"开始提取 {len(schemas)} 个schema的元数据（并发 {workers}）")
+
+        def extract_one(schema: str):
+            return self._extract_schema(schema, table_blacklist or [], previous, previous_ddl, ddl_workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(extract_one, schemas))
+
+        metadata, ddl_rag = {}, []
+        self.unchanged_tables = set()
+        for schema, (schema_metadata, schema_ddl, unchanged) in zip(schemas, results):
+            for table_name, table_info in schema_metadata.items():
+                metadata[f"{schema}.{table_name}"] = table_info
+            self.unchanged_tables.update(f"{schema}.{table_name}" for table_name in unchanged)
+            ddl_rag.extend(schema_ddl)
+
+        logger.info(f"成功提取 {len(schemas)} 个schema共 {len(metadata)} 个表的元数据")
+        return metadata, ddl_rag
+
+    def _extract_schema(
+        self,
+        schema: str,
+        table_blacklist: List[str],
+        previous: Optional[Dict[str, Any]],
+        previous_ddl: Optional[List[Dict[str, str]]],
+        ddl_workers: int
+    ) -> Tuple[Dict[str, Any], List[Dict[str, str]], Set[str]]:
+        """
+        提取单个schema的元数据和DDL（在extract_schemas的线程池中执行）
+
+        Args:
+            schema: schema名称
+            table_blacklist: 表黑名单
+            previous: 上次保存的元数据（键为 schema.table）
+            previous_ddl: 上次保存的DDL列表
+            ddl_workers: SHOW CREATE TABLE的并发数
+
+        Returns:
+            (以表名为键的元数据, DDL列表, 未变化的表名集合)
+        """
+        prefix = f"{schema}."
+        blacklist = [
+            name[len(prefix):] if name.startswith(prefix) else name
+            for name in table_blacklist
+            if '.' not in name or name.startswith(prefix)
+        ]
+        schema_previous = None
+        if previous:
+            schema_previous = {
+                key[len(prefix):]: info for key, info in previous.items() if key.startswith(prefix)
+            }
+
+        extractor = MetadataExtractor(self.db_connector, schema, qualify_foreign_keys=True)
+        metadata = extractor.extract_metadata(blacklist, schema_previous)
+        for table_name, table_info in metadata.items():
+            table_info['schema'] = schema
+            table_info['table'] = table_name
+
+        ddl_rag = []
+        if self.db_type == 'mysql':
+            ddl_rag = extractor.extract_ddl_rag_mysql(previous_ddl, list(metadata), ddl_workers)
+        return metadata, ddl_rag, extractor.unchanged_tables
+
+    def compute_fingerprints(self) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        用一条查询计算所有表的指纹（在服务端对列定义和约束求哈希，不传输列明细）
+        
+        指纹由数据库、建表时间、列定义（顺序、名称、类型、可空、键、注释）和约束
+        （MySQL为KEY_COLUMN_USAGE中的主键、唯一键、外键及其引用；PostgreSQL为pg_constraint的定义）决定，
+        只改外键引用等不影响列定义的变更也会触发重新提取；
+        UPDATE_TIME随数据写入变化，单独记录而不计入指纹，避免写入频繁的表每次都被重新提取。
+        
+        Returns:
+            {表名: {"fingerprint": 指纹, "update_time": 最后写入时间}}，不支持或失败时返回空字典
+        """
+        if self.db_type == 'mysql':
+            query = f"""
+            SELECT
+                t.TABLE_NAME,
+                t.CREATE_TIME,
+                t.UPDATE_TIME,
+                COUNT(c.COLUMN_NAME) AS COLUMN_COUNT,
+                SUM(CRC32(CONCAT_WS(':', c.ORDINAL_POSITION, c.COLUMN_NAME, c.COLUMN_TYPE,
+                                    c.IS_NULLABLE, c.COLUMN_KEY, c.COLUMN_COMMENT))) AS COLUMN_HASH,
+                k.CONSTRAINT_COUNT,
+                k.CONSTRAINT_HASH
+            FROM information_schema.TABLES t
+            JOIN information_schema.COLUMNS c
+              ON c.TABLE_SCHEMA = t.TABLE_SCHEMA
+              AND c.TABLE_NAME = t.TABLE_NAME
+            LEFT JOIN (
+                SELECT
+                    TABLE_NAME,
+                    COUNT(*) AS CONSTRAINT_COUNT,
+                    SUM(CRC32(CONCAT_WS(':', CONSTRAINT_NAME, ORDINAL_POSITION, COLUMN_NAME,
+                                        REFERENCED_TABLE_SCHEMA, REFERENCED_TABLE_NAME,
+                                        REFERENCED_COLUMN_NAME))) AS CONSTRAINT_HASH
+                FROM information_schema.KEY_COLUMN_USAGE
+                WHERE TABLE_SCHEMA = '{self.database}'
+                GROUP BY TABLE_NAME
+            ) k ON k.TABLE_NAME = t.TABLE_NAME
+            WHERE t.TABLE_SCHEMA = '{self.database}'
+            GROUP BY t.TABLE_NAME, t.CREATE_TIME, t.UPDATE_TIME, k.CONSTRAINT_COUNT, k.CONSTRAINT_HASH
+            ORDER BY t.TABLE_NAME
+            """
+        elif self.db_type == 'postgres':
+            query = f"""
+            SELECT
+                c.table_name as TABLE_NAME,
+                NULL as CREATE_TIME,
+                NULL as UPDATE_TIME,
+                COUNT(*) as COLUMN_COUNT,
+                md5(string_agg(concat_ws(':', c.ordinal_position, c.column_name, c.udt_name, c.is_nullable),
+                               '|' ORDER BY c.ordinal_position)) as COLUMN_HASH,
+                k.constraint_count as CONSTRAINT_COUNT,
+                k.constraint_hash as CONSTRAINT_HASH
+            FROM information_schema.columns c
+            LEFT JOIN (
+                SELECT
+                    cl.relname as table_name,
+                    COUNT(*) as constraint_count,
+                    md5(string_agg(concat_ws(':', con.conname, con.contype, pg_get_constraintdef(con.oid)),
+                                   '|' ORDER BY con.conname)) as constraint_hash
+                FROM pg_constraint con
+                JOIN pg_class cl ON cl.oid = con.conrelid
+                JOIN pg_namespace ns ON ns.oid = cl.relnamespace
+                WHERE ns.nspname = '{self.schema}'
+                GROUP BY cl.relname
+            ) k ON k.table_name = c.table_name
+            WHERE c.table_schema = '{self.schema}'
+            GROUP BY c.table_name, k.constraint_count, k.constraint_hash
+            ORDER BY c.table_name
+            """
+        else:
+            return {}
+        
+        try:
+            results = self.db_connector.execute_query(query)
+        except Exception as e:
+            logger.warning(f"计算表指纹失败，将全量提取: {str(e)}")
+            return {}
+        
+        fingerprints = {}
+        for row in results:
+            raw = (
+                f"{self.db_type}|{self.database}|{row['CREATE_TIME']}|{row['COLUMN_COUNT']}|{row['COLUMN_HASH']}"
+                f"|{row['CONSTRAINT_COUNT']}|{row['CONSTRAINT_HASH']}"
+            )
+            update_time = row['UPDATE_TIME']
+            fingerprints[row['TABLE_NAME']] = {
+                "fingerprint": hashlib.md5(raw.encode('utf-8')).hexdigest(),
+                "update_time": str(update_time) if update_time is not None else None
+            }
+        return fingerprints
     
-    def _extract_columns(self) -> Dict[str, List[Dict[str, Any]]]:
+    def _table_filter_sql(self, column: str, tables: Optional[List[str]]) -> str:
+        """
+        构造按表名过滤的SQL条件
+        
+        Args:
+            column: 表名字段表达式
+            tables: 表名列表，None表示不过滤
+            
+        Returns:
+            SQL条件片段（以AND开头），不过滤时为空字符串
+        """
+        if tables is None:
+            return ""
+        names = ", ".join("'" + name.replace("'", "''") + "'" for name in tables)
+        return f"AND {column} IN ({names})"
+    
+    def _extract_columns(self, tables: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
         提取表列信息
         
+        Args:
+            tables: 只提取这些表，None表示全部
+        
         Returns:
             表列信息字典
         """
@@ -103,6 +416,7 @@ class MetadataExtractor:
                 c.ORDINAL_POSITION
             FROM information_schema.COLUMNS c
             WHERE c.TABLE_SCHEMA = '{self.database}'
+              {self._table_filter_sql('c.TABLE_NAME', tables)}
             ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
             """
         elif self.db_type == 'postgres':
@@ -117,7 +431,8 @@ class MetadataExtractor:
                 '' as COLUMN_COMMENT,
                 c.ordinal_position as ORDINAL_POSITION
             FROM information_schema.columns c
-            WHERE c.table_schema = 'public'
+            WHERE c.table_schema = '{self.schema}'
+              {self._table_filter_sql('c.table_name', tables)}
             ORDER BY c.table_name, c.ordinal_position
             """
         else:
@@ -146,10 +461,13 @@ class MetadataExtractor:
         logger.info(f"提取了 {len(columns_by_table)} 个表的列信息")
         return columns_by_table
     
-    def _extract_primary_keys(self) -> Dict[str, List[str]]:
+    def _extract_primary_keys(self, tables: Optional[List[str]] = None) -> Dict[str, List[str]]:
         """
         提取主键信息
         
+        Args:
+            tables: 只提取这些表，None表示全部
+        
         Returns:
             表主键信息字典
         """
@@ -161,10 +479,11 @@ class MetadataExtractor:
             FROM information_schema.KEY_COLUMN_USAGE
             WHERE TABLE_SCHEMA = '{self.database}'
               AND CONSTRAINT_NAME = 'PRIMARY'
+              {self._table_filter_sql('TABLE_NAME', tables)}
             ORDER BY TABLE_NAME, ORDINAL_POSITION
             """
         elif self.db_type == 'postgres':
-            query = """
+            query = f"""
             SELECT
                 tc.table_name as TABLE_NAME,
                 kcu.column_name as COLUMN_NAME
@@ -173,7 +492,8 @@ class MetadataExtractor:
               ON tc.constraint_name = kcu.constraint_name
               AND tc.table_schema = kcu.table_schema
             WHERE tc.constraint_type = 'PRIMARY KEY'
-              AND tc.table_schema = 'public'
+              AND tc.table_schema = '{self.schema}'
+              {self._table_filter_sql('tc.table_name', tables)}
             ORDER BY tc.table_name, kcu.ordinal_position
             """
         else:
@@ -191,29 +511,36 @@ class MetadataExtractor:
         logger.info(f"提取了 {len(primary_keys)} 个表的主键信息")
         return primary_keys
     
-    def _extract_foreign_keys(self) -> Dict[str, Dict[str, str]]:
+    def _extract_foreign_keys(self, tables: Optional[List[str]] = None) -> Dict[str, Dict[str, str]]:
         """
         提取外键信息
         
+        Args:
+            tables: 只提取这些表，None表示全部
+        
         Returns:
-            表外键信息字典，格式: {table: {column: "ref_table.ref_column"}}
+            表外键信息字典，格式: {table: {column: "ref_table.ref_column"}}，
+            qualify_foreign_keys时为 "ref_schema.ref_table.ref_column"
         """
         if self.db_type == 'mysql':
             query = f"""
             SELECT
                 kcu.TABLE_NAME,
                 kcu.COLUMN_NAME,
+                kcu.REFERENCED_TABLE_SCHEMA,
                 kcu.REFERENCED_TABLE_NAME,
                 kcu.REFERENCED_COLUMN_NAME
             FROM information_schema.KEY_COLUMN_USAGE kcu
             WHERE kcu.TABLE_SCHEMA = '{self.database}'
               AND kcu.REFERENCED_TABLE_NAME IS NOT NULL
+              {self._table_filter_sql('kcu.TABLE_NAME', tables)}
             """
         elif self.db_type == 'postgres':
-            query = """
+            query = f"""
             SELECT
                 kcu.table_name as TABLE_NAME,
                 kcu.column_name as COLUMN_NAME,
+                ccu.table_schema as REFERENCED_TABLE_SCHEMA,
                 ccu.table_name as REFERENCED_TABLE_NAME,
                 ccu.column_name as REFERENCED_COLUMN_NAME
             FROM information_schema.table_constraints tc
@@ -222,9 +549,10 @@ class MetadataExtractor:
               AND tc.table_schema = kcu.table_schema
             JOIN information_schema.constraint_column_usage ccu
               ON ccu.constraint_name = tc.constraint_name
-              AND ccu.table_schema = tc.table_schema
+              AND ccu.constraint_schema = tc.constraint_schema
             WHERE tc.constraint_type = 'FOREIGN KEY'
-              AND tc.table_schema = 'public'
+              AND tc.table_schema = '{self.schema}'
+              {self._table_filter_sql('kcu.table_name', tables)}
             """
         else:
             return {}
@@ -240,32 +568,131 @@ class MetadataExtractor:
             column = row['COLUMN_NAME']
             ref_table = row['REFERENCED_TABLE_NAME']
             ref_column = row['REFERENCED_COLUMN_NAME']
+            if self.qualify_foreign_keys:
+                ref_table = f"{row['REFERENCED_TABLE_SCHEMA']}.{ref_table}"
             foreign_keys[table_name][column] = f"{ref_table}.{ref_column}"
         
         logger.info(f"提取了 {len(foreign_keys)} 个表的外键信息")
         return foreign_keys
 
-    def extract_ddl_rag_mysql(self) -> List[Dict[str, str]]:
+    def extract_ddl_rag_mysql(
+        self,
+        previous_ddl: Optional[List[Dict[str, str]]] = None,
+        table_names: Optional[List[str]] = None,
+        max_workers: Optional[int] = None
+    ) -> List[Dict[str, str]]:
         """
         提取mysql的构建DDL
 
+        SHOW CREATE TABLE 通过连接池并发执行，总耗时约为 N/并发数 次往返。
+
+        Args:
+            previous_ddl: 上次保存的DDL列表（增量模式），未变化的表直接复用
+            table_names: 要提取的表名列表（通常为已提取元数据的表），None时查询所有表名
+            max_workers: 并发数，默认为连接池最大连接数
 
         Returns:
         表外键信息字典，格式: [{db_name:...,column:...,ddl_doc:...}]
         """
+        if self.db_type != 'mysql':
+            return []
+        
+        reusable = {}
+        for item in previous_ddl or []:
+            if item.get('db_name') == self.database and item.get('table_name') in self.unchanged_tables:
+                reusable[item['table_name']] = item
+        
+        if table_names is None:
+            table_names = self._extract_table_names()
+        
+        pending = [table_name for table_name in table_names if table_name not in reusable]
+        workers = max(1, min(max_workers or self.db_connector.pool_max_size, len(pending) or 1))
+        if pending:
+            logger.info(f"提取 {len(pending)} 个表的DDL（并发 {workers}）")
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map按输入顺序返回结果
+            created = dict(zip(pending, executor.map(self._show_create_table, pending)))
+        
         ddl_rag=[]
-        # 提取列信息
-        columns_data = self._extract_columns()
-        for table_name, _ in columns_data.items():
-            if self.db_type == 'mysql':
-                query = f"""
-                SHOW CREATE TABLE {table_name}
-                """
-                result=self.db_connector.execute_query(query)
-                if 'Table' in result[0]:
-                    ddl_rag.append({'db_name':self.database,'table_name':table_name,'ddl_doc':result[0]['Create Table']})
+        for table_name in table_names:
+            if table_name in reusable:
+                ddl_rag.append(reusable[table_name])
+            elif created.get(table_name):
+                ddl_rag.append({'db_name':self.database,'table_name':table_name,'ddl_doc':created[table_name]})
         return ddl_rag
 
+    def _show_create_table(self, table_name: str) -> Optional[str]:
+        """
+        查询单个表的建表语句
+
+        Args:
+            table_name: 表名
+
+        Returns:
+            建表语句，视图等非表对象返回None
+        """
+        quoted = ".".join("`" + name.replace("`", "``") + "`" for name in (self.database, table_name))
+        result = self.db_connector.execute_query(f"SHOW CREATE TABLE {quoted}")
+        if result and 'Table' in result[0]:
+            return result[0]['Create Table']
+        return None
+
+    def _extract_table_names(self) -> List[str]:
+        """
+        查询数据库中的所有表名（只读TABLES，不扫描列信息）
+
+        Returns:
+            表名列表
+        """
+        query = f"""
+        SELECT TABLE_NAME
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = '{self.database}'
+          AND TABLE_TYPE = 'BASE TABLE'
+        ORDER BY TABLE_NAME
+        """
+        return [row['TABLE_NAME'] for row in self.db_connector.execute_query(query)]
+
+    
+    def load_metadata(self, output_path: str) -> Optional[Dict[str, Any]]:
+        """
+        读取上次保存的元数据
+        
+        Args:
+            output_path: 元数据文件路径
+            
+        Returns:
+            元数据字典，文件不存在或无法解析时返回None
+        """
+        if not os.path.exists(output_path):
+            return None
+        try:
+            with open(output_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"无法读取上次的元数据，将全量提取: {str(e)}")
+            return None
+    
+    def load_ddl_rag(self, output_path: str) -> Optional[List[Dict[str, str]]]:
+        """
+        读取上次保存的DDL列表
+        
+        Args:
+            output_path: 元数据文件路径（DDL保存在同目录的ddl_mysql/ddl.jsonl）
+            
+        Returns:
+            DDL列表，文件不存在或无法解析时返回None
+        """
+        ddl_file_path = Path(output_path).parent / 'ddl_mysql' / 'ddl.jsonl'
+        if not ddl_file_path.exists():
+            return None
+        try:
+            with open(ddl_file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"无法读取上次的DDL，将重新提取: {str(e)}")
+            return None
     
     def save_metadata(self, metadata: Dict[str, Any], output_path: str):
         """
@@ -302,7 +729,9 @@ class MetadataExtractor:
 def extract_and_save_metadata(
     db_connector: DatabaseConnector,
     output_path: str,
-    table_blacklist: List[str] = None
+    table_blacklist: List[str] = None,
+    incremental: bool = False,
+    schemas: Any = None
 ) -> Dict[str, Any]:
     """
     提取并保存元数据的便捷函数
@@ -311,15 +740,31 @@ def extract_and_save_metadata(
         db_connector: 数据库连接器
         output_path: 输出文件路径
         table_blacklist: 表黑名单
+        incremental: 是否增量提取（与output_path中上次的元数据比较表指纹，只重新提取变化的表）
+        schemas: 要提取的schema名称或通配符列表；为空时只提取连接的数据库，否则并发提取所有匹配的schema，表键为 schema.table
         
     Returns:
         元数据字典
     """
     extractor = MetadataExtractor(db_connector)
-    metadata = extractor.extract_metadata(table_blacklist)
+    previous = extractor.load_metadata(output_path) if incremental else None
+    if schemas:
+        previous_ddl = None
+        if incremental and extractor.db_type == 'mysql':
+            previous_ddl = extractor.load_ddl_rag(output_path)
+        metadata, ddl_rag = extractor.extract_schemas(
+            extractor.resolve_schemas(schemas), table_blacklist, previous, previous_ddl
+        )
+        extractor.save_metadata(metadata, output_path)
+        if extractor.db_type == 'mysql':
+            extractor.save_ddl_rag(ddl_rag, output_path)
+        return metadata
+    
+    metadata = extractor.extract_metadata(table_blacklist, previous)
     extractor.save_metadata(metadata, output_path)
     if extractor.db_type=='mysql':
-        ddl_rag=extractor.extract_ddl_rag_mysql()
+        previous_ddl = extractor.load_ddl_rag(output_path) if incremental else None
+        ddl_rag=extractor.extract_ddl_rag_mysql(previous_ddl, list(metadata))
         extractor.save_ddl_rag(ddl_rag,output_path)
     return metadata
 
@@ -4,8 +4,11 @@
 """
 from pathlib import Path
 import json
+import math
+import asyncio
 import logging
-from typing import Dict, List, Any,Optional
+from collections import deque
+from typing import Dict, List, Any,Optional,Tuple,Set
 # from .llm_client import LLMClient
 # from .table_cards import TableCardsGenerator
 import sys
@@ -13,11 +16,13 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # 然后修改导入
 try:
-    from .llm_client import LLMClient
+    from .llm_client import LLMClient, AsyncLLMClient
     from .table_cards import TableCardsGenerator
+    from .schema_graph import partition_tables, build_fk_graph, resolve_reference
 except ImportError:
-    from llm_client import LLMClient
+    from llm_client import LLMClient, AsyncLLMClient
     from table_cards import TableCardsGenerator
+    from schema_graph import partition_tables, build_fk_graph, resolve_reference
 
 
 logger = logging.getLogger(__name__)
@@ -26,17 +31,37 @@ logger = logging.getLogger(__name__)
 class TopicPlanner:
     """主题规划器类"""
     
-    def __init__(self, llm_client: LLMClient, table_cards: Dict[str, Dict[str, Any]],db_name: Optional[str] = None):
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        table_cards: Dict[str, Dict[str, Any]],
+        db_name: Optional[str] = None,
+        max_tables_per_call: int = 0,
+        max_workers: int = 4
+    ):
         """
         初始化主题规划器
         
         Args:
             llm_client: LLM客户端实例
             table_cards: 表卡片字典
+            db_name: 数据库名称
+            max_tables_per_call: 单次规划调用的最大表数，表数超过时按外键图划分社区分别规划，0表示不划分
+            max_workers: 并发规划的社区数
         """
         self.llm_client = llm_client
+        self._aclient = getattr(llm_client, 'aclient', llm_client)
         self.table_cards = table_cards
         self.db_name= db_name or ''
+        self.max_tables_per_call = max(0, int(max_tables_per_call or 0))
+        self.max_workers = max(1, int(max_workers or 1))
+        
+        # 多schema时表键为 schema.table，LLM只写了表名时按唯一匹配还原为完整表键
+        keys_by_table: Dict[str, List[str]] = {}
+        for key, card in table_cards.items():
+            if card.get('table'):
+                keys_by_table.setdefault(card['table'], []).append(key)
+        self._bare_tables = {name: keys[0] for name, keys in keys_by_table.items() if len(keys) == 1}
         
     def generate_plan(
         self,
@@ -54,27 +79,42 @@ class TopicPlanner:
             max_tables: 每个主题最大表数量
             dialect: SQL方言
             
+        Returns:
+            规划字典，包含topics列表
+        """
+        # 规划逻辑只有异步实现，同步接口在LLMClient门面的事件循环中执行
+        return self.llm_client.run(self.agenerate_plan(total_samples, min_tables, max_tables, dialect))
+    
+    async def agenerate_plan(
+        self,
+        total_samples: int,
+        min_tables: int = 3,
+        max_tables: int = 8,
+        dialect: str = "mysql"
+    ) -> Dict[str, Any]:
+        """
+        异步生成主题规划，参数同generate_plan
+        
         Returns:
             规划字典，包含topics列表
         """
         logger.info(f"开始生成主题规划，目标样本数: {total_samples}")
         
-        # 将表卡片转换为文本
-        generator = TableCardsGenerator(self.table_cards)
-        table_cards_text = generator.get_table_cards_text(self.table_cards)
+        jobs = self._plan_community_jobs(total_samples, min_tables)
+        if jobs is not None:
+            semaphore = asyncio.Semaphore(self.max_workers)
+            
+            async def plan_job(job: Tuple[List[str], int]) -> Optional[Dict[str, Any]]:
+                async with semaphore:
+                    return await self._agenerate_community_plan(job, min_tables, max_tables, dialect)
+            
+            plans = await asyncio.gather(*(plan_job(job) for job in jobs))
+            return self._merge_community_plans(plans, total_samples, min_tables, max_tables)
         
-        # 构建提示词
-        prompt = self._build_planning_prompt(
-            table_cards_text,
-            total_samples,
-            min_tables,
-            max_tables,
-            dialect
-        )
+        prompt = self._prepare_planning_prompt(total_samples, min_tables, max_tables, dialect)
         
-        # 调用LLM生成规划
         try:
-            plan_data = self.llm_client.call_llm(prompt, expect_json=True)
+            plan_data = await self._aclient.call_llm(prompt, expect_json=True)
             
             # 验证和调整规划
             plan = self._validate_and_adjust_plan(plan_data, total_samples, min_tables, max_tables)
@@ -86,6 +126,131 @@ class TopicPlanner:
             logger.error(f"生成规划失败: {str(e)}")
             raise
     
+    def _plan_community_jobs(self, total_samples: int, min_tables: int) -> Optional[List[Tuple[List[str], int]]]:
+        """
+        表数超过单次规划上限时，按外键图划分社区并按表数比例分配样本数
+        
+        Args:
+            total_samples: 总样本数
+            min_tables: 每个主题最小表数
+            
+        Returns:
+            (社区表键列表, 分配的样本数) 列表；不需要划分时返回None
+        """
+        if not self.max_tables_per_call or len(self.table_cards) <= self.max_tables_per_call:
+            return None
+        
+        communities = partition_tables(self.table_cards, self.max_tables_per_call, min_tables)
+        communities = [members for members in communities if len(members) >= min_tables]
+        if not communities:
+            return None
+        
+        # 最大余数法按表数分配，样本数少于社区数时小社区分到0个，不参与规划
+        total_tables = sum(len(members) for members in communities)
+        shares = [total_samples * len(members) / total_tables for members in communities]
+        counts = [int(share) for share in shares]
+        by_remainder = sorted(range(len(shares)), key=lambda i: shares[i] - counts[i], reverse=True)
+        for i in by_remainder[:total_samples - sum(counts)]:
+            counts[i] += 1
+        
+        jobs = [(members, count) for members, count in zip(communities, counts) if count > 0]
+        logger.info(f"表数 {len(self.table_cards)} 超过单次规划上限 {self.max_tables_per_call}，分 {len(jobs)} 个社区规划")
+        return jobs
+    
+    def _community_planner(self, members: List[str]) -> 'TopicPlanner':
+        """创建只包含一个社区表卡片的规划器"""
+        return TopicPlanner(
+            self.llm_client,
+            {table_name: self.table_cards[table_name] for table_name in members},
+            self.db_name
+        )
+    
+    async def _agenerate_community_plan(
+        self,
+        job: Tuple[List[str], int],
+        min_tables: int,
+        max_tables: int,
+        dialect: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        规划单个社区，失败时记录日志并返回None，其样本数在合并时分摊给其他社区
+        
+        Args:
+            job: (社区表键列表, 分配的样本数)
+            min_tables: 最小表数
+            max_tables: 最大表数
+            dialect: SQL方言
+            
+        Returns:
+            社区规划字典
+        """
+        members, count = job
+        try:
+            return await self._community_planner(members).agenerate_plan(count, min_tables, max_tables, dialect)
+        except Exception as e:
+            logger.error(f"社区（{len(members)} 个表，首表 {members[0]}）规划失败: {str(e)}")
+            return None
+    
+    def _merge_community_plans(
+        self,
+        plans: List[Optional[Dict[str, Any]]],
+        total_samples: int,
+        min_tables: int,
+        max_tables: int
+    ) -> Dict[str, Any]:
+        """
+        合并各社区的规划，并重新调整样本数使总和等于total_samples
+        
+        Args:
+            plans: 各社区规划（失败为None）
+            total_samples: 总样本数
+            min_tables: 最小表数
+            max_tables: 最大表数
+            
+        Returns:
+            合并后的规划字典
+        """
+        topics = [topic for plan in plans if plan for topic in plan['topics']]
+        failed = sum(1 for plan in plans if not plan)
+        if failed:
+            logger.warning(f"{failed}/{len(plans)} 个社区规划失败，样本数分摊给其他社区")
+        
+        plan = self._validate_and_adjust_plan({"topics": topics}, total_samples, min_tables, max_tables)
+        logger.info(f"成功生成规划，包含 {len(plan['topics'])} 个主题")
+        return plan
+    
+    def _prepare_planning_prompt(
+        self,
+        total_samples: int,
+        min_tables: int,
+        max_tables: int,
+        dialect: str
+    ) -> str:
+        """
+        将表卡片转换为文本并构建规划提示词
+        
+        Args:
+            total_samples: 总样本数
+            min_tables: 最小表数
+            max_tables: 最大表数
+            dialect: SQL方言
+            
+        Returns:
+            提示词文本
+        """
+        # 将表卡片转换为文本
+        generator = TableCardsGenerator(self.table_cards)
+        table_cards_text = generator.get_table_cards_text(self.table_cards)
+        
+        # 构建提示词
+        return self._build_planning_prompt(
+            table_cards_text,
+            total_samples,
+            min_tables,
+            max_tables,
+            dialect
+        )
+    
     def _build_planning_prompt(
         self,
         table_cards_text: str,
@@ -178,7 +343,10 @@ class TopicPlanner:
                 continue
             
             # 验证表名
-            topic_tables = [t for t in topic['tables'] if t in table_names]
+            topic_tables = [
+                t if t in table_names else self._bare_tables[t]
+                for t in topic['tables'] if t in table_names or t in self._bare_tables
+            ]
             if len(topic_tables) < min_tables:
                 logger.warning(f"主题 {topic['name']} 的有效表数量不足，跳过")
                 continue
@@ -263,6 +431,214 @@ class TopicPlanner:
             json.dump(plan_rag, f, ensure_ascii=False, indent=2)
         logger.info(f"plan文档已保存到: {doc_file_path}")
 
+class GraphTopicPlanner(TopicPlanner):
+    """
+    本地图规划器 - 不调用LLM，沿外键图枚举连接路径生成主题
+    
+    输出与TopicPlanner相同的 {"topics": [...]} 结构，相同输入得到相同规划。
+    """
+    
+    def __init__(self, table_cards: Dict[str, Dict[str, Any]], db_name: Optional[str] = None):
+        """
+        初始化图规划器
+        
+        Args:
+            table_cards: 表卡片字典
+            db_name: 数据库名称
+        """
+        super().__init__(None, table_cards, db_name)
+    
+    def generate_plan(
+        self,
+        total_samples: int,
+        min_tables: int = 3,
+        max_tables: int = 8,
+        dialect: str = "mysql"
+    ) -> Dict[str, Any]:
+        """
+        生成主题规划
+        
+        以未覆盖的表为起点（按外键度数从高到低），沿外键广度优先扩展为
+        min_tables~max_tables 张表的连接路径，直到所有可成组的表都被覆盖；
+        样本数按表规模（有列画像时为估算行数，否则为字段数）加权分配。
+        
+        Args:
+            total_samples: 总样本数
+            min_tables: 每个主题最小表数
+            max_tables: 每个主题最大表数
+            dialect: SQL方言
+            
+        Returns:
+            规划字典，包含topics列表
+        """
+        logger.info(f"开始基于外键图生成主题规划，目标样本数: {total_samples}")
+        
+        graph = build_fk_graph(self.table_cards)
+        topics = []
+        seen_sets: Set[frozenset] = set()
+        covered: Set[str] = set()
+        
+        for seed in sorted(graph, key=lambda t: (-len(graph[t]), t)):
+            if seed in covered:
+                continue
+            tables = self._grow_topic(graph, seed, covered, max_tables)
+            covered.update(tables)
+            if len(tables) < min_tables or frozenset(tables) in seen_sets:
+                continue
+            seen_sets.add(frozenset(tables))
+            topics.append(self._make_topic(tables, dialect))
+        
+        if not topics:
+            # 没有足够的外键关联时按表名顺序分组，保证流程可继续
+            logger.warning(f"外键图中没有包含 {min_tables} 张以上表的连通组，按表名顺序分组")
+            names = sorted(self.table_cards)
+            for start in range(0, len(names), max_tables):
+                tables = names[start:start + max_tables]
+                if len(tables) >= min_tables:
+                    topics.append(self._make_topic(tables, dialect))
+        
+        if not topics:
+            raise ValueError("没有有效的主题规划")
+        
+        topics = self._allocate_counts(topics, total_samples)
+        logger.info(f"成功生成规划，包含 {len(topics)} 个主题")
+        return {"topics": topics}
+    
+    async def agenerate_plan(
+        self,
+        total_samples: int,
+        min_tables: int = 3,
+        max_tables: int = 8,
+        dialect: str = "mysql"
+    ) -> Dict[str, Any]:
+        """
+        与generate_plan相同（纯本地计算），供异步调用方统一接口
+        
+        Returns:
+            规划字典，包含topics列表
+        """
+        return self.generate_plan(total_samples, min_tables, max_tables, dialect)
+    
+    def _grow_topic(self, graph: Dict[str, Set[str]], seed: str, covered: Set[str], max_tables: int) -> List[str]:
+        """
+        从起点表沿外键广度优先扩展，优先加入未覆盖、度数高的表
+        
+        Args:
+            graph: 外键图
+            seed: 起点表
+            covered: 已被其他主题覆盖的表
+            max_tables: 最大表数
+            
+        Returns:
+            主题的表列表（每张表都与之前的某张表有外键连接）
+        """
+        tables = [seed]
+        visited = {seed}
+        queue = deque([seed])
+        while queue and len(tables) < max_tables:
+            node = queue.popleft()
+            neighbors = sorted(graph[node] - visited, key=lambda t: (t in covered, -len(graph[t]), t))
+            for neighbor in neighbors:
+                if len(tables) >= max_tables:
+                    break
+                tables.append(neighbor)
+                visited.add(neighbor)
+                queue.append(neighbor)
+        return tables
+    
+    def _make_topic(self, tables: List[str], dialect: str) -> Dict[str, Any]:
+        """
+        构造主题，理由中列出主题内的外键连接路径
+        
+        Args:
+            tables: 表列表
+            dialect: SQL方言
+            
+        Returns:
+            主题字典
+        """
+        table_set = set(tables)
+        joins = []
+        for table_name in tables:
+            for column, ref in (self.table_cards[table_name].get('foreign_keys') or {}).items():
+                if resolve_reference(ref, table_set):
+                    joins.append(f"{table_name}.{column} -> {ref}")
+        reason = "外键连接: " + "; ".join(joins) if joins else "按表名分组"
+        return {
+            "name": f"{tables[0]}及关联表分析",
+            "tables": tables,
+            "reason": reason,
+            "count": 0,
+            "dialect": dialect
+        }
+    
+    def _table_weight(self, table_name: str) -> float:
+        """表规模权重：有估算行数时为 log(1+行数)，否则为字段数"""
+        card = self.table_cards[table_name]
+        if card.get('row_estimate') is not None:
+            return math.log1p(card['row_estimate'])
+        return float(len(card.get('columns') or []))
+    
+    def _allocate_counts(self, topics: List[Dict[str, Any]], total_samples: int) -> List[Dict[str, Any]]:
+        """
+        按主题内表规模之和用最大余数法分配样本数；样本数少于主题数时只保留权重最高的主题
+        
+        Args:
+            topics: 主题列表
+            total_samples: 总样本数
+            
+        Returns:
+            分配了count的主题列表（去掉分到0个样本的主题）
+        """
+        weights = [max(1.0, sum(self._table_weight(t) for t in topic['tables'])) for topic in topics]
+        if total_samples < len(topics):
+            keep = sorted(range(len(topics)), key=lambda i: (-weights[i], i))[:total_samples]
+            topics = [topics[i] for i in sorted(keep)]
+            weights = [weights[i] for i in sorted(keep)]
+        
+        # 每个主题先保底1条，其余按权重分配
+        spare = total_samples - len(topics)
+        total_weight = sum(weights)
+        shares = [spare * weight / total_weight for weight in weights]
+        counts = [1 + int(share) for share in shares]
+        by_remainder = sorted(range(len(shares)), key=lambda i: (int(shares[i]) - shares[i], i))
+        for i in by_remainder[:total_samples - sum(counts)]:
+            counts[i] += 1
+        
+        for topic, count in zip(topics, counts):
+            topic['count'] = count
+        return [topic for topic in topics if topic['count'] > 0]
+
+
+def create_planner(
+    llm_client: Optional[LLMClient],
+    table_cards: Dict[str, Dict[str, Any]],
+    db_name: Optional[str] = None,
+    planner_mode: str = "llm",
+    max_tables_per_call: int = 0,
+    max_workers: int = 4
+) -> TopicPlanner:
+    """
+    按规划模式创建规划器
+    
+    Args:
+        llm_client: LLM客户端（graph模式不需要）
+        table_cards: 表卡片字典
+        db_name: 数据库名称
+        planner_mode: llm 调用LLM规划；graph 沿外键图本地生成主题
+        max_tables_per_call: llm模式下单次规划调用的最大表数
+        max_workers: llm模式下并发规划的社区数
+        
+    Returns:
+        规划器实例
+    """
+    if planner_mode == 'graph':
+        return GraphTopicPlanner(table_cards, db_name)
+    if planner_mode != 'llm':
+        raise ValueError(f"不支持的规划模式: {planner_mode}")
+    return TopicPlanner(llm_client, table_cards, db_name, max_tables_per_call, max_workers)
+
+
 def generate_and_save_plan(
     llm_client: LLMClient,
     table_cards: Dict[str, Dict[str, Any]],
@@ -271,7 +647,10 @@ def generate_and_save_plan(
     min_tables: int = 3,
     max_tables: int = 8,
     dialect: str = "mysql",
-    db_name: Optional[str] = None
+    db_name: Optional[str] = None,
+    max_tables_per_call: int = 0,
+    max_workers: int = 4,
+    planner_mode: str = "llm"
 ) -> Dict[str, Any]:
     """
     生成并保存规划的便捷函数
@@ -284,17 +663,46 @@ def generate_and_save_plan(
         min_tables: 最小表数
         max_tables: 最大表数
         dialect: SQL方言
+        db_name: 数据库名称
+        max_tables_per_call: 单次规划调用的最大表数，超过时按外键图社区分别规划，0表示不划分
+        max_workers: 并发规划的社区数
+        planner_mode: llm 调用LLM规划；graph 沿外键图本地生成主题（不调用LLM，结果可复现）
         
     Returns:
         规划字典
     """
-    planner = TopicPlanner(llm_client, table_cards,db_name)
+    planner = create_planner(llm_client, table_cards, db_name, planner_mode, max_tables_per_call, max_workers)
     plan = planner.generate_plan(total_samples, min_tables, max_tables, dialect)
     planner.save_plan(plan, output_path)
     #增加rag保存
     planner.save_plan_rag(plan, output_path)
     return plan
 
+async def generate_and_save_plan_async(
+    llm_client: AsyncLLMClient,
+    table_cards: Dict[str, Dict[str, Any]],
+    total_samples: int,
+    output_path: str,
+    min_tables: int = 3,
+    max_tables: int = 8,
+    dialect: str = "mysql",
+    db_name: Optional[str] = None,
+    max_tables_per_call: int = 0,
+    planner_mode: str = "llm",
+    max_workers: int = 4
+) -> Dict[str, Any]:
+    """
+    异步生成并保存规划的便捷函数，参数同generate_and_save_plan
+    
+    Returns:
+        规划字典
+    """
+    planner = create_planner(llm_client, table_cards, db_name, planner_mode, max_tables_per_call, max_workers)
+    plan = await planner.agenerate_plan(total_samples, min_tables, max_tables, dialect)
+    planner.save_plan(plan, output_path)
+    planner.save_plan_rag(plan, output_path)
+    return plan
+
 if __name__ == '__main__':
     #实例化llm_client
     llm_config={
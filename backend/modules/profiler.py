@@ -0,0 +1,475 @@
+"""
+列画像模块
+对每个表做抽样查询，统计列的基数、空值率、最小/最大值和常见取值，供表卡片和生成提示词使用
+"""
+import os
+import json
+import time
+import random
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from .db_connector import DatabaseConnector
+except ImportError:
+    from db_connector import DatabaseConnector
+
+logger = logging.getLogger(__name__)
+
+# 不参与抽样的大字段/二进制类型
+SKIPPED_TYPES = (
+    'blob', 'binary', 'varbinary', 'bytea', 'image', 'geometry', 'point', 'polygon', 'linestring',
+    'json', 'jsonb', 'xml'
+)
+
+# 常见取值的最大字符数，超出截断
+MAX_VALUE_LENGTH = 50
+
+# 每批读取的抽样行数，每批结束检查一次时间预算
+FETCH_BATCH_SIZE = 200
+
+
+class ColumnProfiler:
+    """列画像器类"""
+
+    def __init__(
+        self,
+        db_connector: DatabaseConnector,
+        sample_rows: int = 1000,
+        top_k: int = 5,
+        time_budget_ms: int = 3000,
+        max_workers: Optional[int] = None
+    ):
+        """
+        初始化列画像器
+
+        Args:
+            db_connector: 数据库连接器
+            sample_rows: 每个表抽样的最大行数
+            top_k: 每列记录的常见取值个数
+            time_budget_ms: 每个表的时间预算（毫秒），同时作为抽样语句的超时
+            max_workers: 并发画像的表数，默认为连接池最大连接数
+        """
+        self.db_connector = db_connector
+        self.db_type = db_connector.db_type
+        self.sample_rows = max(1, int(sample_rows))
+        self.top_k = max(1, int(top_k))
+        self.time_budget_ms = max(1, int(time_budget_ms))
+        self.max_workers = max(1, int(max_workers or db_connector.pool_max_size))
+
+    def profile_tables(
+        self,
+        metadata: Dict[str, Any],
+        previous: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        对元数据中的所有表做列画像
+
+        表指纹与上次画像相同时直接复用上次结果；其余表在线程池中并发抽样，各自从连接池借用连接。
+
+        Args:
+            metadata: 元数据字典
+            previous: 上次保存的画像结果
+
+        Returns:
+            画像字典，格式:
+            {
+                "table_name": {
+                    "fingerprint": "...",
+                    "row_estimate": 12345,
+                    "sampled_rows": 1000,
+                    "columns": {
+                        "column": {"null_ratio": 0.1, "distinct": 5, "min": "...", "max": "...", "top_values": [...]}
+                    }
+                }
+            }
+        """
+        previous = previous or {}
+        profiles = {}
+        pending = []
+        for table_name, table_info in metadata.items():
+            cached = previous.get(table_name)
+            fingerprint = table_info.get('fingerprint')
+            if cached and fingerprint and cached.get('fingerprint') == fingerprint:
+                profiles[table_name] = cached
+            else:
+                pending.append(table_name)
+
+        if previous:
+            logger.info(f"列画像: {len(profiles)} 个表复用缓存, {len(pending)} 个表需要抽样")
+
+        if pending:
+            row_estimates = self._estimate_rows(metadata, pending)
+            workers = min(self.max_workers, len(pending))
+            logger.info(f"开始对 {len(pending)} 个表抽样画像（并发 {workers}）")
+
+            def profile_one(table_name: str) -> Optional[Dict[str, Any]]:
+                return self._profile_table_safe(table_name, metadata[table_name], row_estimates.get(table_name))
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for table_name, profile in zip(pending, executor.map(profile_one, pending)):
+                    if profile is not None:
+                        profiles[table_name] = profile
+
+        # 按元数据顺序输出
+        profiles = {table_name: profiles[table_name] for table_name in metadata if table_name in profiles}
+        logger.info(f"完成 {len(profiles)} 个表的列画像")
+        return profiles
+
+    def _profile_table_safe(
+        self,
+        table_name: str,
+        table_info: Dict[str, Any],
+        row_estimate: Optional[int]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        对单个表做画像，失败时记录日志并返回None，不影响其他表
+
+        Args:
+            table_name: 表键
+            table_info: 表元数据
+            row_estimate: 估算行数
+
+        Returns:
+            表画像字典
+        """
+        try:
+            return self._profile_table(table_name, table_info, row_estimate)
+        except Exception as e:
+            logger.warning(f"表 {table_name} 画像失败: {str(e)}")
+            return None
+
+    def _profile_table(
+        self,
+        table_name: str,
+        table_info: Dict[str, Any],
+        row_estimate: Optional[int]
+    ) -> Dict[str, Any]:
+        """
+        抽样读取一个表并统计各列
+
+        Args:
+            table_name: 表键
+            table_info: 表元数据
+            row_estimate: 估算行数
+
+        Returns:
+            表画像字典
+        """
+        columns = [
+            col['name'] for col in table_info['columns']
+            if not str(col.get('type', '')).lower().endswith(SKIPPED_TYPES)
+        ]
+        profile = {
+            "fingerprint": table_info.get('fingerprint'),
+            "row_estimate": row_estimate,
+            "sampled_rows": 0,
+            "columns": {}
+        }
+        if not columns:
+            return profile
+
+        start = time.monotonic()
+        deadline = start + self.time_budget_ms / 1000
+
+        offset = 0
+        if self.db_type == 'mysql' and row_estimate and row_estimate > self.sample_rows:
+            offset = random.randint(0, row_estimate - self.sample_rows)
+
+        try:
+            rows = self._fetch_sample(table_name, table_info, columns, row_estimate, offset, deadline)
+        except Exception as e:
+            # 随机偏移在大表上可能超时，剩余预算内从表头重新抽样
+            if not offset or time.monotonic() >= deadline:
+                raise
+            logger.debug(f"表 {table_name} 随机偏移抽样失败，改为从表头抽样: {str(e)}")
+            rows = self._fetch_sample(table_name, table_info, columns, row_estimate, 0, deadline)
+
+        profile['sampled_rows'] = len(rows)
+        for i, column in enumerate(columns):
+            profile['columns'][column] = self._summarize_column([row[i] for row in rows])
+        profile['elapsed_ms'] = round((time.monotonic() - start) * 1000, 2)
+        return profile
+
+    def _fetch_sample(
+        self,
+        table_name: str,
+        table_info: Dict[str, Any],
+        columns: List[str],
+        row_estimate: Optional[int],
+        offset: int,
+        deadline: float
+    ) -> List[Tuple[Any, ...]]:
+        """
+        执行抽样查询，通过iter_query流式分批读取，读满抽样行数或超出时间预算时停止并关闭游标
+
+        Args:
+            table_name: 表键
+            table_info: 表元数据
+            columns: 要读取的列
+            row_estimate: 估算行数
+            offset: 起始偏移（MySQL）
+            deadline: 截止时间（time.monotonic）
+
+        Returns:
+            元组行列表
+        """
+        remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+        query = self._sample_query(table_name, table_info, columns, row_estimate, offset, remaining_ms)
+
+        rows: List[Tuple[Any, ...]] = []
+        batches = self.db_connector.iter_query(
+            query, batch_size=FETCH_BATCH_SIZE, as_dict=False, timeout_ms=remaining_ms
+        )
+        try:
+            for batch in batches:
+                rows.extend(batch)
+                if len(rows) >= self.sample_rows or time.monotonic() >= deadline:
+                    break
+        finally:
+            batches.close()
+        return rows[:self.sample_rows]
+
+    def _sample_query(
+        self,
+        table_name: str,
+        table_info: Dict[str, Any],
+        columns: List[str],
+        row_estimate: Optional[int],
+        offset: int,
+        timeout_ms: int
+    ) -> str:
+        """
+        构造抽样查询：MySQL用随机偏移的LIMIT，PostgreSQL用TABLESAMPLE，SQL Server用TOP
+
+        Args:
+            table_name: 表键
+            table_info: 表元数据
+            columns: 要读取的列
+            row_estimate: 估算行数
+            offset: 起始偏移（MySQL）
+            timeout_ms: 语句超时（MySQL通过优化器提示设置）
+
+        Returns:
+            SQL语句
+        """
+        if table_info.get('schema'):
+            table_ref = f"{self._quote(table_info['schema'])}.{self._quote(table_info['table'])}"
+        else:
+            table_ref = self._quote(table_name)
+        column_list = ", ".join(self._quote(column) for column in columns)
+
+        if self.db_type == 'mysql':
+            return (
+                f"SELECT /*+ MAX_EXECUTION_TIME({timeout_ms}) */ {column_list} FROM {table_ref} "
+                f"LIMIT {self.sample_rows} OFFSET {offset}"
+            )
+        if self.db_type == 'postgres':
+            sample = ""
+            if row_estimate and row_estimate > self.sample_rows * 2:
+                # 按页抽样，取目标行数两倍的比例以抵消页内行数不均
+                percent = min(100.0, self.sample_rows * 2 * 100 / row_estimate)
+                sample = f" TABLESAMPLE SYSTEM ({percent:.6f})"
+            return f"SELECT {column_list} FROM {table_ref}{sample} LIMIT {self.sample_rows}"
+        return f"SELECT TOP {self.sample_rows} {column_list} FROM {table_ref}"
+
+    def _summarize_column(self, values: List[Any]) -> Dict[str, Any]:
+        """
+        统计一列的抽样值
+
+        Args:
+            values: 抽样值列表
+
+        Returns:
+            列统计字典
+        """
+        total = len(values)
+        non_null = [value for value in values if value is not None and not isinstance(value, (bytes, bytearray))]
+        counts = Counter(non_null)
+        stats = {
+            "null_ratio": round(sum(1 for value in values if value is None) / total, 4) if total else None,
+            "distinct": len(counts)
+        }
+
+        if non_null:
+            try:
+                stats['min'] = self._to_text(min(non_null))
+                stats['max'] = self._to_text(max(non_null))
+            except TypeError:
+                pass
+
+        # 只记录确实重复出现的取值，主键等几乎唯一的列没有代表性取值
+        top_values = [value for value, count in counts.most_common(self.top_k) if count > 1]
+        if top_values:
+            stats['top_values'] = [self._to_text(value) for value in top_values]
+        return stats
+
+    def _estimate_rows(self, metadata: Dict[str, Any], tables: List[str]) -> Dict[str, int]:
+        """
+        从系统表读取估算行数（不扫描数据）
+
+        Args:
+            metadata: 元数据字典
+            tables: 要估算的表键
+
+        Returns:
+            表键 -> 估算行数，不支持或失败时为空字典
+        """
+        default_schema = self.db_connector.database if self.db_type == 'mysql' else 'public'
+        keys = {}
+        for table_name in tables:
+            table_info = metadata[table_name]
+            schema = table_info.get('schema') or default_schema
+            keys[(schema, table_info.get('table') or table_name)] = table_name
+
+        schemas = ", ".join("'" + schema.replace("'", "''") + "'" for schema in {schema for schema, _ in keys})
+        if self.db_type == 'mysql':
+            query = f"""
+            SELECT TABLE_SCHEMA, TABLE_NAME, TABLE_ROWS AS ROW_ESTIMATE
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA IN ({schemas})
+            """
+        elif self.db_type == 'postgres':
+            query = f"""
+            SELECT n.nspname as TABLE_SCHEMA, c.relname as TABLE_NAME, c.reltuples as ROW_ESTIMATE
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind = 'r'
+              AND n.nspname IN ({schemas})
+            """
+        else:
+            return {}
+
+        try:
+            results = self.db_connector.execute_query(query)
+        except Exception as e:
+            logger.warning(f"读取估算行数失败: {str(e)}")
+            return {}
+
+        estimates = {}
+        for row in results:
+            table_name = keys.get((row['TABLE_SCHEMA'], row['TABLE_NAME']))
+            if table_name is not None and row['ROW_ESTIMATE'] is not None:
+                # PostgreSQL未ANALYZE的表reltuples为-1
+                estimates[table_name] = max(0, int(row['ROW_ESTIMATE']))
+        return estimates
+
+    def _quote(self, name: str) -> str:
+        """按数据库类型给标识符加引号"""
+        if self.db_type == 'mysql':
+            return "`" + name.replace("`", "``") + "`"
+        if self.db_type == 'sqlserver':
+            return "[" + name.replace("]", "]]") + "]"
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def _to_text(value: Any) -> str:
+        """转换为可写入JSON的文本，过长时截断"""
+        text = str(value)
+        return text if len(text) <= MAX_VALUE_LENGTH else text[:MAX_VALUE_LENGTH] + "..."
+
+    def load_profiles(self, output_path: str) -> Optional[Dict[str, Any]]:
+        """
+        读取上次保存的画像结果
+
+        Args:
+            output_path: 画像文件路径
+
+        Returns:
+            画像字典，文件不存在或无法解析时返回None
+        """
+        if not os.path.exists(output_path):
+            return None
+        try:
+            with open(output_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"无法读取上次的列画像，将重新抽样: {str(e)}")
+            return None
+
+    def save_profiles(self, profiles: Dict[str, Any], output_path: str):
+        """
+        保存画像结果到JSON文件
+
+        Args:
+            profiles: 画像字典
+            output_path: 输出文件路径
+        """
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, ensure_ascii=False, indent=2)
+        logger.info(f"列画像已保存到: {output_path}")
+
+
+def format_profile_hint(column_profile: Optional[Dict[str, Any]]) -> str:
+    """
+    将列统计转换为简短的提示文本，用于表卡片和生成提示词
+
+    Args:
+        column_profile: 列统计字典
+
+    Returns:
+        提示文本，没有可用信息时为空字符串
+    """
+    if not column_profile:
+        return ""
+    parts = []
+    if column_profile.get('top_values'):
+        parts.append("常见取值: " + ", ".join(f"'{value}'" for value in column_profile['top_values']))
+    elif column_profile.get('min') is not None and column_profile.get('min') != column_profile.get('max'):
+        parts.append(f"范围: {column_profile['min']} ~ {column_profile['max']}")
+    null_ratio = column_profile.get('null_ratio')
+    if null_ratio is not None and null_ratio >= 0.5:
+        parts.append(f"空值率{null_ratio:.0%}")
+    return "，".join(parts)
+
+
+def profile_and_save(
+    db_connector: DatabaseConnector,
+    metadata: Dict[str, Any],
+    output_path: str,
+    sample_rows: int = 1000,
+    top_k: int = 5,
+    time_budget_ms: int = 3000,
+    max_workers: Optional[int] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    列画像并保存的便捷函数
+
+    画像结果按表指纹缓存在output_path中，同时写入metadata每个表的 profile 字段（只在内存中，不改写metadata.json），
+    供表卡片和样本生成使用。
+
+    Args:
+        db_connector: 数据库连接器
+        metadata: 元数据字典
+        output_path: 画像文件路径
+        sample_rows: 每个表抽样的最大行数
+        top_k: 每列记录的常见取值个数
+        time_budget_ms: 每个表的时间预算（毫秒）
+        max_workers: 并发画像的表数，默认为连接池最大连接数
+
+    Returns:
+        画像字典
+    """
+    profiler = ColumnProfiler(db_connector, sample_rows, top_k, time_budget_ms, max_workers)
+    profiles = profiler.profile_tables(metadata, profiler.load_profiles(output_path))
+    profiler.save_profiles(profiles, output_path)
+    attach_profiles(metadata, profiles)
+    return profiles
+
+
+def attach_profiles(metadata: Dict[str, Any], profiles: Dict[str, Dict[str, Any]]):
+    """
+    把画像写入metadata每个表的 profile 字段（不在metadata中的表忽略）
+
+    Args:
+        metadata: 元数据字典
+        profiles: 画像字典
+    """
+    for table_name, profile in profiles.items():
+        if table_name in metadata:
+            metadata[table_name]['profile'] = profile
@@ -0,0 +1,291 @@
+"""
+LLM限流调度模块
+按API地址和模型分别跟踪并发上限，使用AIMD（加性增/乘性减）自适应调整，
+并支持Retry-After退让和每分钟Token预算
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveRateLimiter:
+    """自适应限流器类"""
+
+    def __init__(
+        self,
+        initial_concurrency: int = 3,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        tokens_per_minute: int = 0
+    ):
+        """
+        初始化限流器
+
+        Args:
+            initial_concurrency: 初始并发上限
+            min_concurrency: 并发上限的下限
+            max_concurrency: 并发上限的上限
+            tokens_per_minute: 每分钟Token预算，0表示不限制
+        """
+        self._cond = threading.Condition()
+        self._limit = float(initial_concurrency)
+        self.configure(min_concurrency, max_concurrency, tokens_per_minute)
+
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._token_window: deque = deque()  # (时间戳, token数)
+        self._window_tokens = 0
+
+        self.throttle_count = 0
+
+    def configure(self, min_concurrency: int = 1, max_concurrency: int = 16, tokens_per_minute: int = 0):
+        """
+        更新并发上下限和Token预算，当前并发上限收敛到新的范围内（自适应状态保留）
+
+        Args:
+            min_concurrency: 并发上限的下限
+            max_concurrency: 并发上限的上限
+            tokens_per_minute: 每分钟Token预算，0表示不限制
+        """
+        with self._cond:
+            self.min_concurrency = max(1, min_concurrency)
+            self.max_concurrency = max(self.min_concurrency, max_concurrency)
+            self.tokens_per_minute = tokens_per_minute or 0
+            self._limit = min(max(self._limit, float(self.min_concurrency)), float(self.max_concurrency))
+            self._cond.notify_all()
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+
+    def acquire(self, tokens: int = 0):
+        """
+        阻塞直到获得一个并发槽位和足够的Token预算
+
+        Args:
+            tokens: 本次请求预计消耗的Token数
+        """
+        with self._cond:
+            while True:
+                wait = self._try_acquire_locked(tokens)
+                if wait <= 0:
+                    return
+                self._cond.wait(timeout=wait)
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """
+        尝试立即获得槽位（不阻塞）
+
+        Args:
+            tokens: 本次请求预计消耗的Token数
+
+        Returns:
+            0表示已获得槽位，否则为建议的等待秒数
+        """
+        with self._cond:
+            return self._try_acquire_locked(tokens)
+
+    def release(self):
+        """释放一个并发槽位"""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, tokens: int = 0):
+        """
+        并发槽位上下文管理器
+
+        Args:
+            tokens: 本次请求预计消耗的Token数
+        """
+        self.acquire(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire_async(self, tokens: int = 0):
+        """
+        异步等待直到获得一个并发槽位和足够的Token预算（不阻塞事件循环）
+
+        Args:
+            tokens: 本次请求预计消耗的Token数
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            # 槽位释放没有异步通知，短间隔轮询
+            await asyncio.sleep(min(wait, 0.05))
+
+    @asynccontextmanager
+    async def slot_async(self, tokens: int = 0):
+        """
+        异步并发槽位上下文管理器
+
+        Args:
+            tokens: 本次请求预计消耗的Token数
+        """
+        await self.acquire_async(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self):
+        """请求成功：并发上限加性增长，每约一个窗口的成功请求增加1"""
+        with self._cond:
+            if self._limit < self.max_concurrency:
+                self._limit = min(self.max_concurrency, self._limit + 1.0 / self._limit)
+                self._cond.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """
+        请求被限流（429）或超时：并发上限乘性减半，并按Retry-After暂停发送
+
+        Args:
+            retry_after: 服务端要求的等待秒数
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.throttle_count += 1
+
+            # 同一波限流中多个并发请求会同时失败，短时间内只减半一次
+            if now - self._last_decrease >= 1.0:
+                old_limit = self.limit
+                self._limit = max(float(self.min_concurrency), self._limit / 2)
+                self._last_decrease = now
+                logger.warning(f"LLM请求被限流，并发上限 {old_limit} -> {self.limit}")
+
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                logger.warning(f"服务端要求等待 {retry_after:.1f} 秒后重试")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取限流器状态
+
+        Returns:
+            状态字典
+        """
+        with self._cond:
+            return {
+                "concurrency_limit": self.limit,
+                "in_flight": self._in_flight,
+                "throttle_count": self.throttle_count,
+                "tokens_last_minute": self._window_tokens
+            }
+
+    def _try_acquire_locked(self, tokens: int) -> float:
+        """尝试获得槽位（调用方需持有锁）"""
+        now = time.monotonic()
+
+        if now < self._blocked_until:
+            return self._blocked_until - now
+
+        if self._in_flight >= self.limit:
+            return 1.0  # 槽位释放时会被notify唤醒
+
+        if self.tokens_per_minute:
+            while self._token_window and self._token_window[0][0] <= now - 60:
+                self._window_tokens -= self._token_window.popleft()[1]
+            # 单个请求超过整分钟预算时，只要窗口为空就放行，避免永远等待
+            if self._token_window and self._window_tokens + tokens > self.tokens_per_minute:
+                return max(0.05, self._token_window[0][0] + 60 - now)
+            self._token_window.append((now, tokens))
+            self._window_tokens += tokens
+
+        self._in_flight += 1
+        return 0.0
+
+
+# 限流器注册表：同一API地址和模型的所有客户端共享一个限流器
+_limiters: Dict[Tuple[str, str], AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_base: str, model_name: str, **settings) -> AdaptiveRateLimiter:
+    """
+    获取（或创建）指定API地址和模型的限流器
+
+    限流器已存在时用本次的参数更新其并发上下限和Token预算（以最近一次配置为准），
+    initial_concurrency只在首次创建时生效，之后的并发上限由自适应调整决定。
+
+    Args:
+        api_base: API基础地址
+        model_name: 模型名称
+        **settings: AdaptiveRateLimiter的参数
+
+    Returns:
+        AdaptiveRateLimiter实例
+    """
+    key = ((api_base or '').rstrip('/'), model_name or '')
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveRateLimiter(**settings)
+        else:
+            settings.pop('initial_concurrency', None)
+            limiter.configure(**settings)
+        return limiter
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """
+    解析响应头中的Retry-After
+
+    Args:
+        headers: 响应头（支持get方法的映射）
+
+    Returns:
+        等待秒数，无法解析时返回None
+    """
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    # HTTP日期格式
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的Token数：非ASCII字符（如中文）约1个Token，ASCII约4个字符1个Token
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的Token数
+    """
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii) // 4
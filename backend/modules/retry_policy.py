@@ -0,0 +1,146 @@
+"""
+LLM重试策略模块
+区分可重试与不可重试错误，使用全抖动（full jitter）指数退避，
+并通过一次流水线运行内共享的重试预算避免服务降级时的重试风暴
+"""
+
+import json
+import random
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+logger = logging.getLogger(__name__)
+
+# 可重试的HTTP状态码：请求超时、冲突、限流；5xx另行判断
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class RetryBudget:
+    """重试预算类 - 一次运行内所有LLM调用共享的重试次数上限"""
+
+    def __init__(self, max_retries: int = 50):
+        """
+        初始化重试预算
+
+        Args:
+            max_retries: 本次运行允许的重试总次数，0表示不限制
+        """
+        self.max_retries = max_retries
+        self.spent = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def try_spend(self) -> bool:
+        """
+        尝试消耗一次重试额度
+
+        Returns:
+            是否还有额度
+        """
+        with self._lock:
+            if self.max_retries and self.spent >= self.max_retries:
+                self.denied += 1
+                return False
+            self.spent += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取预算使用情况
+
+        Returns:
+            统计字典
+        """
+        with self._lock:
+            return {
+                "max_retries": self.max_retries,
+                "spent": self.spent,
+                "denied": self.denied
+            }
+
+
+class RetryPolicy:
+    """重试策略类"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        budget: Optional[RetryBudget] = None
+    ):
+        """
+        初始化重试策略
+
+        Args:
+            max_attempts: 单次调用的最大尝试次数（含首次）
+            base_delay: 退避基准秒数
+            max_delay: 单次退避的最大秒数
+            budget: 共享的重试预算，None表示不限制
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def is_retryable(self, error: Exception) -> bool:
+        """
+        判断错误是否值得重试
+
+        认证、权限、参数等4xx错误重试也不会成功；429、5xx、超时、连接错误和JSON解析失败可以重试。
+        未知异常按可重试处理。
+
+        Args:
+            error: 异常
+
+        Returns:
+            是否可重试
+        """
+        if isinstance(error, (APITimeoutError, APIConnectionError, json.JSONDecodeError)):
+            return True
+        if isinstance(error, APIStatusError):
+            status = error.status_code
+            return status in RETRYABLE_STATUS_CODES or status >= 500
+        return True
+
+    def backoff(self, attempt: int, min_wait: float = 0) -> float:
+        """
+        计算全抖动退避时间：在 [0, min(max_delay, base_delay * 2^attempt)] 内均匀随机
+
+        Args:
+            attempt: 当前尝试序号（从0开始）
+            min_wait: 服务端要求的最少等待秒数（Retry-After）
+
+        Returns:
+            等待秒数
+        """
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return max(random.uniform(0, cap), min_wait)
+
+    def next_wait(self, error: Exception, attempt: int, min_wait: float = 0) -> Optional[float]:
+        """
+        决定是否重试以及等待多久
+
+        Args:
+            error: 本次尝试的异常
+            attempt: 当前尝试序号（从0开始）
+            min_wait: 服务端要求的最少等待秒数
+
+        Returns:
+            等待秒数，不应重试时返回None
+        """
+        if not self.is_retryable(error):
+            logger.error(f"不可重试的错误: {type(error).__name__}")
+            return None
+
+        if attempt >= self.max_attempts - 1:
+            return None
+
+        if self.budget is not None and not self.budget.try_spend():
+            logger.error("本次运行的重试预算已用尽，不再重试")
+            return None
+
+        return self.backoff(attempt, min_wait)
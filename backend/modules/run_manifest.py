@@ -0,0 +1,367 @@
+"""
+运行清单模块
+记录每次运行各阶段的输入哈希、输出产物和完成状态，并按批次保存生成检查点，支持中断后续跑
+"""
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable, Awaitable
+
+try:
+    from .jsonl_io import JsonlWriter
+except ImportError:
+    from jsonl_io import JsonlWriter
+
+logger = logging.getLogger(__name__)
+
+# 清单文件名和生成检查点文件名（位于运行目录下）
+MANIFEST_FILE = 'manifest.json'
+CHECKPOINT_FILE = 'generation_checkpoint.jsonl'
+
+
+def hash_inputs(inputs: Any) -> str:
+    """
+    计算阶段输入的哈希（JSON规范化后求sha256）
+
+    Args:
+        inputs: 可JSON序列化的输入描述
+
+    Returns:
+        十六进制哈希
+    """
+    payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """
+    计算文件内容的sha256
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        十六进制哈希
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_json(path: str) -> Any:
+    """读取JSON产物"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class RunManifest:
+    """
+    运行清单类
+
+    运行目录 {runs_dir}/{run_id}/ 下保存 manifest.json、各阶段产物的快照和生成检查点。
+    阶段完成时把产物复制到快照目录，续跑时从快照恢复，即使数据目录被清理或被其他运行覆盖也不受影响。
+    """
+
+    def __init__(self, runs_dir: str, run_id: Optional[str] = None):
+        """
+        打开运行清单，run_id为空时新建一次运行
+
+        Args:
+            runs_dir: 所有运行目录的父目录
+            run_id: 要续跑的运行ID
+        """
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.run_dir = os.path.join(runs_dir, self.run_id)
+        self.manifest_path = os.path.join(self.run_dir, MANIFEST_FILE)
+        self._lock = threading.Lock()
+
+        if run_id is not None:
+            if not os.path.exists(self.manifest_path):
+                raise FileNotFoundError(f"运行 {run_id} 不存在: {self.manifest_path}")
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+            logger.info(f"续跑运行 {self.run_id}，已完成阶段: {', '.join(self.completed_stages()) or '无'}")
+        else:
+            os.makedirs(self.run_dir, exist_ok=True)
+            self.data = {"run_id": self.run_id, "created_at": datetime.now().isoformat(), "stages": {}}
+            self._save()
+            logger.info(f"新建运行 {self.run_id}（续跑: --resume {self.run_id}）")
+
+    @property
+    def checkpoint_path(self) -> str:
+        """生成检查点文件路径"""
+        return os.path.join(self.run_dir, CHECKPOINT_FILE)
+
+    def open_checkpoint(self, stage: str, inputs: Any) -> 'ChunkCheckpoint':
+        """
+        打开阶段的生成检查点，阶段输入与上次记录的不同时先清空旧检查点
+
+        Args:
+            stage: 阶段名
+            inputs: 阶段输入描述（与run_stage的inputs相同）
+
+        Returns:
+            生成检查点
+        """
+        info = self.data['stages'].get(stage)
+        if info and info.get('inputs_hash') != hash_inputs(inputs) and os.path.exists(self.checkpoint_path):
+            logger.info(f"阶段 {stage} 的输入已变化，丢弃旧的生成检查点")
+            os.remove(self.checkpoint_path)
+        return ChunkCheckpoint(self.checkpoint_path)
+
+    def completed_stages(self) -> List[str]:
+        """已完成的阶段列表"""
+        return [name for name, stage in self.data['stages'].items() if stage.get('status') == 'completed']
+
+    def output_hash(self, stage: str) -> Optional[str]:
+        """
+        阶段产物的整体哈希，作为下游阶段的输入
+
+        Args:
+            stage: 阶段名
+
+        Returns:
+            产物哈希，阶段未完成时为None
+        """
+        info = self.data['stages'].get(stage)
+        if not info or info.get('status') != 'completed':
+            return None
+        return hash_inputs(info['outputs'])
+
+    def restore(self, stage: str, inputs_hash: str) -> bool:
+        """
+        阶段已用相同输入完成时，从快照恢复其产物
+
+        Args:
+            stage: 阶段名
+            inputs_hash: 本次的输入哈希
+
+        Returns:
+            是否已恢复（True表示可跳过该阶段）
+        """
+        info = self.data['stages'].get(stage)
+        if not info or info.get('status') != 'completed' or info.get('inputs_hash') != inputs_hash:
+            return False
+
+        for path, output in info['outputs'].items():
+            snapshot = os.path.join(self.run_dir, output['snapshot'])
+            if not os.path.exists(snapshot) or hash_file(snapshot) != output['sha256']:
+                logger.warning(f"阶段 {stage} 的产物快照缺失或已损坏，重新执行")
+                return False
+            if not os.path.exists(path) or hash_file(path) != output['sha256']:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                shutil.copyfile(snapshot, path)
+        return True
+
+    def start(self, stage: str, inputs_hash: str):
+        """记录阶段开始"""
+        with self._lock:
+            self.data['stages'][stage] = {
+                "status": "running",
+                "inputs_hash": inputs_hash,
+                "started_at": datetime.now().isoformat()
+            }
+            self._save()
+
+    def complete(self, stage: str, outputs: List[str]):
+        """
+        记录阶段完成并保存产物快照
+
+        Args:
+            stage: 阶段名
+            outputs: 产物文件路径列表（不存在的文件忽略）
+        """
+        snapshot_dir = os.path.join(self.run_dir, 'artifacts', stage)
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+        recorded = {}
+        for path in outputs:
+            if not os.path.exists(path):
+                continue
+            snapshot = os.path.join('artifacts', stage, os.path.basename(path))
+            shutil.copyfile(path, os.path.join(self.run_dir, snapshot))
+            recorded[path] = {"sha256": hash_file(path), "snapshot": snapshot}
+
+        with self._lock:
+            info = self.data['stages'].setdefault(stage, {})
+            info.update({"status": "completed", "outputs": recorded, "completed_at": datetime.now().isoformat()})
+            self._save()
+
+    def partial(self, stage: str):
+        """记录阶段结果不完整（下游照常执行，续跑时该阶段重新执行）"""
+        logger.warning(f"阶段 {stage} 结果不完整，续跑时将重新执行")
+        with self._lock:
+            info = self.data['stages'].setdefault(stage, {})
+            info.update({"status": "partial", "finished_at": datetime.now().isoformat()})
+            self._save()
+
+    def fail(self, stage: str, error: str):
+        """记录阶段失败"""
+        with self._lock:
+            info = self.data['stages'].setdefault(stage, {})
+            info.update({"status": "failed", "error": error[:500], "failed_at": datetime.now().isoformat()})
+            self._save()
+
+    def run_stage(
+        self,
+        stage: str,
+        inputs: Any,
+        outputs: List[str],
+        run: Callable[[], Any],
+        load: Callable[[], Any],
+        is_complete: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        执行一个阶段：输入未变且已完成时恢复产物并用load读取结果，否则执行run并记录
+
+        Args:
+            stage: 阶段名
+            inputs: 阶段输入描述（配置参数、上游阶段的output_hash等）
+            outputs: 阶段产物文件路径列表
+            run: 执行阶段的函数
+            load: 从产物读取结果的函数
+            is_complete: 判断结果是否完整，不完整时记为partial，续跑时重新执行（如生成样本不足）
+
+        Returns:
+            阶段结果
+        """
+        inputs_hash = hash_inputs(inputs)
+        if self.restore(stage, inputs_hash):
+            logger.info(f"阶段 {stage} 已完成，从运行 {self.run_id} 的快照恢复")
+            return load()
+
+        self.start(stage, inputs_hash)
+        try:
+            result = run()
+        except Exception as e:
+            self.fail(stage, str(e))
+            raise
+        if is_complete is not None and not is_complete(result):
+            self.partial(stage)
+        else:
+            self.complete(stage, outputs)
+        return result
+
+    async def arun_stage(
+        self,
+        stage: str,
+        inputs: Any,
+        outputs: List[str],
+        run: Callable[[], Awaitable[Any]],
+        load: Callable[[], Any],
+        is_complete: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        异步执行一个阶段，参数同run_stage（run返回可等待对象）
+
+        Returns:
+            阶段结果
+        """
+        inputs_hash = hash_inputs(inputs)
+        if self.restore(stage, inputs_hash):
+            logger.info(f"阶段 {stage} 已完成，从运行 {self.run_id} 的快照恢复")
+            return load()
+
+        self.start(stage, inputs_hash)
+        try:
+            result = await run()
+        except Exception as e:
+            self.fail(stage, str(e))
+            raise
+        if is_complete is not None and not is_complete(result):
+            self.partial(stage)
+        else:
+            self.complete(stage, outputs)
+        return result
+
+    def _save(self):
+        """原子写入清单文件"""
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+class ChunkCheckpoint:
+    """
+    生成检查点类 - 每个生成批次完成后追加一行并落盘，续跑时已完成的批次直接复用
+
+    批次键由主题序号、主题名、表集合、轮次和批次号组成，规划变化时自然失效。
+    内存中只保留批次键到文件行偏移的索引，样本在get时从文件读回，内存占用与样本总数无关。
+    """
+
+    def __init__(self, path: str):
+        """
+        打开检查点文件（已有内容只建立索引）
+
+        Args:
+            path: 检查点文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, int] = {}
+
+        if os.path.exists(path):
+            self._build_index()
+            if self._offsets:
+                logger.info(f"读取生成检查点: {len(self._offsets)} 个已完成批次")
+
+    def _build_index(self):
+        """逐行扫描检查点文件，记录每个批次键最后一次出现的行偏移"""
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的最后一行
+                        logger.warning(f"{self.path} 第 {line_no} 行无法解析，已跳过")
+                        record = None
+                    if isinstance(record, dict) and 'key' in record and 'samples' in record:
+                        self._offsets[record['key']] = offset
+                offset += len(line)
+
+    def get(self, key: str) -> Optional[List[Dict[str, str]]]:
+        """
+        获取已完成批次的样本（从检查点文件读回）
+
+        Args:
+            key: 批次键
+
+        Returns:
+            样本列表，未完成时为None
+        """
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                return None
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.readline())['samples']
+
+    def put(self, key: str, samples: List[Dict[str, str]]):
+        """
+        记录一个完成的批次并立即落盘
+
+        Args:
+            key: 批次键
+            samples: 样本列表
+        """
+        record = {"key": key, "samples": samples}
+        line_size = len((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        with self._lock:
+            with JsonlWriter(self.path, append=True, fsync_every=1) as writer:
+                writer.write(record)
+            # 追加的行位于文件末尾（前面可能补了一个换行），由文件大小倒推行首偏移
+            self._offsets[key] = os.path.getsize(self.path) - line_size
+
+    def __len__(self) -> int:
+        return len(self._offsets)
@@ -0,0 +1,169 @@
+"""
+外键图模块
+基于表卡片中的外键关系构建表关联图，并划分为规模有上限的表社区，供主题规划使用
+"""
+import logging
+from collections import Counter, deque
+from typing import Dict, List, Any, Set
+
+logger = logging.getLogger(__name__)
+
+# 标签传播的最大迭代轮数
+MAX_PROPAGATION_ROUNDS = 20
+
+
+def resolve_reference(ref: str, table_keys: Set[str]) -> str:
+    """
+    将外键引用（ref_table.ref_column 或 ref_schema.ref_table.ref_column）解析为表键
+
+    Args:
+        ref: 外键引用
+        table_keys: 所有表键
+
+    Returns:
+        被引用的表键，不在table_keys中时返回空字符串
+    """
+    table = ref.rsplit('.', 1)[0]
+    return table if table in table_keys else ""
+
+
+def build_fk_graph(table_cards: Dict[str, Dict[str, Any]]) -> Dict[str, Set[str]]:
+    """
+    构建无向外键图（自引用忽略，引用不存在的表忽略）
+
+    Args:
+        table_cards: 表卡片字典
+
+    Returns:
+        表键 -> 相邻表键集合，包含所有表（孤立表的邻居为空集合）
+    """
+    graph: Dict[str, Set[str]] = {table_name: set() for table_name in table_cards}
+    for table_name, card in table_cards.items():
+        for ref in (card.get('foreign_keys') or {}).values():
+            ref_table = resolve_reference(ref, graph.keys())
+            if ref_table and ref_table != table_name:
+                graph[table_name].add(ref_table)
+                graph[ref_table].add(table_name)
+    return graph
+
+
+def label_propagation(graph: Dict[str, Set[str]]) -> List[List[str]]:
+    """
+    标签传播社区划分（确定性：按表名顺序更新，平票时取最小标签）
+
+    Args:
+        graph: 外键图
+
+    Returns:
+        社区列表，每个社区为排序后的表键列表，按社区内最小表键排序
+    """
+    labels = {node: node for node in graph}
+    nodes = sorted(graph)
+
+    for _ in range(MAX_PROPAGATION_ROUNDS):
+        changed = False
+        for node in nodes:
+            if not graph[node]:
+                continue
+            counts = Counter(labels[neighbor] for neighbor in graph[node])
+            best = max(counts.values())
+            label = min(candidate for candidate, count in counts.items() if count == best)
+            if label != labels[node]:
+                labels[node] = label
+                changed = True
+        if not changed:
+            break
+
+    communities: Dict[str, List[str]] = {}
+    for node in nodes:
+        communities.setdefault(labels[node], []).append(node)
+    return sorted(communities.values(), key=lambda members: members[0])
+
+
+def partition_tables(
+    table_cards: Dict[str, Dict[str, Any]],
+    max_size: int,
+    min_size: int = 1
+) -> List[List[str]]:
+    """
+    将表划分为规模在 [min_size, max_size] 之间的社区
+
+    先做标签传播，超过max_size的社区沿外键广度优先切分，
+    不足min_size的社区（如孤立表）按顺序合并，使每个社区都能独立规划主题。
+
+    Args:
+        table_cards: 表卡片字典
+        max_size: 每个社区的最大表数
+        min_size: 每个社区的最小表数（通常为每个主题的最小表数）
+
+    Returns:
+        社区列表
+    """
+    max_size = max(1, max_size)
+    min_size = max(1, min(min_size, max_size))
+    graph = build_fk_graph(table_cards)
+
+    bounded = []
+    for members in label_propagation(graph):
+        if len(members) <= max_size:
+            bounded.append(members)
+        else:
+            bounded.extend(_split_community(graph, members, max_size))
+
+    # 小社区合并：按顺序装箱，装满max_size即换下一个
+    communities, small = [], []
+    for members in bounded:
+        if len(members) >= min_size:
+            communities.append(members)
+            continue
+        if len(small) + len(members) > max_size:
+            communities.append(small)
+            small = []
+        small.extend(members)
+    if small:
+        if len(small) >= min_size or not communities:
+            communities.append(small)
+        else:
+            # 剩余表数不足一个社区时并入最小的社区（可能略超max_size）
+            min(communities, key=len).extend(small)
+
+    logger.info(
+        f"外键图划分: {len(table_cards)} 个表, {len(communities)} 个社区, "
+        f"最大 {max(len(c) for c in communities) if communities else 0} 个表"
+    )
+    return communities
+
+
+def _split_community(graph: Dict[str, Set[str]], members: List[str], max_size: int) -> List[List[str]]:
+    """
+    沿外键广度优先遍历，把过大的社区切成不超过max_size的连通片段
+
+    Args:
+        graph: 外键图
+        members: 社区成员
+        max_size: 片段最大表数
+
+    Returns:
+        片段列表
+    """
+    member_set = set(members)
+    visited: Set[str] = set()
+    parts, current = [], []
+    for start in members:
+        if start in visited:
+            continue
+        queue = deque([start])
+        visited.add(start)
+        while queue:
+            node = queue.popleft()
+            current.append(node)
+            if len(current) >= max_size:
+                parts.append(current)
+                current = []
+            for neighbor in sorted(graph[node] & member_set):
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    queue.append(neighbor)
+    if current:
+        parts.append(current)
+    return parts
@@ -0,0 +1,230 @@
+"""
+SQL特征模块
+基于sqlglot语法树识别SQL特征（JOIN、GROUP BY、子查询、聚合等），并按主题跟踪特征覆盖情况，
+为下一批生成提示词给出需要补足的特征
+"""
+import math
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from sqlglot import parse_one, exp
+
+logger = logging.getLogger(__name__)
+
+# 特征名 -> 提示词和统计中使用的说明
+SQL_FEATURES = {
+    'with_join': 'JOIN多表关联',
+    'with_group_by': 'GROUP BY分组',
+    'with_having': 'HAVING分组过滤',
+    'with_order_by': 'ORDER BY排序',
+    'with_limit': 'LIMIT限制行数',
+    'with_subquery': '子查询',
+    'with_aggregate': '聚合函数（COUNT/SUM/AVG/MAX/MIN等）',
+    'with_window': '窗口函数',
+    'with_cte': 'WITH公用表表达式',
+    'with_case': 'CASE WHEN条件表达式',
+}
+
+# 简单查询：不含以下任何特征
+SIMPLE_FEATURE = 'simple'
+_COMPLEX_FEATURES = ('with_join', 'with_group_by', 'with_subquery', 'with_aggregate', 'with_window', 'with_cte')
+
+# 默认目标分布：普通特征为最低占比，simple为最高占比
+DEFAULT_FEATURE_TARGETS = {
+    'with_join': 0.4,
+    'with_group_by': 0.3,
+    'with_aggregate': 0.4,
+    'with_subquery': 0.15,
+    'with_order_by': 0.3,
+    SIMPLE_FEATURE: 0.2,
+}
+
+_QUERY_ROOTS = (exp.Select, exp.Union, exp.Except, exp.Intersect, exp.Subquery)
+
+
+@lru_cache(maxsize=4096)
+def parse_sql(sql: str, dialect: str = "mysql") -> Optional[exp.Expression]:
+    """
+    解析SQL（带缓存，去重和特征识别共用同一次解析）
+
+    返回的语法树被多处共享，调用方不能修改。
+
+    Args:
+        sql: SQL语句
+        dialect: SQL方言
+
+    Returns:
+        语法树，无法解析时返回None
+    """
+    try:
+        return parse_one(sql, read=dialect)
+    except Exception:
+        return None
+
+
+def extract_features(sql: str, dialect: str = "mysql") -> Tuple[str, Set[str]]:
+    """
+    从语法树识别SQL类型和特征
+
+    Args:
+        sql: SQL语句
+        dialect: SQL方言
+
+    Returns:
+        (SQL类型 SELECT/INSERT/UPDATE/DELETE/OTHER, 特征集合)，无法解析时为 ('OTHER', 空集合)
+    """
+    tree = parse_sql(sql, dialect)
+    if tree is None:
+        return 'OTHER', set()
+
+    if isinstance(tree, _QUERY_ROOTS):
+        sql_type = 'SELECT'
+    elif isinstance(tree, exp.Insert):
+        sql_type = 'INSERT'
+    elif isinstance(tree, exp.Update):
+        sql_type = 'UPDATE'
+    elif isinstance(tree, exp.Delete):
+        sql_type = 'DELETE'
+    else:
+        sql_type = 'OTHER'
+
+    features = set()
+    for node in tree.walk():
+        if isinstance(node, exp.Join):
+            features.add('with_join')
+        elif isinstance(node, exp.Group):
+            features.add('with_group_by')
+        elif isinstance(node, exp.Having):
+            features.add('with_having')
+        elif isinstance(node, exp.Order):
+            # 窗口函数内的ORDER BY不算排序
+            if not isinstance(node.parent, exp.Window):
+                features.add('with_order_by')
+        elif isinstance(node, (exp.Limit, exp.Fetch)):
+            features.add('with_limit')
+        elif isinstance(node, exp.Window):
+            features.add('with_window')
+        elif isinstance(node, exp.CTE):
+            features.add('with_cte')
+        elif isinstance(node, exp.Case):
+            features.add('with_case')
+        elif isinstance(node, exp.AggFunc):
+            # 窗口中的聚合算作窗口函数
+            if not isinstance(node.parent, exp.Window):
+                features.add('with_aggregate')
+        elif isinstance(node, exp.Select) and node is not tree:
+            # 嵌套在另一个SELECT中的SELECT是子查询；CTE定义和UNION分支不算
+            if isinstance(node.find_ancestor(exp.Select, exp.CTE), exp.Select):
+                features.add('with_subquery')
+
+    if not features.intersection(_COMPLEX_FEATURES):
+        features.add(SIMPLE_FEATURE)
+    return sql_type, features
+
+
+class FeatureCoverage:
+    """
+    主题特征覆盖跟踪类
+
+    记录一个主题已生成样本的特征计数，规划每轮批次时按目标分布为各批次分配需要补足的特征，
+    生成提示词据此引导LLM，而不是事后统计。多线程调用安全。
+    """
+
+    def __init__(self, target_count: int, targets: Dict[str, float]):
+        """
+        初始化覆盖跟踪
+
+        Args:
+            target_count: 主题目标样本数
+            targets: 特征 -> 目标占比；simple 为简单查询的最高占比，其他为最低占比
+        """
+        self.target_count = target_count
+        self.targets = {name: ratio for name, ratio in targets.items()
+                        if name in SQL_FEATURES or name == SIMPLE_FEATURE}
+        self.total = 0
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, features: Set[str]):
+        """
+        记录一条已接受样本的特征
+
+        Args:
+            features: 特征集合
+        """
+        with self._lock:
+            self.total += 1
+            for name in features:
+                self.counts[name] = self.counts.get(name, 0) + 1
+
+    def steering_hint(self, chunk_count: int) -> str:
+        """
+        生成下一批的特征要求（只有一个批次时的steering_hints）
+
+        Args:
+            chunk_count: 本批生成数量
+
+        Returns:
+            提示词片段，没有需要补足的特征时为空字符串
+        """
+        return self.steering_hints([chunk_count])[0]
+
+    def steering_hints(self, chunk_counts: List[int]) -> List[str]:
+        """
+        在规划一轮批次时，按当前覆盖情况为每个批次分配特征要求
+
+        批次依次分摊：每个未达标特征按「剩余缺口 × 本批数量 / 剩余待生成数量」分给本批，
+        简单查询的剩余额度同样依次分摊。分配只依赖规划时的计数，与批次并发完成的先后无关，
+        相同的覆盖情况总是得到相同的提示词（LLM缓存键随之确定）。
+
+        Args:
+            chunk_counts: 本轮各批次的生成数量（按批次顺序）
+
+        Returns:
+            与chunk_counts一一对应的提示词片段，没有需要补足的特征时为空字符串
+        """
+        with self._lock:
+            remaining = max(self.target_count - self.total, sum(chunk_counts), 1)
+            needed = {
+                name: math.ceil(ratio * self.target_count) - self.counts.get(name, 0)
+                for name, ratio in self.targets.items() if name != SIMPLE_FEATURE
+            }
+            allowed = None
+            if SIMPLE_FEATURE in self.targets:
+                allowed = math.floor(self.targets[SIMPLE_FEATURE] * self.target_count) - self.counts.get(SIMPLE_FEATURE, 0)
+
+        hints = []
+        for chunk_count in chunk_counts:
+            requirements = []
+            for name, gap in needed.items():
+                if gap > 0:
+                    ask = min(chunk_count, math.ceil(gap * chunk_count / remaining))
+                    needed[name] = gap - ask
+                    requirements.append(f"至少 {ask} 条使用{SQL_FEATURES[name]}")
+
+            if allowed is not None:
+                if allowed <= 0:
+                    requirements.append("不要再生成简单查询（单表、无聚合、无子查询）")
+                else:
+                    share = math.floor(allowed * chunk_count / remaining)
+                    allowed -= share
+                    requirements.append(f"简单查询（单表、无聚合、无子查询）最多 {share} 条")
+
+            remaining = max(remaining - chunk_count, 1)
+            hints.append(
+                "本批SQL特征要求（根据该主题已生成样本的覆盖情况调整，一条SQL可同时满足多项）：" + "；".join(requirements)
+                if requirements else ""
+            )
+        return hints
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        覆盖情况摘要
+
+        Returns:
+            {"total": 样本数, "counts": 特征计数}
+        """
+        with self._lock:
+            return {"total": self.total, "counts": dict(self.counts)}
@@ -6,6 +6,13 @@ from pathlib import Path
 import json
 import logging
 from typing import Dict, List, Any,Optional
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from .profiler import format_profile_hint
+except ImportError:
+    from profiler import format_profile_hint
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +39,10 @@ class TableCardsGenerator:
                 "table_name": {
                     "summary": "表描述",
                     "columns": [{"name": "...", "type": "...", "desc": "..."}],
-                    "foreign_keys": {"column": "ref_table.ref_column"}
+                    "foreign_keys": {"column": "ref_table.ref_column"},
+                    "schema": "...",  # 仅多schema提取时
+                    "table": "...",   # 仅多schema提取时
+                    "row_estimate": 0 # 仅启用列画像时
                 }
             }
         """
@@ -45,7 +55,9 @@ class TableCardsGenerator:
             summary = self._generate_table_summary(table_name, table_info)
             
             # 简化列信息
-            columns = self._simplify_columns(table_info['columns'], table_info['primary_keys'])
+            columns = self._simplify_columns(
+                table_info['columns'], table_info['primary_keys'], table_info.get('profile')
+            )
             
             # 获取外键信息
             foreign_keys = table_info.get('foreign_keys', {})
@@ -55,6 +67,16 @@ class TableCardsGenerator:
                 "columns": columns,
                 "foreign_keys": foreign_keys
             }
+            
+            # 多schema提取时表键为 schema.table，卡片同时记录所属schema和表名
+            if table_info.get('schema'):
+                table_cards[table_name]['schema'] = table_info['schema']
+                table_cards[table_name]['table'] = table_info['table']
+            
+            # 有列画像时记录估算行数，供图规划按表规模分配样本
+            row_estimate = (table_info.get('profile') or {}).get('row_estimate')
+            if row_estimate is not None:
+                table_cards[table_name]['row_estimate'] = row_estimate
         
         logger.info(f"成功生成 {len(table_cards)} 个表卡片")
         return table_cards
@@ -88,15 +110,26 @@ class TableCardsGenerator:
         if has_fk:
             summary_parts.append("，有外键关联")
         
+        # 有列画像时附上估算行数
+        row_estimate = (table_info.get('profile') or {}).get('row_estimate')
+        if row_estimate:
+            summary_parts.append(f"，约{row_estimate}行")
+        
         return "".join(summary_parts) + "。"
     
-    def _simplify_columns(self, columns: List[Dict[str, Any]], primary_keys: List[str]) -> List[Dict[str, str]]:
+    def _simplify_columns(
+        self,
+        columns: List[Dict[str, Any]],
+        primary_keys: List[str],
+        profile: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, str]]:
         """
         简化列信息
         
         Args:
             columns: 原始列信息列表
             primary_keys: 主键列表
+            profile: 表的列画像（可选），用于附上常见取值和取值范围
             
         Returns:
             简化后的列信息列表
@@ -119,6 +152,11 @@ class TableCardsGenerator:
             if not col['nullable'] and col_name not in primary_keys:
                 desc_parts.append("必填")
             
+            if profile:
+                hint = format_profile_hint(profile['columns'].get(col_name))
+                if hint:
+                    desc_parts.append(hint)
+            
             desc = "，".join(desc_parts) if desc_parts else col_type
             
             simplified.append({
@@ -181,7 +219,11 @@ class TableCardsGenerator:
                 lines.append("外键关系:")
                 for col, ref in card['foreign_keys'].items():
                     lines.append(f"  - {col} -> {ref}")
-            document={'db_name':self.db_name,'table_name':table_name,'document':"\n".join(lines)}
+            document={
+                'db_name':card.get('schema', self.db_name),
+                'table_name':card.get('table', table_name),
+                'document':"\n".join(lines)
+            }
             documents_list.append(document)
         return documents_list
     
@@ -3,15 +3,156 @@ SQL校验器模块
 使用sqlglot进行语法检查，并验证表名和字段的有效性
 """
 
-import json
+import os
+import re
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, List, Any, Optional, Tuple, Callable, Set, Iterable, Iterator
 import sqlglot
 from sqlglot import parse_one, exp
 from .db_connector import DatabaseConnector
+from .execution_checker import ExecutionChecker
+from .jsonl_io import JsonlWriter
 
 logger = logging.getLogger(__name__)
 
+# 可以做执行验证的查询类节点
+QUERY_EXPRESSIONS = (exp.Select, exp.Union, exp.Except, exp.Intersect, exp.Subquery)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 多进程验证时每个任务包含的SQL条数
+VALIDATION_CHUNK_SIZE = 500
+
+# 批量执行验证时每批的SQL条数（每批结束报告一次进度）
+EXECUTION_BATCH_SIZE = 200
+
+# 流式验证时每个窗口读入的样本数（批量校验按窗口进行，内存占用与样本总数无关）
+VALIDATION_WINDOW_SIZE = 10000
+
+# 语法树缓存的最大条目数：语法树占用较大，只保留最近使用的部分，淘汰后需要时重新解析
+MAX_PARSED_CACHE_SIZE = 2048
+
+# 校验结果和执行计划缓存的最大条目数，需不小于一个验证窗口，窗口内批量校验的结果逐条读取前不会被淘汰
+MAX_RESULT_CACHE_SIZE = 4 * VALIDATION_WINDOW_SIZE
+
+# 工作进程内的校验器，由进程池initializer创建，整个进程生命周期内复用
+_worker_validator: Optional['SQLValidator'] = None
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化SQL文本用作缓存键：合并空白、去掉末尾分号
+
+    Args:
+        sql: SQL语句
+
+    Returns:
+        规范化后的SQL
+    """
+    return _WHITESPACE_RE.sub(' ', sql).strip().rstrip(';').rstrip()
+
+
+class _LRUCache:
+    """按最近使用淘汰的有界字典（线程安全）"""
+
+    def __init__(self, max_size: int):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最大条目数
+        """
+        self.max_size = max(1, max_size)
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """读取条目并标记为最近使用，不存在时返回default"""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __contains__(self, key: Any) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __setitem__(self, key: Any, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def update(self, items: Dict[Any, Any]):
+        """批量写入条目"""
+        for key, value in items.items():
+            self[key] = value
+
+
+class ParsedSQL:
+    """解析后的SQL - 一条SQL只解析一次，语法、Schema、执行等检查共享同一棵语法树"""
+
+    def __init__(self, sql: str, dialect: str):
+        """
+        解析SQL
+
+        Args:
+            sql: SQL语句
+            dialect: SQL方言
+        """
+        self.sql = sql
+        self.dialect = dialect
+        self.ast: Optional[exp.Expression] = None
+        self.error = ""
+
+        try:
+            self.ast = parse_one(sql, read=dialect)
+            if self.ast is None:
+                self.error = "无法解析SQL语句"
+        except Exception as e:
+            self.error = str(e)
+
+        self._tables: Optional[List[exp.Table]] = None
+        self._columns: Optional[List[exp.Column]] = None
+
+    @property
+    def ok(self) -> bool:
+        """是否解析成功"""
+        return self.ast is not None
+
+    @property
+    def tables(self) -> List[exp.Table]:
+        """SQL中引用的所有表节点"""
+        if self._tables is None:
+            self._tables = list(self.ast.find_all(exp.Table)) if self.ok else []
+        return self._tables
+
+    @property
+    def columns(self) -> List[exp.Column]:
+        """SQL中引用的所有列节点"""
+        if self._columns is None:
+            self._columns = list(self.ast.find_all(exp.Column)) if self.ok else []
+        return self._columns
+
+    @property
+    def is_query(self) -> bool:
+        """是否为查询语句（SELECT/UNION等）"""
+        return isinstance(self.ast, QUERY_EXPRESSIONS)
+
+    @property
+    def has_limit(self) -> bool:
+        """最外层是否已有LIMIT"""
+        return self.ok and self.ast.args.get('limit') is not None
+
 
 class SQLValidator:
     """SQL校验器类"""
@@ -20,7 +161,11 @@ class SQLValidator:
         self,
         metadata: Dict[str, Any],
         db_connector: Optional[DatabaseConnector] = None,
-        enable_execution_check: bool = False
+        enable_execution_check: bool = False,
+        execution_workers: int = 4,
+        execution_timeout_ms: int = 5000,
+        execution_check_mode: str = "execute",
+        max_plan_cost: float = 0
     ):
         """
         初始化SQL校验器
@@ -29,11 +174,33 @@ class SQLValidator:
             metadata: 元数据字典
             db_connector: 数据库连接器（可选，用于执行验证）
             enable_execution_check: 是否启用执行验证
+            execution_workers: 执行验证的只读连接数（并发数）
+            execution_timeout_ms: 执行验证的单条语句超时（毫秒）
+            execution_check_mode: execute 实际执行（加LIMIT 1），explain 只做EXPLAIN不读数据
+            max_plan_cost: explain模式下允许的最大预估代价，0表示不限制
         """
         self.metadata = metadata
         self.db_connector = db_connector
         self.enable_execution_check = enable_execution_check
         
+        # 执行验证使用独立的只读连接池，不占用共享连接
+        self._execution_checker: Optional[ExecutionChecker] = None
+        if enable_execution_check and db_connector:
+            self._execution_checker = ExecutionChecker(
+                db_connector, execution_workers, execution_timeout_ms, execution_check_mode, max_plan_cost
+            )
+        
+        # explain模式下每条SQL的预估代价：(规范化SQL, 方言) -> {"cost": ..., "rows": ...}
+        self._plans = _LRUCache(MAX_RESULT_CACHE_SIZE)
+        
+        # 按 (规范化SQL, 方言) 缓存解析结果和校验结果，重复SQL不会再次解析
+        # 流式生成时样本到达即校验，验证阶段可直接复用结果；两者都有上限，内存占用与样本总数无关
+        self._parsed = _LRUCache(MAX_PARSED_CACHE_SIZE)
+        self._results = _LRUCache(MAX_RESULT_CACHE_SIZE)
+        # 启用执行验证时，只做了静态检查的SQL记下 ((是否有效, 错误信息), 最外层是否有LIMIT)，
+        # 验证阶段跳过这些SQL的语法和Schema检查，只补做执行验证
+        self._static_results = _LRUCache(MAX_RESULT_CACHE_SIZE)
+        
         # 构建表和字段的快速查找索引
         self._build_schema_index()
         
@@ -45,76 +212,403 @@ class SQLValidator:
             # 存储表的所有列名（小写，用于不区分大小写的比较）
             columns = {col['name'].lower() for col in table_info['columns']}
             self.table_columns[table_name.lower()] = columns
+        
+        self._build_bare_table_index()
+    
+    def _build_bare_table_index(self):
+        """多schema时表键为 schema.table，建立 表名 -> 表键 的索引，SQL中未写schema的表按唯一匹配解析"""
+        keys_by_table: Dict[str, List[str]] = {}
+        for key in self.table_columns:
+            if '.' in key:
+                keys_by_table.setdefault(key.rsplit('.', 1)[1], []).append(key)
+        self._bare_tables = {name: keys[0] for name, keys in keys_by_table.items() if len(keys) == 1}
+    
+    def _resolve_table(self, name: str, schema: str = "") -> str:
+        """
+        将SQL中的表引用解析为Schema索引中的表键
+        
+        Args:
+            name: 表名（小写）
+            schema: SQL中写的schema/数据库名（小写），可为空
+            
+        Returns:
+            表键，无法解析时返回原始引用
+        """
+        if schema:
+            qualified = f"{schema}.{name}"
+            if qualified in self.table_columns:
+                return qualified
+            # 单库元数据的表键不带schema，沿用只比较表名的行为
+            return name if name in self.table_columns else qualified
+        if name in self.table_columns:
+            return name
+        return self._bare_tables.get(name, name)
     
     def validate_samples(
         self,
-        samples: List[Dict[str, str]],
-        dialect: str = "mysql"
+        samples: Iterable[Dict[str, str]],
+        dialect: str = "mysql",
+        workers: int = 1,
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> List[Dict[str, str]]:
         """
         验证样本列表
         
         Args:
-            samples: 样本列表
+            samples: 样本的可迭代对象
             dialect: SQL方言
+            workers: 语法/Schema检查的进程数，1为当前进程内检查，0为CPU核数
+            progress_callback: 进度回调 (已完成数, 总数)
             
         Returns:
-            验证通过的样本列表
+            验证通过的样本列表（保持输入顺序）
+        """
+        return list(self.iter_valid_samples(samples, dialect, workers, progress_callback))
+    
+    def iter_valid_samples(
+        self,
+        samples: Iterable[Dict[str, str]],
+        dialect: str = "mysql",
+        workers: int = 1,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Iterator[Dict[str, str]]:
+        """
+        流式验证样本，逐条产出验证通过的样本
+        
+        输入可以是生成器（如逐行读取的JSONL文件）；需要批量校验时按VALIDATION_WINDOW_SIZE分窗口进行，
+        内存中最多保留一个窗口的样本。
+        
+        Args:
+            samples: 样本的可迭代对象
+            dialect: SQL方言
+            workers: 语法/Schema检查的进程数，1为当前进程内检查，0为CPU核数
+            progress_callback: 进度回调 (已完成数, 总数)，输入没有长度时总数为已读入的样本数
+            
+        Yields:
+            验证通过的样本（保持输入顺序）
         """
-        logger.info(f"开始验证 {len(samples)} 条样本...")
+        total = len(samples) if hasattr(samples, '__len__') else None
+        logger.info(f"开始验证 {total if total is not None else '流式输入的'} 条样本...")
+        
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        
+        # 多进程或需要执行验证时先批量校验窗口内所有不重复的SQL，逐条循环只读取结果
+        batched = workers > 1 or self._execution_checker is not None
         
-        valid_samples = []
+        # 进程池在所有窗口间复用，Schema索引只在每个工作进程启动时传输一次
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_validation_worker,
+                initargs=(self.table_columns,)
+            )
+            logger.info(f"使用最多 {workers} 个进程做语法和Schema检查")
+        
+        valid_count = 0
         invalid_count = 0
+        i = 0
+        iterator = iter(samples)
+        try:
+            while True:
+                window = list(islice(iterator, VALIDATION_WINDOW_SIZE))
+                if not window:
+                    break
+                
+                if batched:
+                    window_total = total if total is not None else i + len(window)
+                    window_callback = None
+                    if progress_callback is not None:
+                        # 窗口内按不重复SQL报告的进度折算为样本进度
+                        def window_callback(done, n, offset=i, size=len(window), overall=window_total):
+                            progress_callback(offset + (done * size // n if n else size), overall)
+                    self._validate_batch(window, dialect, executor, window_callback)
+                
+                for sample in window:
+                    i += 1
+                    sql = sample.get('output', '').strip()
+                    
+                    if not sql:
+                        logger.warning(f"样本 {i} 没有SQL语句，跳过")
+                        invalid_count += 1
+                        continue
+                    
+                    # 验证SQL
+                    is_valid, error_msg = self.validate_sql(sql, dialect)
+                    
+                    if is_valid:
+                        plan = self._plans.get((normalize_sql(sql), dialect))
+                        if plan is not None:
+                            sample = {**sample, "estimated_cost": plan['cost'], "estimated_rows": plan['rows']}
+                        valid_count += 1
+                        yield sample
+                    else:
+                        logger.warning(f"样本 {i} 验证失败: {error_msg[:100]}")
+                        invalid_count += 1
+                    
+                    # 每100条记录一次进度
+                    if i % 100 == 0:
+                        logger.info(f"已验证 {i}/{total if total is not None else '?'} 条样本")
+                        if progress_callback is not None and not batched:
+                            progress_callback(i, total if total is not None else i)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
         
-        for i, sample in enumerate(samples, 1):
-            sql = sample.get('output', '').strip()
+        logger.info(f"验证完成: 有效 {valid_count} 条, 无效 {invalid_count} 条")
+        
+        execution_stats = self.get_execution_stats()
+        if execution_stats and execution_stats['count']:
+            logger.info(
+                f"执行验证: {execution_stats['count']} 条, 失败 {execution_stats['failures']} 条"
+                f"（超时 {execution_stats['timeouts']} 条）, 耗时 avg {execution_stats['avg_ms']}ms"
+                f" / p50 {execution_stats['p50_ms']}ms / p95 {execution_stats['p95_ms']}ms"
+                f" / max {execution_stats['max_ms']}ms"
+            )
+    
+    def validate_sql(self, sql: str, dialect: str = "mysql", check_execution: bool = True) -> Tuple[bool, str]:
+        """
+        验证单条SQL语句
+        
+        Args:
+            sql: SQL语句
+            dialect: SQL方言
+            check_execution: 是否做执行检查；为False时只做语法和Schema检查，
+                启用了执行验证时结果记入静态检查缓存，批量验证时只需补做执行验证
             
+        Returns:
+            (是否有效, 错误信息)
+        """
+        key = (normalize_sql(sql), dialect)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+        
+        if not check_execution and self._execution_checker is not None:
+            static = self._static_results.get(key)
+            if static is None:
+                static = self._static_check(sql, dialect)
+                self._static_results[key] = static
+            return static[0]
+        
+        result = self._validate_parsed(self.get_parsed(sql, dialect))
+        self._results[key] = result
+        return result
+    
+    def get_execution_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        获取执行验证的耗时统计
+        
+        Returns:
+            统计字典，未启用执行验证时返回None
+        """
+        if self._execution_checker is None:
+            return None
+        return self._execution_checker.stats()
+    
+    def close(self):
+        """释放执行验证的连接池"""
+        if self._execution_checker is not None:
+            self._execution_checker.close()
+    
+    def _validate_batch(
+        self,
+        samples: List[Dict[str, str]],
+        dialect: str,
+        executor: Optional[ProcessPoolExecutor] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ):
+        """
+        批量校验样本中尚未校验过的SQL，结果写入校验结果缓存
+        
+        先做语法和Schema检查（流式生成时已检查过的直接复用，其余传入进程池时在进程池中进行），
+        再把通过的查询语句交给只读连接池并发执行验证。
+        
+        Args:
+            samples: 样本列表
+            dialect: SQL方言
+            executor: 语法/Schema检查的进程池（由_init_validation_worker初始化），None表示在当前进程内检查
+            progress_callback: 进度回调 (已完成数, 总数)
+        """
+        pending: Dict[Tuple[str, str], str] = {}
+        for sample in samples:
+            sql = sample.get('output', '').strip()
             if not sql:
-                logger.warning(f"样本 {i} 没有SQL语句，跳过")
-                invalid_count += 1
                 continue
+            key = (normalize_sql(sql), dialect)
+            if key not in self._results and key not in pending:
+                pending[key] = sql
+        
+        if not pending:
+            return
+        
+        # 流式生成时已做过静态检查的SQL直接复用结果
+        results, query_limits = {}, {}
+        unchecked: Dict[Tuple[str, str], str] = {}
+        for key, sql in pending.items():
+            static = self._static_results.get(key)
+            if static is None:
+                unchecked[key] = sql
+            else:
+                results[key], query_limits[key] = static
+        
+        need_execution = self._execution_checker is not None
+        if executor is not None and unchecked:
+            checked, checked_limits = self._validate_in_processes(
+                unchecked, dialect, executor, None if need_execution else progress_callback
+            )
+            results.update(checked)
+            query_limits.update(checked_limits)
+        else:
+            # 静态检查时一并记下执行验证需要的信息，执行阶段不再依赖语法树缓存（窗口可能大于缓存）
+            for key, sql in unchecked.items():
+                results[key], query_limits[key] = self._static_check(sql, dialect)
+        
+        if need_execution:
+            self._execute_batch(pending, results, query_limits, dialect, progress_callback)
+        
+        self._results.update(results)
+    
+    def _static_check(self, sql: str, dialect: str) -> Tuple[Tuple[bool, str], Optional[bool]]:
+        """
+        语法和Schema检查，同时返回执行验证所需的语句信息
+        
+        Args:
+            sql: SQL语句
+            dialect: SQL方言
             
-            # 验证SQL
-            is_valid, error_msg = self.validate_sql(sql, dialect)
+        Returns:
+            ((是否有效, 错误信息), 最外层是否有LIMIT)，不是查询语句或未通过检查时后者为None
+        """
+        parsed = self.get_parsed(sql, dialect)
+        result = self._validate_parsed(parsed, check_execution=False)
+        return result, (parsed.has_limit if result[0] and parsed.is_query else None)
+    
+    def _validate_in_processes(
+        self,
+        pending: Dict[Tuple[str, str], str],
+        dialect: str,
+        executor: ProcessPoolExecutor,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Tuple[Dict[Tuple[str, str], Tuple[bool, str]], Dict[Tuple[str, str], Optional[bool]]]:
+        """
+        在进程池中并行完成语法和Schema检查
+        
+        SQL分块提交，按提交顺序取回结果；执行验证所需的语句信息随结果一起返回，主进程无需再解析。
+        
+        Args:
+            pending: (规范化SQL, 方言) -> 原始SQL
+            dialect: SQL方言
+            executor: 由_init_validation_worker初始化的进程池
+            progress_callback: 进度回调 (已完成数, 总数)
             
-            if is_valid:
-                valid_samples.append(sample)
-            else:
-                logger.warning(f"样本 {i} 验证失败: {error_msg[:100]}")
-                invalid_count += 1
+        Returns:
+            ((规范化SQL, 方言) -> (是否有效, 错误信息), (规范化SQL, 方言) -> 最外层是否有LIMIT)
+        """
+        items = list(pending.items())
+        chunks = [items[i:i + VALIDATION_CHUNK_SIZE] for i in range(0, len(items), VALIDATION_CHUNK_SIZE)]
+        logger.info(f"多进程验证 {len(items)} 条不重复SQL（{len(chunks)} 个分块）")
+        
+        results, query_limits = {}, {}
+        done = 0
+        for chunk, chunk_results in zip(chunks, executor.map(_validate_sql_chunk, [
+            ([sql for _, sql in chunk], dialect) for chunk in chunks
+        ])):
+            for (key, _), (result, has_limit) in zip(chunk, chunk_results):
+                results[key] = result
+                query_limits[key] = has_limit
             
-            # 每100条记录一次进度
-            if i % 100 == 0:
-                logger.info(f"已验证 {i}/{len(samples)} 条样本")
+            done += len(chunk)
+            logger.info(f"已验证 {done}/{len(items)} 条不重复SQL")
+            if progress_callback is not None:
+                progress_callback(done, len(items))
         
-        logger.info(f"验证完成: 有效 {len(valid_samples)} 条, 无效 {invalid_count} 条")
-        return valid_samples
+        return results, query_limits
     
-    def validate_sql(self, sql: str, dialect: str = "mysql") -> Tuple[bool, str]:
+    def _execute_batch(
+        self,
+        pending: Dict[Tuple[str, str], str],
+        results: Dict[Tuple[str, str], Tuple[bool, str]],
+        query_limits: Dict[Tuple[str, str], Optional[bool]],
+        dialect: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ):
         """
-        验证单条SQL语句
+        对通过静态检查的查询语句并发做执行验证，失败的结果原地更新
+        
+        Args:
+            pending: (规范化SQL, 方言) -> 原始SQL
+            results: 静态检查结果
+            query_limits: 静态检查记下的最外层是否有LIMIT（非查询语句为None），不需要重新解析
+            dialect: SQL方言
+            progress_callback: 进度回调 (已完成数, 总数)
+        """
+        targets = [
+            (key, self._execution_sql(pending[key], has_limit))
+            for key, has_limit in query_limits.items()
+            if has_limit is not None and results[key][0]
+        ]
+        
+        checker = self._execution_checker
+        logger.info(f"并发{'EXPLAIN' if checker.mode == 'explain' else '执行'}验证 {len(targets)} 条SQL（{checker.pool_size} 个只读连接）")
+        for start in range(0, len(targets), EXECUTION_BATCH_SIZE):
+            batch = targets[start:start + EXECUTION_BATCH_SIZE]
+            outcomes = checker.check_many([test_sql for _, test_sql in batch])
+            for (key, _), (is_valid, error, plan) in zip(batch, outcomes):
+                if plan is not None:
+                    self._plans[key] = plan
+                if not is_valid:
+                    results[key] = (False, f"执行错误: {error}")
+            
+            done = start + len(batch)
+            logger.info(f"已执行验证 {done}/{len(targets)} 条SQL")
+            if progress_callback is not None:
+                progress_callback(done, len(targets))
+    
+    def get_parsed(self, sql: str, dialect: str = "mysql") -> ParsedSQL:
+        """
+        获取SQL的解析结果（按规范化SQL缓存最近使用的MAX_PARSED_CACHE_SIZE条）
         
         Args:
             sql: SQL语句
             dialect: SQL方言
             
+        Returns:
+            ParsedSQL对象
+        """
+        key = (normalize_sql(sql), dialect)
+        parsed = self._parsed.get(key)
+        if parsed is None:
+            parsed = ParsedSQL(sql, dialect)
+            self._parsed[key] = parsed
+        return parsed
+    
+    def _validate_parsed(self, parsed: ParsedSQL, check_execution: bool = True) -> Tuple[bool, str]:
+        """
+        对解析结果依次做语法、Schema和执行检查（不使用结果缓存）
+        
+        Args:
+            parsed: 解析后的SQL
+            check_execution: 是否做执行检查（批量验证时由连接池统一执行）
+            
         Returns:
             (是否有效, 错误信息)
         """
         try:
             # 1. 语法检查
-            is_valid, error = self._check_syntax(sql, dialect)
+            is_valid, error = self._check_syntax(parsed)
             if not is_valid:
                 return False, f"语法错误: {error}"
             
             # 2. Schema验证（表名和字段名）
-            is_valid, error = self._check_schema(sql, dialect)
+            is_valid, error = self._check_schema(parsed)
             if not is_valid:
                 return False, f"Schema错误: {error}"
             
             # 3. 可选：执行验证
-            if self.enable_execution_check and self.db_connector:
-                is_valid, error = self._check_execution(sql)
+            if check_execution and self._execution_checker is not None:
+                is_valid, error = self._check_execution(parsed)
                 if not is_valid:
                     return False, f"执行错误: {error}"
             
@@ -123,54 +617,43 @@ class SQLValidator:
         except Exception as e:
             return False, str(e)
     
-    def _check_syntax(self, sql: str, dialect: str) -> Tuple[bool, str]:
+    def _check_syntax(self, parsed: ParsedSQL) -> Tuple[bool, str]:
         """
-        检查SQL语法
+        检查SQL语法（解析已在ParsedSQL中完成）
         
         Args:
-            sql: SQL语句
-            dialect: SQL方言
+            parsed: 解析后的SQL
             
         Returns:
             (是否有效, 错误信息)
         """
-        try:
-            # 使用sqlglot解析SQL
-            parsed = parse_one(sql, read=dialect)
-            
-            if parsed is None:
-                return False, "无法解析SQL语句"
-            
-            return True, ""
-            
-        except Exception as e:
-            return False, str(e)
+        if not parsed.ok:
+            return False, parsed.error
+        return True, ""
     
-    def _check_schema(self, sql: str, dialect: str) -> Tuple[bool, str]:
+    def _check_schema(self, parsed: ParsedSQL) -> Tuple[bool, str]:
         """
         检查SQL中的表名和字段名是否存在
         
         Args:
-            sql: SQL语句
-            dialect: SQL方言
+            parsed: 解析后的SQL
             
         Returns:
             (是否有效, 错误信息)
         """
         try:
-            parsed = parse_one(sql, read=dialect)
-            
             # 构建别名映射：别名 -> 实际表名
             alias_to_table = {}
             
             # 提取所有表名和别名
             tables = []
-            for table in parsed.find_all(exp.Table):
-                # 获取实际表名（this属性包含实际表名）
+            for table in parsed.tables:
+                # 获取实际表名（this属性包含实际表名），带schema时解析为 schema.table 表键
                 if hasattr(table, 'this') and table.this:
-                    actual_table_name = str(table.this).lower()
+                    table_name = str(table.this).lower()
                 else:
-                    actual_table_name = table.name.lower()
+                    table_name = table.name.lower()
+                actual_table_name = self._resolve_table(table_name, table.db.lower())
                 
                 tables.append(actual_table_name)
                 
@@ -185,9 +668,10 @@ class SQLValidator:
                 else:
                     # 如果没有别名，表名本身也可以作为引用
                     alias_to_table[actual_table_name] = actual_table_name
+                    alias_to_table[table_name] = actual_table_name
             
             # 提取所有列引用
-            for column in parsed.find_all(exp.Column):
+            for column in parsed.columns:
                 column_name = column.name.lower()
                 table_ref = None
                 
@@ -196,11 +680,13 @@ class SQLValidator:
                     table_ref = column.table.lower()
                 
                     # 将别名或表名映射到实际表名
-                    if table_ref in alias_to_table:
+                    if column.db:
+                        actual_table = self._resolve_table(table_ref, column.db.lower())
+                    elif table_ref in alias_to_table:
                         actual_table = alias_to_table[table_ref]
                     else:
                         # 如果不在映射中，可能是直接使用表名（没有别名）
-                        actual_table = table_ref
+                        actual_table = self._resolve_table(table_ref)
                     
                     # 验证实际表名是否存在
                     if actual_table not in self.table_columns:
@@ -226,74 +712,148 @@ class SQLValidator:
         except Exception as e:
             return False, str(e)
     
-    def _check_execution(self, sql: str) -> Tuple[bool, str]:
+    def _check_execution(self, parsed: ParsedSQL) -> Tuple[bool, str]:
         """
-        执行SQL验证（只读验证，自动添加LIMIT）
+        执行SQL验证（只读连接、带超时，自动添加LIMIT）
         
         Args:
-            sql: SQL语句
+            parsed: 解析后的SQL
             
         Returns:
             (是否有效, 错误信息)
         """
-        try:
-            # 确保是SELECT语句
-            if not sql.strip().upper().startswith('SELECT'):
-                return True, ""  # 非SELECT语句跳过执行验证
-            
-            # 添加LIMIT以限制结果集
-            test_sql = sql.strip()
-            if 'LIMIT' not in test_sql.upper():
-                # 移除末尾的分号
-                if test_sql.endswith(';'):
-                    test_sql = test_sql[:-1]
-                test_sql += ' LIMIT 1'
+        # 确保是查询语句
+        if not parsed.is_query:
+            return True, ""  # 非SELECT语句跳过执行验证
+        is_valid, error, plan = self._execution_checker.check_with_plan(self._build_execution_sql(parsed))
+        if plan is not None:
+            self._plans[(normalize_sql(parsed.sql), parsed.dialect)] = plan
+        return is_valid, error
+    
+    def _build_execution_sql(self, parsed: ParsedSQL) -> str:
+        """
+        构造执行验证用的SQL：execute模式下没有LIMIT时添加LIMIT 1以限制结果集；
+        explain模式保留原语句，使预估代价反映完整查询
+        
+        Args:
+            parsed: 解析后的SQL
             
-            # 执行查询
-            self.db_connector.execute_query(test_sql)
-            return True, ""
+        Returns:
+            待执行的SQL
+        """
+        return self._execution_sql(parsed.sql, parsed.has_limit)
+    
+    def _execution_sql(self, sql: str, has_limit: bool) -> str:
+        """
+        按执行验证模式改写SQL（见_build_execution_sql）
+        
+        Args:
+            sql: 原始SQL
+            has_limit: 最外层是否已有LIMIT
             
-        except Exception as e:
-            return False, str(e)
+        Returns:
+            待执行的SQL
+        """
+        test_sql = sql.strip()
+        if self._execution_checker.mode == 'explain':
+            return test_sql.rstrip(';')
+        if not has_limit:
+            # 移除末尾的分号
+            if test_sql.endswith(';'):
+                test_sql = test_sql[:-1]
+            test_sql += ' LIMIT 1'
+        return test_sql
     
-    def save_valid_samples(self, samples: List[Dict[str, str]], output_path: str):
+    def save_valid_samples(self, samples: Iterable[Dict[str, str]], output_path: str) -> int:
         """
-        保存验证通过的样本
+        保存验证通过的样本（逐条追加写入，可直接传入iter_valid_samples的结果，边验证边落盘）
         
         Args:
-            samples: 样本列表
+            samples: 样本的可迭代对象
             output_path: 输出文件路径
+            
+        Returns:
+            保存的样本数
         """
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for sample in samples:
-                f.write(json.dumps(sample, ensure_ascii=False) + '\n')
-        logger.info(f"有效样本已保存到: {output_path} (共{len(samples)}条)")
+        with JsonlWriter(output_path) as writer:
+            count = writer.write_all(samples)
+        logger.info(f"有效样本已保存到: {output_path} (共{count}条)")
+        return count
+
+
+def _init_validation_worker(table_columns: Dict[str, Set[str]]):
+    """
+    验证工作进程初始化：用主进程传来的Schema索引创建校验器
+    
+    Args:
+        table_columns: 表名 -> 字段名集合
+    """
+    global _worker_validator
+    _worker_validator = SQLValidator({})
+    _worker_validator.table_columns = table_columns
+    _worker_validator._build_bare_table_index()
+
+
+def _validate_sql_chunk(args: Tuple[List[str], str]) -> List[Tuple[Tuple[bool, str], Optional[bool]]]:
+    """
+    在工作进程中校验一批SQL（语法和Schema）
+    
+    Args:
+        args: (SQL列表, 方言)
+        
+    Returns:
+        与输入顺序一致的 ((是否有效, 错误信息), 最外层是否有LIMIT) 列表，见SQLValidator._static_check
+    """
+    sqls, dialect = args
+    return [_worker_validator._static_check(sql, dialect) for sql in sqls]
 
 
 def validate_and_save_samples(
-    samples: List[Dict[str, str]],
+    samples: Iterable[Dict[str, str]],
     metadata: Dict[str, Any],
     output_path: str,
     dialect: str = "mysql",
     db_connector: Optional[DatabaseConnector] = None,
-    enable_execution_check: bool = False
-) -> List[Dict[str, str]]:
+    enable_execution_check: bool = False,
+    validator: Optional[SQLValidator] = None,
+    workers: int = 1,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    execution_workers: int = 4,
+    execution_timeout_ms: int = 5000,
+    execution_check_mode: str = "execute",
+    max_plan_cost: float = 0
+) -> int:
     """
-    验证并保存样本的便捷函数
+    验证并保存样本的便捷函数，边验证边写入output_path，不在内存中保留有效样本
     
     Args:
-        samples: 样本列表
+        samples: 样本的可迭代对象（可以是逐行读取JSONL文件的生成器）
         metadata: 元数据字典
         output_path: 输出文件路径
         dialect: SQL方言
         db_connector: 数据库连接器
         enable_execution_check: 是否启用执行验证
+        validator: 已有的校验器（如流式生成时的实时校验器），复用其校验结果
+        workers: 语法/Schema检查的进程数，1为当前进程内检查，0为CPU核数
+        progress_callback: 进度回调 (已完成数, 总数)
+        execution_workers: 执行验证的只读连接数（并发数）
+        execution_timeout_ms: 执行验证的单条语句超时（毫秒）
+        execution_check_mode: 执行验证模式，execute 或 explain
+        max_plan_cost: explain模式下允许的最大预估代价，0表示不限制
         
     Returns:
-        有效样本列表
+        有效样本数（有效样本从output_path流式读取）
     """
-    validator = SQLValidator(metadata, db_connector, enable_execution_check)
-    valid_samples = validator.validate_samples(samples, dialect)
-    validator.save_valid_samples(valid_samples, output_path)
-    return valid_samples
+    if validator is None:
+        validator = SQLValidator(
+            metadata, db_connector, enable_execution_check, execution_workers, execution_timeout_ms,
+            execution_check_mode, max_plan_cost
+        )
+    try:
+        return validator.save_valid_samples(
+            validator.iter_valid_samples(samples, dialect, workers, progress_callback),
+            output_path
+        )
+    finally:
+        validator.close()
 
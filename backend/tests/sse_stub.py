@@ -0,0 +1,84 @@
+"""
+本地SSE桩服务：模拟OpenAI兼容的 /chat/completions 流式接口，可在流中途断开连接
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional
+
+
+class SSEStubServer:
+    """
+    按脚本依次返回流式响应的桩服务
+
+    每个脚本项: {"content": 响应全文, "fail_after": 发送多少个事件后断开（None表示正常结束）}，
+    响应全文按 chunk_size 个字符切成多个事件，用于检验跨事件的行拼接。
+    """
+
+    def __init__(self, scripts: List[Dict[str, Any]], chunk_size: int = 7):
+        self.scripts = list(scripts)
+        self.chunk_size = chunk_size
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def __enter__(self) -> 'SSEStubServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_script(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.requests.append(request)
+            return self.scripts.pop(0) if self.scripts else None
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                script = stub._next_script(json.loads(body or b'{}'))
+                if script is None:
+                    self.send_error(500, "no scripted response")
+                    return
+
+                content = script['content']
+                pieces = [content[i:i + stub.chunk_size] for i in range(0, len(content), stub.chunk_size)]
+                events = [self._event(piece) for piece in pieces] + [b"data: [DONE]\n\n"]
+                fail_after = script.get('fail_after')
+                sent = events if fail_after is None else events[:fail_after]
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                # 中途断开时声明的长度大于实际发送的内容，客户端读到连接关闭即报错
+                self.send_header('Content-Length', str(sum(map(len, events))))
+                self.end_headers()
+                for event in sent:
+                    self.wfile.write(event)
+                    self.wfile.flush()
+                if fail_after is not None:
+                    self.close_connection = True
+
+            @staticmethod
+            def _event(piece: str) -> bytes:
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                }
+                return b"data: " + json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b"\n\n"
+
+        return Handler
@@ -0,0 +1,74 @@
+"""
+上下文构建测试：Token预算内的字段取舍、各表轮流选字段和渲染缓存
+"""
+from modules.context_builder import SchemaContextBuilder
+from modules.rate_limiter import estimate_tokens
+
+
+def column(name, column_type="varchar(32)", comment="", nullable=True):
+    return {"name": name, "column_type": column_type, "nullable": nullable, "comment": comment}
+
+
+def make_metadata(wide_columns=30):
+    return {
+        "users": {
+            "table_name": "users",
+            "columns": [column("id", "int", nullable=False), column("code")]
+                       + [column(f"attr_{i}", "datetime", f"用户属性{i}的说明") for i in range(wide_columns)],
+            "primary_keys": ["id"],
+            "foreign_keys": {},
+        },
+        "orders": {
+            "table_name": "orders",
+            "columns": [column("order_id", "int", nullable=False), column("user_code"),
+                        column("note_a"), column("note_b"), column("note_c")],
+            "primary_keys": ["order_id"],
+            "foreign_keys": {"user_code": "users.code"},
+        },
+    }
+
+
+def rendered_columns(ddl, table):
+    body = ddl.split(f"CREATE TABLE {table} (")[1].split(");")[0]
+    return [line.split()[0] for line in body.strip().split("\n") if line.strip() and not line.strip().startswith("PRIMARY")]
+
+
+def test_keys_and_referenced_columns_are_always_kept():
+    ddl = SchemaContextBuilder(make_metadata(), token_budget=1).build(["users", "orders"])
+    # 预算连必选字段都放不下时也只保留主键、外键和被引用字段
+    assert rendered_columns(ddl, "users") == ["id", "code"]
+    assert rendered_columns(ddl, "orders") == ["order_id", "user_code"]
+    assert "-- 另有 30 个次要字段未列出" in ddl
+    assert "--   user_code -> users.code" in ddl
+
+
+def test_rendered_ddl_respects_token_budget():
+    metadata = make_metadata()
+    full = SchemaContextBuilder(metadata).build(["users", "orders"])
+    for budget in (120, 200, 300):
+        ddl = SchemaContextBuilder(metadata, token_budget=budget).build(["users", "orders"])
+        assert estimate_tokens(ddl) <= budget
+        assert len(ddl) < len(full)
+    # 不限预算时输出全部字段
+    assert len(rendered_columns(full, "users")) == 32
+
+
+def test_round_robin_keeps_narrow_table_from_starving():
+    builder = SchemaContextBuilder(make_metadata(wide_columns=60), token_budget=200)
+    ddl = builder.build(["users", "orders"])
+    users, orders = rendered_columns(ddl, "users"), rendered_columns(ddl, "orders")
+    # 宽表字段得分都更高，但窄表每轮也能分到字段
+    assert len(users) > 3
+    assert "note_a" in orders and len(orders) > 2
+
+
+def test_build_is_cached_per_tables_and_budget():
+    metadata = make_metadata()
+    builder = SchemaContextBuilder(metadata, token_budget=200)
+    first = builder.build(["users", "orders"])
+    metadata["orders"]["columns"].append(column("added_later"))
+
+    assert builder.build(["users", "orders"]) is first
+    assert "added_later" not in builder.build(["users", "orders"], token_budget=200)
+    # 预算不同视为不同的缓存键，重新渲染
+    assert "added_later" in builder.build(["users", "orders"], token_budget=0)
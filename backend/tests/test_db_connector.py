@@ -0,0 +1,65 @@
+"""
+连接池测试（使用假连接，不需要数据库）
+"""
+import pytest
+
+from modules.db_connector import ConnectionPool
+
+
+class FakeConnection:
+    """记录ping参数的假MySQL连接"""
+
+    def __init__(self, serial: int):
+        self.serial = serial
+        self.alive = True
+        self.closed = False
+        self.ping_args = []
+
+    def ping(self, reconnect=True):
+        self.ping_args.append(reconnect)
+        if not self.alive:
+            raise ConnectionError("gone")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool():
+    created = []
+
+    def factory():
+        conn = FakeConnection(len(created) + 1)
+        created.append(conn)
+        return conn
+
+    pool = ConnectionPool(factory, 'mysql', min_size=1, max_size=2, health_check_interval=0)
+    pool.created = created
+    return pool
+
+
+def test_health_check_never_reconnects_in_place(pool):
+    with pool.connection() as conn:
+        assert conn.serial == 1
+    assert pool.created[0].ping_args == [False]
+
+
+def test_dead_connection_is_replaced_through_factory(pool):
+    pool.created[0].alive = False
+    with pool.connection() as conn:
+        assert conn.serial == 2
+    assert pool.created[0].closed
+    assert pool.stats()['size'] == 1
+
+
+def test_broken_connection_after_error_is_discarded(pool):
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.alive = False
+            raise RuntimeError("query failed")
+    assert pool.created[0].closed
+    with pool.connection() as conn:
+        assert conn.serial == 2
@@ -0,0 +1,119 @@
+"""
+样本去重测试
+"""
+import random
+import time
+
+from modules.deduplicator import SampleDeduplicator, canonical_sql, sql_lexical_keys
+
+
+def sample(question, sql):
+    return {"input": question, "output": sql}
+
+
+def test_formatting_and_alias_variants_are_sql_duplicates():
+    dedup = SampleDeduplicator(question_threshold=1)
+    assert dedup.add(sample("q1", "SELECT u.name AS n, COUNT(o.id) AS cnt FROM users AS u JOIN orders AS o "
+                                  "ON u.id = o.user_id GROUP BY u.name ORDER BY cnt DESC")) is True
+    assert dedup.add(sample("q2", "select a.NAME nm, count(b.ID) total from `users` a join orders b "
+                                  "on a.id=b.user_id group by a.name order by total desc;")) is False
+    assert dedup.add(sample("q3", "SELECT * FROM t WHERE x != 1")) is True
+    assert dedup.add(sample("q4", "select *  from T where X <> 1")) is False
+    stats = dedup.get_stats()
+    assert stats['kept'] == 2 and stats['sql_duplicates'] == 2
+
+
+def test_string_literals_stay_case_sensitive():
+    dedup = SampleDeduplicator(question_threshold=1)
+    assert dedup.add(sample("q1", "SELECT id FROM users WHERE name = 'Bob'"))
+    assert dedup.add(sample("q2", "SELECT id FROM users WHERE name = 'bob'"))
+
+
+def test_coarse_key_matches_only_when_aliases_differ():
+    exact_a, coarse_a = sql_lexical_keys("SELECT x FROM (SELECT id AS x FROM t) sub")
+    exact_b, coarse_b = sql_lexical_keys("SELECT y FROM (SELECT id y FROM t) AS d")
+    assert exact_a != exact_b and coarse_a == coarse_b
+    assert canonical_sql("SELECT x FROM (SELECT id AS x FROM t) sub") == \
+        canonical_sql("SELECT y FROM (SELECT id y FROM t) AS d")
+    assert sql_lexical_keys("SELECT name FROM users")[1] != sql_lexical_keys("SELECT city FROM users")[1]
+    assert sql_lexical_keys("SELECT a x, b y FROM t ORDER BY x")[1] != \
+        sql_lexical_keys("SELECT a x, b y FROM t ORDER BY y")[1]
+
+
+def test_sql_is_parsed_only_on_coarse_key_collision():
+    dedup = SampleDeduplicator(question_threshold=1)
+    for i in range(50):
+        dedup.add(sample(f"q{i}", f"SELECT name FROM users WHERE id = {i}"))
+    assert dedup.get_stats()['sql_parsed'] == 0
+    assert dedup.add(sample("q", "SELECT u.name FROM users u WHERE u.id = 7")) is True
+    assert dedup.add(sample("q", "SELECT v.name FROM users v WHERE v.id = 7")) is False
+    assert dedup.get_stats()['sql_parsed'] == 2
+
+
+def test_near_duplicate_questions():
+    dedup = SampleDeduplicator()
+    assert dedup.add(sample("查询北京地区2023年订单金额超过500元的客户姓名", "SELECT 1"))
+    assert not dedup.add(sample("请查询北京地区2023年订单金额超过500元的客户姓名。", "SELECT 2"))
+    assert dedup.add(sample("统计每个商品类别的平均价格", "SELECT 3"))
+    assert dedup.get_stats()['question_duplicates'] == 1
+
+
+def test_question_check_disabled_at_threshold_one():
+    dedup = SampleDeduplicator(question_threshold=1)
+    assert dedup.add(sample("查询所有用户", "SELECT 1"))
+    assert dedup.add(sample("查询所有用户", "SELECT 2"))
+
+
+def make_samples(count, seed=7):
+    """按模板生成带有原样重复、别名改写和问题近似改写的样本"""
+    rng = random.Random(seed)
+    cities = ['北京', '上海', '广州', '深圳', '杭州', '成都', '武汉', '西安', '南京', '重庆']
+    categories = ['电子产品', '服装', '食品', '图书', '家具', '玩具', '美妆', '运动']
+    templates = [
+        ("查询{c}地区{y}年订单金额超过{v}元的客户姓名",
+         "SELECT c.name FROM customers c JOIN orders o ON c.id = o.customer_id "
+         "WHERE c.city = '{c}' AND YEAR(o.created_at) = {y} AND o.amount > {v}"),
+        ("统计{c}每个{k}类别在{y}年的销售总额",
+         "SELECT p.category, SUM(o.amount) AS total FROM orders o JOIN products p ON o.product_id = p.id "
+         "WHERE p.category = '{k}' AND o.city = '{c}' AND YEAR(o.created_at) = {y} GROUP BY p.category"),
+        ("列出{y}年{m}月{c}下单次数最多的前{v}名用户",
+         "SELECT u.name, COUNT(*) AS cnt FROM users u JOIN orders o ON u.id = o.user_id WHERE u.city = '{c}' "
+         "AND MONTH(o.created_at) = {m} AND YEAR(o.created_at) = {y} GROUP BY u.name ORDER BY cnt DESC LIMIT {v}"),
+        ("{c}的{k}商品中价格高于{v}的有哪些",
+         "SELECT name, price FROM products WHERE category = '{k}' AND city = '{c}' AND price > {v}"),
+        ("找出{y}年在{c}注册且消费超过{v}的会员数量",
+         "SELECT COUNT(*) FROM members WHERE city = '{c}' AND YEAR(registered_at) = {y} AND total_spent > {v}"),
+    ]
+    samples = []
+    while len(samples) < count:
+        roll = rng.random()
+        if samples and roll < 0.15:
+            samples.append(dict(rng.choice(samples)))
+        elif samples and roll < 0.18:
+            source = rng.choice(samples)
+            samples.append(sample(f"第{len(samples)}个问题：" + source['input'][::-1],
+                                  source['output'].lower().replace('o.', 'ord.').replace(' o ', ' AS ord ')))
+        elif samples and roll < 0.32:
+            source = rng.choice(samples)
+            samples.append(sample("请" + source['input'] + "。", source['output'] + " LIMIT 100"))
+        else:
+            question, sql = rng.choice(templates)
+            values = dict(c=rng.choice(cities), k=rng.choice(categories), y=rng.randint(2015, 2024),
+                          m=rng.randint(1, 12), v=rng.randint(1, 5000))
+            samples.append(sample(question.format(**values), sql.format(**values)))
+    return samples
+
+
+def test_benchmark_100k_samples():
+    samples = make_samples(100000)
+    dedup = SampleDeduplicator()
+    start = time.perf_counter()
+    kept = sum(1 for _ in dedup.filter(samples))
+    elapsed = time.perf_counter() - start
+    stats = dedup.get_stats()
+    print(f"\n去重 {len(samples)} 条样本用时 {elapsed:.1f}s: {stats}")
+    assert stats['seen'] == 100000 and kept == stats['kept']
+    assert stats['sql_duplicates'] > 15000 and stats['question_duplicates'] > 5000
+    # 绝大多数样本不解析语法树；别名改写的重复只在粗粒度键冲突时解析
+    assert 0 < stats['sql_parsed'] < 0.1 * len(samples)
+    assert elapsed < 60
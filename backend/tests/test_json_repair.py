@@ -0,0 +1,46 @@
+"""
+JSON修复测试：非标准写法和截断数组的本地修复
+"""
+import json
+
+import pytest
+
+from modules.json_repair import repair_json
+
+
+def test_nested_array_truncation_drops_half_written_object():
+    text = '{"topics": [{"name": "a"}, {"name": "b", "tables": ["t1", "t2'
+    assert repair_json(text) == {"topics": [{"name": "a"}]}
+
+
+def test_truncated_after_complete_nested_arrays():
+    text = '{"topics": [{"name": "a", "tables": ["t1"]}, {"name": "b", "tables": ["t2", "t3"]}, {"na'
+    assert repair_json(text) == {"topics": [
+        {"name": "a", "tables": ["t1"]},
+        {"name": "b", "tables": ["t2", "t3"]},
+    ]}
+
+
+def test_truncated_top_level_array():
+    assert repair_json('[{"input": "q1", "output": "s1"}, {"input": "q2", "outp') == [
+        {"input": "q1", "output": "s1"}
+    ]
+
+
+def test_truncated_inside_string_with_brackets():
+    text = '{"topics": [{"name": "a [x], {y}"}, {"name": "b, c'
+    assert repair_json(text) == {"topics": [{"name": "a [x], {y}"}]}
+
+
+def test_no_complete_element_is_not_repaired():
+    with pytest.raises(json.JSONDecodeError):
+        repair_json('{"topics": [{"name": "a", "tables": ["t1", "t2')
+
+
+def test_non_standard_syntax():
+    text = "结果如下：\n```json\n{'topics': [{'name': 'a', 'ok': True, 'note': None,},],}\n```\n以上"
+    assert repair_json(text) == {"topics": [{"name": "a", "ok": True, "note": None}]}
+
+
+def test_trailing_text_after_json_is_ignored():
+    assert repair_json('[1, 2] 以上是结果 [3]') == [1, 2]
@@ -0,0 +1,54 @@
+"""
+元数据指纹测试（使用假连接器，不需要数据库）
+"""
+import pytest
+
+from modules.metadata_extractor import MetadataExtractor
+
+
+class FakeConnector:
+    """返回固定指纹查询结果并记录查询语句的假连接器"""
+
+    def __init__(self, db_type, rows):
+        self.db_type = db_type
+        self.database = "shop"
+        self.rows = rows
+        self.queries = []
+
+    def execute_query(self, query):
+        self.queries.append(query)
+        return self.rows
+
+
+def fingerprint_row(constraint_hash):
+    return {
+        "TABLE_NAME": "orders",
+        "CREATE_TIME": "2024-01-01 00:00:00",
+        "UPDATE_TIME": None,
+        "COLUMN_COUNT": 3,
+        "COLUMN_HASH": 123456,
+        "CONSTRAINT_COUNT": 2,
+        "CONSTRAINT_HASH": constraint_hash,
+    }
+
+
+@pytest.mark.parametrize("db_type, constraint_source", [
+    ("mysql", "information_schema.KEY_COLUMN_USAGE"),
+    ("postgres", "pg_constraint"),
+])
+def test_fingerprint_includes_constraints(db_type, constraint_source):
+    before = FakeConnector(db_type, [fingerprint_row(111)])
+    after = FakeConnector(db_type, [fingerprint_row(222)])
+
+    old = MetadataExtractor(before).compute_fingerprints()["orders"]["fingerprint"]
+    new = MetadataExtractor(after).compute_fingerprints()["orders"]["fingerprint"]
+
+    assert constraint_source in before.queries[0]
+    assert old != new
+
+
+def test_table_without_constraints_has_stable_fingerprint():
+    row = dict(fingerprint_row(None), CONSTRAINT_COUNT=None)
+    first = MetadataExtractor(FakeConnector("mysql", [row])).compute_fingerprints()
+    second = MetadataExtractor(FakeConnector("mysql", [dict(row)])).compute_fingerprints()
+    assert first == second
@@ -0,0 +1,55 @@
+"""
+列画像测试：抽样通过连接器的流式查询读取（使用假连接器，不需要数据库）
+"""
+from modules.profiler import ColumnProfiler
+
+TABLE_INFO = {
+    "columns": [
+        {"name": "id", "type": "int"},
+        {"name": "status", "type": "varchar"},
+    ]
+}
+
+
+class FakeConnector:
+    """按批产出元组行的假连接器，记录iter_query的参数和生成器是否被关闭"""
+
+    db_type = "postgres"
+    pool_max_size = 2
+
+    def __init__(self, total_rows):
+        self.total_rows = total_rows
+        self.calls = []
+        self.closed = False
+        self.batches_read = 0
+
+    def iter_query(self, query, params=None, batch_size=1000, as_dict=True, timeout_ms=0):
+        self.calls.append({"query": query, "batch_size": batch_size, "as_dict": as_dict, "timeout_ms": timeout_ms})
+        try:
+            for start in range(0, self.total_rows, batch_size):
+                self.batches_read += 1
+                yield [(i, "paid" if i % 2 else "new") for i in range(start, min(start + batch_size, self.total_rows))]
+        finally:
+            self.closed = True
+
+
+def test_profile_streams_sample_through_iter_query():
+    connector = FakeConnector(total_rows=5000)
+    profiler = ColumnProfiler(connector, sample_rows=300, time_budget_ms=5000)
+
+    profile = profiler._profile_table("orders", TABLE_INFO, row_estimate=None)
+
+    call = connector.calls[0]
+    assert call["as_dict"] is False and 0 < call["timeout_ms"] <= 5000
+    assert '"status"' in call["query"] and "LIMIT 300" in call["query"]
+    # 读满抽样行数后停止，并关闭流式游标
+    assert connector.batches_read == 2 and connector.closed
+    assert profile["sampled_rows"] == 300
+    assert profile["columns"]["status"]["distinct"] == 2
+
+
+def test_profile_small_table_reads_all_rows():
+    connector = FakeConnector(total_rows=50)
+    profile = ColumnProfiler(connector, sample_rows=300)._profile_table("orders", TABLE_INFO, row_estimate=50)
+    assert profile["sampled_rows"] == 50
+    assert connector.closed
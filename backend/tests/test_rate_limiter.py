@@ -0,0 +1,39 @@
+"""
+限流器测试：注册表按最近一次配置更新已有限流器
+"""
+from modules.rate_limiter import AdaptiveRateLimiter, get_rate_limiter
+
+
+def test_registry_applies_later_settings():
+    first = get_rate_limiter("http://registry-test/v1/", "m", initial_concurrency=8, max_concurrency=16)
+    assert first.limit == 8
+
+    second = get_rate_limiter(
+        "http://registry-test/v1", "m", initial_concurrency=1, max_concurrency=4, tokens_per_minute=1000
+    )
+    assert second is first
+    assert second.max_concurrency == 4
+    assert second.tokens_per_minute == 1000
+    # 当前上限收敛到新的范围内，initial_concurrency不会重置自适应状态
+    assert second.limit == 4
+
+
+def test_registry_keeps_separate_models():
+    a = get_rate_limiter("http://registry-test-2", "a", max_concurrency=2)
+    b = get_rate_limiter("http://registry-test-2", "b", max_concurrency=5)
+    assert a is not b
+    assert (a.max_concurrency, b.max_concurrency) == (2, 5)
+
+
+def test_raising_min_concurrency_lifts_limit():
+    limiter = AdaptiveRateLimiter(initial_concurrency=2, min_concurrency=1, max_concurrency=8)
+    limiter.configure(min_concurrency=3, max_concurrency=8)
+    assert limiter.limit == 3
+
+
+def test_token_budget_blocks_until_window_frees():
+    limiter = AdaptiveRateLimiter(initial_concurrency=4, tokens_per_minute=100)
+    assert limiter.try_acquire(80) == 0
+    assert limiter.try_acquire(30) > 0
+    limiter.configure(max_concurrency=16, tokens_per_minute=200)
+    assert limiter.try_acquire(30) == 0
@@ -0,0 +1,121 @@
+"""
+运行清单测试：阶段跳过与快照恢复、不完整阶段、生成检查点续跑
+"""
+import asyncio
+import json
+
+import pytest
+
+from modules.run_manifest import RunManifest, ChunkCheckpoint
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+
+
+def test_completed_stage_is_restored_from_snapshot(tmp_path):
+    output = tmp_path / "data" / "plan.json"
+    calls = []
+
+    def run():
+        calls.append(1)
+        write(output, '{"topics": []}')
+        return "ran"
+
+    manifest = RunManifest(str(tmp_path / "runs"))
+    assert manifest.run_stage("plan", {"n": 1}, [str(output)], run, lambda: "loaded") == "ran"
+
+    # 数据目录被清理后续跑：不重新执行，从快照恢复产物
+    output.unlink()
+    resumed = RunManifest(str(tmp_path / "runs"), manifest.run_id)
+    assert resumed.run_stage("plan", {"n": 1}, [str(output)], run, lambda: "loaded") == "loaded"
+    assert calls == [1]
+    assert output.read_text(encoding='utf-8') == '{"topics": []}'
+    assert resumed.output_hash("plan") == manifest.output_hash("plan")
+
+
+def test_changed_inputs_rerun_stage(tmp_path):
+    output = tmp_path / "out.txt"
+    manifest = RunManifest(str(tmp_path / "runs"))
+    manifest.run_stage("s", {"v": 1}, [str(output)], lambda: write(output, "1") or 1, lambda: "loaded")
+    result = manifest.run_stage("s", {"v": 2}, [str(output)], lambda: write(output, "2") or 2, lambda: "loaded")
+    assert result == 2
+
+
+def test_incomplete_stage_is_partial_and_reruns(tmp_path):
+    output = tmp_path / "samples.jsonl"
+    manifest = RunManifest(str(tmp_path / "runs"))
+    manifest.run_stage("generate", {}, [str(output)], lambda: 3, lambda: 0, lambda count: count >= 5)
+    assert manifest.data['stages']['generate']['status'] == "partial"
+    assert manifest.output_hash("generate") is None
+
+    result = manifest.run_stage("generate", {}, [str(output)], lambda: 5, lambda: 0, lambda count: count >= 5)
+    assert result == 5
+    assert manifest.completed_stages() == ["generate"]
+
+
+def test_failed_stage_is_recorded(tmp_path):
+    manifest = RunManifest(str(tmp_path / "runs"))
+
+    def boom():
+        raise RuntimeError("llm down")
+
+    with pytest.raises(RuntimeError):
+        manifest.run_stage("generate", {}, [], boom, lambda: None)
+    stage = json.loads((tmp_path / "runs" / manifest.run_id / "manifest.json").read_text())['stages']['generate']
+    assert stage['status'] == "failed" and "llm down" in stage['error']
+
+
+def test_async_stage(tmp_path):
+    manifest = RunManifest(str(tmp_path / "runs"))
+
+    async def run():
+        return 7
+
+    assert asyncio.run(manifest.arun_stage("s", {}, [], run, lambda: 0)) == 7
+    assert asyncio.run(manifest.arun_stage("s", {}, [], run, lambda: 0)) == 0
+
+
+def test_resume_unknown_run_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        RunManifest(str(tmp_path / "runs"), "missing")
+
+
+def test_checkpoint_survives_reopen_and_torn_last_line(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = ChunkCheckpoint(path)
+    checkpoint.put("1|topic|round-0|1/2", [{"input": "q", "output": "SELECT 1"}])
+    checkpoint.put("1|topic|round-0|2/2", [])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"key": "1|topic|round-0|3/3", "samp')  # 崩溃时写了一半
+
+    reopened = ChunkCheckpoint(path)
+    assert len(reopened) == 2
+    assert reopened.get("1|topic|round-0|1/2") == [{"input": "q", "output": "SELECT 1"}]
+    assert reopened.get("1|topic|round-0|3/3") is None
+
+    # 残行之后追加的新批次仍可读出
+    reopened.put("1|topic|round-1|1/1", [{"input": "q2", "output": "SELECT 2"}])
+    assert ChunkCheckpoint(path).get("1|topic|round-1|1/1") == [{"input": "q2", "output": "SELECT 2"}]
+
+
+def test_checkpoint_keeps_only_offsets_and_reads_samples_back(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = ChunkCheckpoint(path)
+    checkpoint.put("1|主题|round-0|1/1", [{"input": "城市", "output": "SELECT city FROM users"}])
+    checkpoint.put("2|topic|round-0|1/1", [{"input": "q", "output": "SELECT 1"}])
+    checkpoint.put("1|主题|round-0|1/1", [{"input": "城市2", "output": "SELECT 2"}])  # 同一键以最后一次为准
+
+    assert all(isinstance(offset, int) for offset in checkpoint._offsets.values())
+    assert checkpoint.get("1|主题|round-0|1/1") == [{"input": "城市2", "output": "SELECT 2"}]
+    assert checkpoint.get("2|topic|round-0|1/1") == [{"input": "q", "output": "SELECT 1"}]
+    assert ChunkCheckpoint(path).get("1|主题|round-0|1/1") == [{"input": "城市2", "output": "SELECT 2"}]
+
+
+def test_checkpoint_is_dropped_when_stage_inputs_change(tmp_path):
+    manifest = RunManifest(str(tmp_path / "runs"))
+    manifest.start("generate", "old-hash")
+    manifest.open_checkpoint("generate", {"plan": "a"}).put("k", [])
+
+    assert len(manifest.open_checkpoint("generate", {"plan": "b"})) == 0
@@ -0,0 +1,64 @@
+"""
+外键图测试：图构建、标签传播社区和有界划分
+"""
+from modules.schema_graph import build_fk_graph, label_propagation, partition_tables, resolve_reference
+
+
+def cards(foreign_keys):
+    """按 {表: {字段: 引用}} 构造表卡片"""
+    return {table: {"foreign_keys": fks} for table, fks in foreign_keys.items()}
+
+
+def chain(prefix, size):
+    """prefix0 <- prefix1 <- ... 的外键链"""
+    return {
+        f"{prefix}{i}": ({"parent_id": f"{prefix}{i - 1}.id"} if i else {})
+        for i in range(size)
+    }
+
+
+def test_resolve_reference_handles_schema_qualified_keys():
+    keys = {"orders", "sales.customers"}
+    assert resolve_reference("orders.id", keys) == "orders"
+    assert resolve_reference("sales.customers.id", keys) == "sales.customers"
+    assert resolve_reference("missing.id", keys) == ""
+
+
+def test_build_fk_graph_is_undirected_and_ignores_self_and_dangling_refs():
+    graph = build_fk_graph(cards({
+        "orders": {"user_id": "users.id", "parent_id": "orders.id", "x_id": "gone.id"},
+        "users": {},
+        "logs": {},
+    }))
+    assert graph == {"orders": {"users"}, "users": {"orders"}, "logs": set()}
+
+
+def test_label_propagation_separates_components():
+    fks = {**chain("a", 4), **chain("b", 3), "solo": {}}
+    communities = label_propagation(build_fk_graph(cards(fks)))
+    assert communities == [["a0", "a1", "a2", "a3"], ["b0", "b1", "b2"], ["solo"]]
+
+
+def test_partition_respects_max_size_and_keeps_every_table():
+    fks = {**chain("a", 10), **chain("b", 3)}
+    communities = partition_tables(cards(fks), max_size=4, min_size=2)
+    assert all(len(members) <= 4 for members in communities)
+    assert all(len(members) >= 2 for members in communities)
+    assert sorted(t for members in communities for t in members) == sorted(fks)
+    # 切分后的片段沿外键连通
+    graph = build_fk_graph(cards(fks))
+    for members in communities:
+        if members[0].startswith("a"):
+            assert all(graph[t] & set(members) for t in members)
+
+
+def test_partition_merges_isolated_tables():
+    fks = {**chain("a", 3), "x": {}, "y": {}, "z": {}}
+    communities = partition_tables(cards(fks), max_size=5, min_size=2)
+    assert ["a0", "a1", "a2"] in communities
+    assert ["x", "y", "z"] in communities
+
+
+def test_partition_is_deterministic():
+    fks = {**chain("a", 7), **chain("b", 5), "k": {"a_id": "a3.id", "b_id": "b2.id"}}
+    assert partition_tables(cards(fks), 3, 2) == partition_tables(cards(dict(reversed(list(fks.items())))), 3, 2)
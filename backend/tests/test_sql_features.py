@@ -0,0 +1,56 @@
+"""
+SQL特征测试：特征识别和按主题覆盖分配的特征要求
+"""
+from modules.sql_features import FeatureCoverage, SIMPLE_FEATURE, extract_features
+
+
+def test_extract_features_from_syntax_tree():
+    sql_type, features = extract_features(
+        "SELECT u.city, COUNT(*) FROM users u JOIN orders o ON o.user_id = u.id "
+        "GROUP BY u.city HAVING COUNT(*) > 1 ORDER BY 2 DESC LIMIT 5"
+    )
+    assert sql_type == 'SELECT'
+    assert features == {'with_join', 'with_aggregate', 'with_group_by', 'with_having', 'with_order_by', 'with_limit'}
+
+
+def test_extract_features_subquery_cte_window_and_simple():
+    assert 'with_subquery' in extract_features("SELECT id FROM users WHERE id IN (SELECT user_id FROM orders)")[1]
+
+    _, features = extract_features("WITH t AS (SELECT id FROM users) SELECT id FROM t")
+    assert 'with_cte' in features and 'with_subquery' not in features
+
+    # 窗口内的ORDER BY和聚合算作窗口函数
+    _, features = extract_features("SELECT id, SUM(amount) OVER (ORDER BY id) FROM orders")
+    assert 'with_window' in features
+    assert not features & {'with_order_by', 'with_aggregate'}
+
+    assert extract_features("SELECT city FROM users WHERE id = 1") == ('SELECT', {SIMPLE_FEATURE})
+    assert extract_features("UPDATE users SET city = 'x'")[0] == 'UPDATE'
+    assert extract_features("not sql at all (") == ('OTHER', set())
+
+
+def test_steering_hint_asks_for_missing_features_and_caps_simple():
+    coverage = FeatureCoverage(10, {'with_join': 0.5, SIMPLE_FEATURE: 0.2})
+    hint = coverage.steering_hint(5)
+    assert "至少 3 条使用JOIN多表关联" in hint
+    assert "简单查询（单表、无聚合、无子查询）最多 1 条" in hint
+
+    for _ in range(5):
+        coverage.add({'with_join'})
+    coverage.add({SIMPLE_FEATURE})
+    coverage.add({SIMPLE_FEATURE})
+    hint = coverage.steering_hint(3)
+    assert "JOIN" not in hint
+    assert "不要再生成简单查询" in hint
+
+
+def test_steering_hints_split_quota_across_chunks_deterministically():
+    coverage = FeatureCoverage(12, {'with_join': 0.5})
+    hints = coverage.steering_hints([4, 4, 4])
+    # 缺口6条按批次依次分摊，各批要求之和等于缺口
+    assert hints == ["本批SQL特征要求（根据该主题已生成样本的覆盖情况调整，一条SQL可同时满足多项）：至少 2 条使用JOIN多表关联"] * 3
+    assert coverage.steering_hints([4, 4, 4]) == hints
+
+    for _ in range(6):
+        coverage.add({'with_join'})
+    assert coverage.steering_hints([4, 2]) == ["", ""]
@@ -0,0 +1,177 @@
+"""
+流式生成测试：LLM客户端连接本地SSE桩服务，覆盖跨事件的行拼接和流中途断开
+"""
+import asyncio
+import json
+import math
+
+import pytest
+
+from modules.llm_client import LLMClient, AsyncLLMClient
+from modules.generator import SampleGenerator, generate_and_save_samples
+from modules.jsonl_io import iter_jsonl
+from modules.deduplicator import SampleDeduplicator
+from sse_stub import SSEStubServer
+
+METADATA = {
+    "users": {
+        "table_name": "users",
+        "table_comment": "",
+        "columns": [
+            {"name": "id", "column_type": "int", "nullable": False, "comment": ""},
+            {"name": "city", "column_type": "varchar(32)", "nullable": True, "comment": "城市"},
+        ],
+        "primary_keys": ["id"],
+        "foreign_keys": {},
+    }
+}
+PLAN = {"topics": [{"name": "用户", "tables": ["users"], "count": 4}]}
+
+
+def sample_lines(start, count):
+    return [
+        json.dumps({"input": f"编号为{i}的用户在哪个城市", "output": f"SELECT city FROM users WHERE id = {i}"},
+                   ensure_ascii=False)
+        for i in range(start, start + count)
+    ]
+
+
+def failing_script(lines, complete_lines, chunk_size=7):
+    """发送完前 complete_lines 行（以及下一行的一部分）后断开"""
+    content = "\n".join(lines) + "\n"
+    prefix = len("\n".join(lines[:complete_lines])) + 1
+    return {"content": content, "fail_after": math.ceil(prefix / chunk_size) + 1}
+
+
+def llm_config(server):
+    return {"api_base": server.api_base, "api_key": "test", "model_name": "stub", "max_retries": 1, "timeout": 10}
+
+
+def test_stream_lines_are_reassembled_across_events():
+    lines = sample_lines(0, 3)
+    with SSEStubServer([{"content": "\n".join(lines)}]) as server:
+        client = LLMClient(llm_config(server))
+        assert list(client.stream_llm_lines("prompt")) == lines
+        assert server.requests[0]["stream"] is True
+
+
+def test_stream_failure_keeps_yielded_lines():
+    lines = sample_lines(0, 4)
+    with SSEStubServer([failing_script(lines, 2)]) as server:
+        client = LLMClient(llm_config(server))
+        received = []
+        with pytest.raises(Exception):
+            for line in client.stream_llm_lines("prompt"):
+                received.append(line)
+        assert received == lines[:2]
+
+
+def test_generator_keeps_partial_chunk_after_stream_failure():
+    first = sample_lines(0, 4)
+    with SSEStubServer([failing_script(first, 2), {"content": "\n".join(sample_lines(10, 2))}]) as server:
+        emitted = []
+        generator = SampleGenerator(
+            LLMClient(llm_config(server)), METADATA, chunk_size=4, max_chunk_retries=1, stream=True,
+            on_sample=emitted.append, deduplicator=SampleDeduplicator()
+        )
+        samples = generator.generate_samples(PLAN)
+
+    assert [s['output'] for s in samples] == [
+        "SELECT city FROM users WHERE id = 0", "SELECT city FROM users WHERE id = 1",
+        "SELECT city FROM users WHERE id = 10", "SELECT city FROM users WHERE id = 11",
+    ]
+    assert emitted == samples
+    # 补充轮次只请求缺少的2条
+    assert len(server.requests) == 2
+    assert "生成 2 条" in server.requests[1]["messages"][-1]["content"]
+
+
+def test_async_generator_keeps_partial_chunk_after_stream_failure():
+    first = sample_lines(0, 4)
+
+    async def run(server):
+        async with AsyncLLMClient(llm_config(server)) as client:
+            generator = SampleGenerator(client, METADATA, chunk_size=4, max_chunk_retries=1, stream=True)
+            return await generator.agenerate_samples(PLAN)
+
+    with SSEStubServer([failing_script(first, 3), {"content": "\n".join(sample_lines(10, 1))}]) as server:
+        samples = asyncio.run(run(server))
+
+    assert [s['output'] for s in samples] == [
+        "SELECT city FROM users WHERE id = 0", "SELECT city FROM users WHERE id = 1",
+        "SELECT city FROM users WHERE id = 2", "SELECT city FROM users WHERE id = 10",
+    ]
+    assert len(server.requests) == 2
+
+
+def test_generate_and_save_returns_count_and_streams_raw_file(tmp_path):
+    output_path = str(tmp_path / "samples_raw.jsonl")
+    with SSEStubServer([failing_script(sample_lines(0, 4), 2), {"content": "\n".join(sample_lines(10, 2))}]) as server:
+        count = generate_and_save_samples(
+            LLMClient(llm_config(server)), METADATA, PLAN, output_path, db_name="demo",
+            chunk_size=4, max_chunk_retries=1, stream=True
+        )
+
+    assert count == 4
+    raw = list(iter_jsonl(output_path))
+    assert [s['output'] for s in raw][-1] == "SELECT city FROM users WHERE id = 11"
+    assert len(raw) == 4
+    with open(tmp_path / "ddl_mysql" / "sql_parse.jsonl", encoding='utf-8') as f:
+        docs = json.load(f)
+    assert [doc['sql'] for doc in docs] == [s['output'] for s in raw]
+    assert docs[0]['tables'] == ['users'] and docs[0]['db_name'] == "demo"
+
+
+def test_streams_stopped_early_release_their_connections():
+    # 每个批次读满2条即停止（输出以换行结尾，[DONE]尚未读到），批次数多于连接池容量
+    plan = {"topics": [{"name": f"用户{i}", "tables": ["users"], "count": 2} for i in range(3)]}
+    scripts = [{"content": "\n".join(sample_lines(i * 10, 2)) + "\n"} for i in range(3)]
+    config_overrides = {"max_concurrency": 2, "initial_concurrency": 2, "timeout": 3}
+
+    async def run(server):
+        config = {**llm_config(server), **config_overrides}
+        async with AsyncLLMClient(config) as client:
+            generator = SampleGenerator(client, METADATA, max_workers=3, chunk_size=2, max_chunk_retries=0, stream=True)
+            return await generator.agenerate_samples(plan), client.rate_limiter.throttle_count
+
+    with SSEStubServer(scripts) as server:
+        samples, throttles = asyncio.run(run(server))
+    assert len(samples) == 6
+    assert throttles == 0
+
+    with SSEStubServer(scripts) as server:
+        client = LLMClient({**llm_config(server), **config_overrides, "api_base": server.api_base})
+        generator = SampleGenerator(client, METADATA, max_workers=3, chunk_size=2, max_chunk_retries=0, stream=True)
+        assert len(generator.generate_samples(plan)) == 6
+
+
+class DelayedClient:
+    """按主题名决定响应延迟的异步客户端，用于让后规划的批次先完成"""
+
+    def __init__(self, delays):
+        self.delays = delays
+
+    async def call_llm(self, prompt, expect_json=True, use_cache=None, cache_salt=""):
+        name = next(name for name in self.delays if f'"{name}"主题' in prompt)
+        await asyncio.sleep(self.delays[name])
+        start = int(name[-1]) * 10
+        return "\n".join(sample_lines(start, 2))
+
+
+def test_raw_file_follows_plan_order_not_completion_order(tmp_path):
+    from modules.generator import generate_and_save_samples_async
+
+    plan = {"topics": [{"name": f"用户{i}", "tables": ["users"], "count": 2} for i in range(3)]}
+    client = DelayedClient({"用户0": 0.3, "用户1": 0.0, "用户2": 0.1})
+    output_path = str(tmp_path / "samples_raw.jsonl")
+    arrived = []
+    count = asyncio.run(generate_and_save_samples_async(
+        client, METADATA, plan, output_path, max_workers=3, chunk_size=2, max_chunk_retries=0,
+        on_sample=arrived.append
+    ))
+
+    assert count == 6
+    ids = [int(s['output'].rsplit(' ', 1)[1]) for s in iter_jsonl(output_path)]
+    assert ids == [0, 1, 10, 11, 20, 21]
+    # 回调仍按到达顺序调用
+    assert [int(s['output'].rsplit(' ', 1)[1]) for s in arrived][:2] == [10, 11]
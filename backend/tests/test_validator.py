@@ -0,0 +1,137 @@
+"""
+SQL校验器测试：多窗口流式验证、进程池复用和有界缓存
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import validator as validator_module
+from modules.validator import SQLValidator
+
+METADATA = {
+    "users": {
+        "table_name": "users",
+        "columns": [
+            {"name": "id", "column_type": "int", "nullable": False, "comment": ""},
+            {"name": "city", "column_type": "varchar(32)", "nullable": True, "comment": ""},
+        ],
+        "primary_keys": ["id"],
+        "foreign_keys": {},
+    }
+}
+
+
+def make_samples(count):
+    samples = []
+    for i in range(count):
+        table = "users" if i % 3 else "missing"
+        samples.append({"input": f"q{i}", "output": f"SELECT city FROM {table} WHERE id = {i}"})
+    return samples
+
+
+def test_process_pool_is_shared_across_windows(monkeypatch):
+    created = []
+
+    class CountingPool(ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            created.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(validator_module, "ProcessPoolExecutor", CountingPool)
+    monkeypatch.setattr(validator_module, "VALIDATION_WINDOW_SIZE", 4)
+    samples = make_samples(10)
+
+    valid = SQLValidator(METADATA).validate_samples(iter(samples), workers=2)
+
+    assert len(created) == 1
+    assert valid == [s for i, s in enumerate(samples) if i % 3]
+
+
+def test_process_results_match_in_process_results(monkeypatch):
+    monkeypatch.setattr(validator_module, "VALIDATION_WINDOW_SIZE", 4)
+    samples = make_samples(9)
+    assert SQLValidator(METADATA).validate_samples(samples, workers=2) == \
+        SQLValidator(METADATA).validate_samples(samples, workers=1)
+
+
+def test_memo_caches_are_bounded(monkeypatch):
+    monkeypatch.setattr(validator_module, "MAX_PARSED_CACHE_SIZE", 5)
+    monkeypatch.setattr(validator_module, "MAX_RESULT_CACHE_SIZE", 8)
+    validator = SQLValidator(METADATA)
+
+    for i in range(50):
+        assert validator.validate_sql(f"SELECT city FROM users WHERE id = {i}")[0]
+
+    assert len(validator._parsed) == 5
+    assert len(validator._results) == 8
+    # 最近使用的结果仍可直接复用，淘汰的SQL重新校验结果不变
+    assert ("SELECT city FROM users WHERE id = 49", "mysql") in validator._results
+    assert validator.validate_sql("SELECT city FROM users WHERE id = 0") == (True, "")
+
+
+class FakeExecutionChecker:
+    """记录待执行语句的假执行验证器"""
+
+    mode = "execute"
+    pool_size = 1
+
+    def __init__(self):
+        self.executed = []
+
+    def check_many(self, sqls):
+        self.executed.extend(sqls)
+        return [(True, "", None) for _ in sqls]
+
+    def stats(self):
+        return {"count": 0}
+
+    def close(self):
+        pass
+
+
+def test_window_larger_than_parse_cache_parses_each_sql_once(monkeypatch):
+    parses = []
+
+    class CountingParsedSQL(validator_module.ParsedSQL):
+        def __init__(self, sql, dialect):
+            parses.append(sql)
+            super().__init__(sql, dialect)
+
+    monkeypatch.setattr(validator_module, "ParsedSQL", CountingParsedSQL)
+    monkeypatch.setattr(validator_module, "MAX_PARSED_CACHE_SIZE", 5)
+    validator = SQLValidator(METADATA)
+    validator._execution_checker = FakeExecutionChecker()
+    samples = make_samples(30) + [{"input": "q", "output": "SELECT city FROM users LIMIT 3"}]
+
+    valid = validator.validate_samples(samples)
+
+    assert len(parses) == len(samples)
+    assert len(valid) == 21
+    executed = validator._execution_checker.executed
+    assert "SELECT city FROM users WHERE id = 1 LIMIT 1" in executed
+    assert "SELECT city FROM users LIMIT 3" in executed
+    assert len(executed) == 21
+
+
+def test_process_pool_passes_execution_info(monkeypatch):
+    validator = SQLValidator(METADATA)
+    validator._execution_checker = FakeExecutionChecker()
+    valid = validator.validate_samples(make_samples(6), workers=2)
+    assert len(valid) == 4
+    assert sorted(validator._execution_checker.executed)[0] == "SELECT city FROM users WHERE id = 1 LIMIT 1"
+
+
+def test_batch_validation_reuses_live_static_checks(monkeypatch):
+    validator = SQLValidator(METADATA)
+    validator._execution_checker = FakeExecutionChecker()
+    samples = make_samples(6)
+    live = [validator.validate_sql(s['output'], check_execution=False)[0] for s in samples]
+    assert sum(live) == 4 and not validator._execution_checker.executed
+
+    static_checks = []
+    original = validator._static_check
+    monkeypatch.setattr(validator, "_static_check", lambda sql, dialect: static_checks.append(sql) or original(sql, dialect))
+    valid = validator.validate_samples(samples + [{"input": "q", "output": "SELECT id FROM users"}])
+
+    # 只有流式阶段没见过的SQL需要静态检查，其余只补做执行验证
+    assert static_checks == ["SELECT id FROM users"]
+    assert len(valid) == 5
+    assert len(validator._execution_checker.executed) == 5